@@ -2,13 +2,43 @@
 """
 GTFS 数据 RESTful API 服务
 提供查询 PostgreSQL 中 GTFS 数据的 HTTP 接口
+
+响应格式、参数解析和 SQL 语句定义在 api_common.py 中，与 ASGI 版本（api_asgi.py）共用
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, g
 from flask_cors import CORS
-from db import Database, execute_query, execute_query_one, execute_count
+from db import Database, connection_scope, execute_query, execute_query_one, execute_count, stream_query
+from query_metrics import metrics
+from pagination import CursorError, KeysetPage, count_query, estimated_rows
+from shape_geometry import (parse_bbox, simplification, simplify, level_points, route_shapes_query,
+                            group_route_shapes, route_shape_levels_query, group_level_shapes, SHAPE_LEVEL_QUERY)
+from shape_formats import SHAPE_FORMATS, negotiate, encode_points, encode_binary
+from search_index import search_index, fuzzy_queries, merge_fuzzy
+from vector_tiles import (TileBounds, MVT_MEDIA_TYPE, LAYER_MIN_ZOOM, VEHICLES_QUERY, parse_layers, tile_query,
+                          build_layer, cache_control, tile_cache, vehicle_positions)
+from feed_version import feed_version
+from http_cache import make_etag, etag_matches, cache_headers
+from api_common import (
+    REALTIME_PATH_PREFIX, DELAY_EXPORT_COLUMNS, success_response, error_response,
+    pagination_args, offset_query, offset_pagination, metrics_args, search_args,
+    AGENCIES_QUERY, AGENCY_QUERY, ROUTE_QUERY, ROUTE_DIRECTIONS_QUERY, STOP_QUERY, STOP_ROUTES_QUERY,
+    TRIP_QUERY, TRIP_STOP_TIMES_QUERY, SHAPE_POINTS_QUERY, CALENDAR_QUERY, STATS_QUERIES,
+    routes_list, stops_list, trips_list, route_stops_query,
+    REALTIME_SUMMARY_COUNT_QUERIES, REALTIME_AVG_DELAY_QUERY,
+    realtime_vehicles_query, realtime_delays_query, delay_export_query,
+    PUNCTUALITY_CONFIG_QUERY, PUNCTUALITY_CONFIG_UPDATE, punctuality_days,
+    route_punctuality_query, stop_punctuality_query, punctuality_overview_queries,
+    has_punctuality_data, punctuality_overview, hourly_punctuality_query, hourly_punctuality,
+    punctuality_config_values,
+)
+from contextlib import ExitStack
+from functools import wraps
 from typing import Dict, Any
+import csv
+import io
 import os
+import threading
 
 app = Flask(__name__)
 CORS(app)
@@ -16,33 +46,114 @@ CORS(app)
 
 @app.before_request
 def before_first_request():
-    """初始化数据库连接池"""
-    if Database._connection_pool is None:
-        Database.initialize()
+    """初始化数据库连接池，并为请求绑定连接作用域"""
+    Database.ensure_initialized()
+    # 请求内的所有查询复用同一个连接，连接在第一次查询时才取出。
+    # 写请求和实时数据接口使用主库，其余只读请求可以分配到只读副本
+    primary = request.method != 'GET' or request.path.startswith(REALTIME_PATH_PREFIX)
+    g.db_scope = ExitStack()
+    g.db_connection = g.db_scope.enter_context(connection_scope(primary=primary))
+
+
+@app.after_request
+def end_request_transaction(response):
+    """在发送响应之前结束请求的事务: 成功时提交，状态码 >= 400 时回滚，提交失败时改为返回 500"""
+    scope = g.pop('db_scope', None)
+    if scope is None:
+        return response
+    if response.status_code >= 400:
+        g.db_connection.rollback_only = True
+    try:
+        scope.close()
+    except Exception as e:
+        response = jsonify(error_response(f"提交失败: {str(e)}", 500))
+        response.status_code = 500
+    return response
 
 
 @app.teardown_appcontext
 def shutdown_session(exception=None):
-    """请求结束时的清理工作"""
-    pass
-
-
-def success_response(data: Any, message: str = "success") -> Dict:
-    """成功响应格式"""
-    return {
-        "code": 200,
-        "message": message,
-        "data": data
-    }
-
-
-def error_response(message: str, code: int = 400) -> Dict:
-    """错误响应格式"""
-    return {
-        "code": code,
-        "message": message,
-        "data": None
-    }
+    """请求结束时的清理工作: 请求因异常没有经过 end_request_transaction 时回滚事务并归还连接"""
+    scope = g.pop('db_scope', None)
+    if scope is not None:
+        g.db_connection.rollback_only = True
+        scope.close()
+
+
+def query_total(mode: str, from_sql: str, where_sql: str, params: list):
+    """按 count 参数统计总数，返回 (总数, 是否为估计值)，mode 为 none 时总数为 None"""
+    query = count_query(mode, from_sql, where_sql)
+    if mode == 'exact':
+        return execute_count(query, tuple(params)), False
+    if mode == 'estimate':
+        return estimated_rows(execute_query_one(query, tuple(params))), True
+    return None, False
+
+
+def paginate(options: Dict[str, Any], columns_sql: str, from_sql: str, where_sql: str,
+             params: list, keys: list, order_by: str):
+    """
+    执行分页查询，返回 (当前页的行, 分页信息)
+
+    Args:
+        options: pagination_args 的结果
+        keys: 键集分页的排序键，必须唯一确定一行
+        order_by: OFFSET 分页的排序子句（保持原有顺序）
+
+    其余参数通常由 api_common 中的 routes_list 等函数给出。
+
+    Raises:
+        CursorError: 游标无效
+    """
+    page_size = options['page_size']
+    keyset = KeysetPage(keys, page_size, options['cursor']) if options['keyset'] else None
+    total, estimated = query_total(options['count'], from_sql, where_sql, params)
+
+    if keyset is not None:
+        query, query_params = keyset.query(columns_sql, from_sql, where_sql, params)
+        rows, pagination = keyset.result(execute_query(query, tuple(query_params)))
+    else:
+        query, query_params = offset_query(columns_sql, from_sql, where_sql, params, order_by,
+                                           options['page'], page_size)
+        rows = execute_query(query, query_params)
+        pagination = offset_pagination(options['page'], page_size, total)
+
+    pagination.update({"total": total, "total_is_estimate": estimated})
+    return rows, pagination
+
+
+def feed_cached(*vary: str):
+    """
+    静态 GTFS 接口的 HTTP 缓存装饰器
+
+    ETag 由数据版本和请求地址（以及 vary 中的请求头）计算，If-None-Match 匹配时直接返回 304，
+    不执行接口本身，也不访问数据库；只有 200 响应带 ETag 和 Cache-Control。
+
+    Args:
+        vary: 影响响应内容的请求头，如按 Accept 选择格式的轨迹接口
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                version = feed_version.current()
+            except Exception as e:
+                print(f"数据版本查询失败，跳过 HTTP 缓存: {e}")
+                return view(*args, **kwargs)
+            if not feed_version.known:
+                return view(*args, **kwargs)
+
+            etag = make_etag(version, request.full_path, [request.headers.get(name, '') for name in vary])
+            headers = cache_headers(etag, vary)
+            if etag_matches(request.headers.get('If-None-Match'), etag):
+                return Response(status=304, headers=headers)
+
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.headers.update(headers)
+            return response
+        return wrapper
+    return decorator
 
 
 @app.route('/api/health', methods=['GET'])
@@ -51,39 +162,47 @@ def health_check():
     try:
         result = execute_query_one("SELECT 1 as status")
         if result:
-            return jsonify(success_response({"status": "healthy", "database": "connected"}))
+            return jsonify(success_response({
+                "status": "healthy",
+                "database": "connected",
+                "pool": Database.pool_stats()
+            }))
         return jsonify(error_response("数据库连接失败", 500)), 500
     except Exception as e:
         return jsonify(error_response(f"健康检查失败: {str(e)}", 500)), 500
 
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """获取查询性能统计: 各语句的耗时直方图、行数、慢查询次数以及连接池等待时间"""
+    try:
+        limit, order_by = metrics_args(request.args)
+        result = metrics.snapshot(limit=limit, order_by=order_by)
+        result['pool'] = Database.pool_stats()
+        return jsonify(success_response(result))
+    except ValueError as e:
+        return jsonify(error_response(str(e))), 400
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
 @app.route('/api/agencies', methods=['GET'])
+@feed_cached()
 def get_agencies():
     """获取所有运营机构"""
     try:
-        query = """
-            SELECT agency_id, agency_name, agency_url, agency_timezone,
-                   agency_lang, agency_phone, agency_fare_url, agency_email
-            FROM agency
-            ORDER BY agency_name
-        """
-        agencies = execute_query(query)
+        agencies = execute_query(AGENCIES_QUERY)
         return jsonify(success_response(agencies))
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
 
 
 @app.route('/api/agencies/<agency_id>', methods=['GET'])
+@feed_cached()
 def get_agency(agency_id):
     """获取指定运营机构详情"""
     try:
-        query = """
-            SELECT agency_id, agency_name, agency_url, agency_timezone,
-                   agency_lang, agency_phone, agency_fare_url, agency_email
-            FROM agency
-            WHERE agency_id = %s
-        """
-        agency = execute_query_one(query, (agency_id,))
+        agency = execute_query_one(AGENCY_QUERY, (agency_id,), prepare="api_agency")
         if agency:
             return jsonify(success_response(agency))
         return jsonify(error_response("运营机构不存在", 404)), 404
@@ -93,79 +212,25 @@ def get_agency(agency_id):
 
 @app.route('/api/routes', methods=['GET'])
 def get_routes():
-    """获取所有线路，支持分页和筛选"""
+    """获取所有线路，支持分页（page 或 cursor）和筛选"""
     try:
-        page = request.args.get('page', 1, type=int)
-        page_size = request.args.get('page_size', 20, type=int)
-        agency_id = request.args.get('agency_id', type=str)
-        route_type = request.args.get('route_type', type=int)
-        search = request.args.get('search', type=str)
-
-        offset = (page - 1) * page_size
-
-        where_clauses = []
-        params = []
-
-        if agency_id:
-            where_clauses.append("r.agency_id = %s")
-            params.append(agency_id)
-
-        if route_type is not None:
-            where_clauses.append("r.route_type = %s")
-            params.append(route_type)
-
-        if search:
-            where_clauses.append(
-                "(r.route_short_name ILIKE %s OR r.route_long_name ILIKE %s)"
-            )
-            search_pattern = f"%{search}%"
-            params.extend([search_pattern, search_pattern])
-
-        where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
-
-        count_query = f"SELECT COUNT(*) FROM routes r WHERE {where_sql}"
-        total = execute_count(count_query, tuple(params))
-
-        query = f"""
-            SELECT r.route_id, r.agency_id, r.route_short_name, r.route_long_name,
-                   r.route_desc, r.route_type, r.route_url, r.route_color, r.route_text_color,
-                   ra.category, ra.subcategory, ra.running_way
-            FROM routes r
-            LEFT JOIN route_attributes ra ON r.route_id = ra.route_id
-            WHERE {where_sql}
-            ORDER BY r.route_short_name, r.route_long_name
-            LIMIT %s OFFSET %s
-        """
-        params.extend([page_size, offset])
-
-        routes = execute_query(query, tuple(params))
-
+        routes, pagination = paginate(pagination_args(request.args), **routes_list(request.args))
         return jsonify(success_response({
             "routes": routes,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total": total,
-                "total_pages": (total + page_size - 1) // page_size
-            }
+            "pagination": pagination
         }))
+    except (ValueError, CursorError) as e:
+        return jsonify(error_response(str(e))), 400
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
 
 
 @app.route('/api/routes/<route_id>', methods=['GET'])
+@feed_cached()
 def get_route(route_id):
     """获取指定线路详情"""
     try:
-        query = """
-            SELECT r.route_id, r.agency_id, r.route_short_name, r.route_long_name,
-                   r.route_desc, r.route_type, r.route_url, r.route_color, r.route_text_color,
-                   ra.category, ra.subcategory, ra.running_way
-            FROM routes r
-            LEFT JOIN route_attributes ra ON r.route_id = ra.route_id
-            WHERE r.route_id = %s
-        """
-        route = execute_query_one(query, (route_id,))
+        route = execute_query_one(ROUTE_QUERY, (route_id,), prepare="api_route")
         if route:
             return jsonify(success_response(route))
         return jsonify(error_response("线路不存在", 404)), 404
@@ -174,47 +239,23 @@ def get_route(route_id):
 
 
 @app.route('/api/routes/<route_id>/directions', methods=['GET'])
+@feed_cached()
 def get_route_directions(route_id):
     """获取线路的所有方向"""
     try:
-        query = """
-            SELECT route_id, direction_id, direction
-            FROM directions
-            WHERE route_id = %s
-            ORDER BY direction_id
-        """
-        directions = execute_query(query, (route_id,))
+        directions = execute_query(ROUTE_DIRECTIONS_QUERY, (route_id,), prepare="api_route_directions")
         return jsonify(success_response(directions))
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
 
 
 @app.route('/api/routes/<route_id>/stops', methods=['GET'])
+@feed_cached()
 def get_route_stops(route_id):
     """获取线路的所有站点"""
     try:
-        direction_id = request.args.get('direction_id', type=int)
-
-        where_clause = "r.route_id = %s"
-        params = [route_id]
-
-        if direction_id is not None:
-            where_clause += " AND t.direction_id = %s"
-            params.append(direction_id)
-
-        query = f"""
-            SELECT DISTINCT s.stop_id, s.stop_code, s.stop_name,
-                   s.stop_lat, s.stop_lon, s.stop_desc,
-                   MIN(st.stop_sequence) as min_sequence
-            FROM stops s
-            JOIN stop_times st ON s.stop_id = st.stop_id
-            JOIN trips t ON st.trip_id = t.trip_id
-            JOIN routes r ON t.route_id = r.route_id
-            WHERE {where_clause}
-            GROUP BY s.stop_id, s.stop_code, s.stop_name, s.stop_lat, s.stop_lon, s.stop_desc
-            ORDER BY min_sequence
-        """
-        stops = execute_query(query, tuple(params))
+        query, params = route_stops_query(route_id, request.args.get('direction_id', type=int))
+        stops = execute_query(query, params)
         return jsonify(success_response(stops))
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
@@ -222,77 +263,25 @@ def get_route_stops(route_id):
 
 @app.route('/api/stops', methods=['GET'])
 def get_stops():
-    """获取所有站点，支持分页和地理位置筛选"""
-    try:
-        page = request.args.get('page', 1, type=int)
-        page_size = request.args.get('page_size', 20, type=int)
-        search = request.args.get('search', type=str)
-        lat = request.args.get('lat', type=float)
-        lon = request.args.get('lon', type=float)
-        radius = request.args.get('radius', 1.0, type=float)
-
-        offset = (page - 1) * page_size
-
-        where_clauses = []
-        params = []
-
-        if search:
-            where_clauses.append("stop_name ILIKE %s")
-            params.append(f"%{search}%")
-
-        if lat is not None and lon is not None:
-            where_clauses.append("""
-                (6371 * acos(
-                    cos(radians(%s)) * cos(radians(stop_lat)) *
-                    cos(radians(stop_lon) - radians(%s)) +
-                    sin(radians(%s)) * sin(radians(stop_lat))
-                )) <= %s
-            """)
-            params.extend([lat, lon, lat, radius])
-
-        where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
-
-        count_query = f"SELECT COUNT(*) FROM stops WHERE {where_sql}"
-        total = execute_count(count_query, tuple(params))
-
-        query = f"""
-            SELECT stop_id, stop_code, stop_name, stop_lat, stop_lon,
-                   zone_id, stop_desc, stop_url, location_type,
-                   parent_station, stop_timezone, wheelchair_boarding, platform_code
-            FROM stops
-            WHERE {where_sql}
-            ORDER BY stop_name
-            LIMIT %s OFFSET %s
-        """
-        params.extend([page_size, offset])
-
-        stops = execute_query(query, tuple(params))
-
+    """获取所有站点，支持分页（page 或 cursor）和地理位置筛选"""
+    try:
+        stops, pagination = paginate(pagination_args(request.args), **stops_list(request.args))
         return jsonify(success_response({
             "stops": stops,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total": total,
-                "total_pages": (total + page_size - 1) // page_size
-            }
+            "pagination": pagination
         }))
+    except (ValueError, CursorError) as e:
+        return jsonify(error_response(str(e))), 400
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
 
 
 @app.route('/api/stops/<stop_id>', methods=['GET'])
+@feed_cached()
 def get_stop(stop_id):
     """获取指定站点详情"""
     try:
-        query = """
-            SELECT stop_id, stop_code, stop_name, stop_lat, stop_lon,
-                   zone_id, stop_desc, stop_url, location_type,
-                   parent_station, stop_timezone, wheelchair_boarding, platform_code
-            FROM stops
-            WHERE stop_id = %s
-        """
-        stop = execute_query_one(query, (stop_id,))
+        stop = execute_query_one(STOP_QUERY, (stop_id,), prepare="api_stop")
         if stop:
             return jsonify(success_response(stop))
         return jsonify(error_response("站点不存在", 404)), 404
@@ -301,94 +290,63 @@ def get_stop(stop_id):
 
 
 @app.route('/api/stops/<stop_id>/routes', methods=['GET'])
+@feed_cached()
 def get_stop_routes(stop_id):
     """获取经过指定站点的所有线路"""
     try:
-        query = """
-            SELECT DISTINCT r.route_id, r.route_short_name, r.route_long_name,
-                   r.route_type, r.route_color, r.route_text_color
-            FROM routes r
-            JOIN trips t ON r.route_id = t.route_id
-            JOIN stop_times st ON t.trip_id = st.trip_id
-            WHERE st.stop_id = %s
-            ORDER BY r.route_short_name, r.route_long_name
-        """
-        routes = execute_query(query, (stop_id,))
+        routes = execute_query(STOP_ROUTES_QUERY, (stop_id,), prepare="api_stop_routes")
         return jsonify(success_response(routes))
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
 
 
-@app.route('/api/trips', methods=['GET'])
-def get_trips():
-    """获取班次信息，支持按线路筛选"""
+@app.route('/api/search', methods=['GET'])
+def search_suggestions():
+    """站点和线路联想搜索，按匹配程度排序"""
     try:
-        route_id = request.args.get('route_id', type=str)
-        service_id = request.args.get('service_id', type=str)
-        direction_id = request.args.get('direction_id', type=int)
-        page = request.args.get('page', 1, type=int)
-        page_size = request.args.get('page_size', 20, type=int)
-
-        offset = (page - 1) * page_size
-
-        where_clauses = []
-        params = []
-
-        if route_id:
-            where_clauses.append("route_id = %s")
-            params.append(route_id)
-
-        if service_id:
-            where_clauses.append("service_id = %s")
-            params.append(service_id)
+        text, types, limit, fuzzy = search_args(request.args)
+    except ValueError as e:
+        return jsonify(error_response(str(e))), 400
 
-        if direction_id is not None:
-            where_clauses.append("direction_id = %s")
-            params.append(direction_id)
-
-        where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
-
-        count_query = f"SELECT COUNT(*) FROM trips WHERE {where_sql}"
-        total = execute_count(count_query, tuple(params))
+    try:
+        if not search_index.ready:
+            search_index.ensure_ready()
+        elif search_index.claim_refresh():
+            threading.Thread(target=search_index.refresh, daemon=True).start()
+
+        results = search_index.search(text, types, limit)
+        if fuzzy and len(results) < limit:
+            results = merge_fuzzy(results, [
+                (kind, execute_query(query, params))
+                for kind, query, params in fuzzy_queries(text, types, limit)
+            ], limit)
 
-        query = f"""
-            SELECT trip_id, route_id, service_id, trip_headsign,
-                   trip_short_name, direction_id, block_id, shape_id,
-                   wheelchair_accessible, bikes_allowed
-            FROM trips
-            WHERE {where_sql}
-            ORDER BY trip_id
-            LIMIT %s OFFSET %s
-        """
-        params.extend([page_size, offset])
+        return jsonify(success_response(results))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
 
-        trips = execute_query(query, tuple(params))
 
+@app.route('/api/trips', methods=['GET'])
+def get_trips():
+    """获取班次信息，支持按线路筛选和分页（page 或 cursor）"""
+    try:
+        trips, pagination = paginate(pagination_args(request.args), **trips_list(request.args))
         return jsonify(success_response({
             "trips": trips,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total": total,
-                "total_pages": (total + page_size - 1) // page_size
-            }
+            "pagination": pagination
         }))
+    except (ValueError, CursorError) as e:
+        return jsonify(error_response(str(e))), 400
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
 
 
 @app.route('/api/trips/<trip_id>', methods=['GET'])
+@feed_cached()
 def get_trip(trip_id):
     """获取指定班次详情"""
     try:
-        query = """
-            SELECT trip_id, route_id, service_id, trip_headsign,
-                   trip_short_name, direction_id, block_id, shape_id,
-                   wheelchair_accessible, bikes_allowed
-            FROM trips
-            WHERE trip_id = %s
-        """
-        trip = execute_query_one(query, (trip_id,))
+        trip = execute_query_one(TRIP_QUERY, (trip_id,), prepare="api_trip")
         if trip:
             return jsonify(success_response(trip))
         return jsonify(error_response("班次不存在", 404)), 404
@@ -397,108 +355,122 @@ def get_trip(trip_id):
 
 
 @app.route('/api/trips/<trip_id>/stop_times', methods=['GET'])
+@feed_cached()
 def get_trip_stop_times(trip_id):
     """获取班次的所有站点时刻表"""
     try:
-        query = """
-            SELECT st.trip_id, st.arrival_time, st.departure_time,
-                   st.stop_id, st.stop_sequence, st.stop_headsign,
-                   st.pickup_type, st.drop_off_type, st.shape_dist_traveled,
-                   s.stop_name, s.stop_lat, s.stop_lon
-            FROM stop_times st
-            JOIN stops s ON st.stop_id = s.stop_id
-            WHERE st.trip_id = %s
-            ORDER BY st.stop_sequence
-        """
-        stop_times = execute_query(query, (trip_id,))
+        stop_times = execute_query(TRIP_STOP_TIMES_QUERY, (trip_id,), prepare="api_trip_stop_times")
         return jsonify(success_response(stop_times))
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
 
 
 @app.route('/api/routes/<route_id>/shapes', methods=['GET'])
+@feed_cached('Accept')
 def get_route_shapes(route_id):
-    """获取指定线路的所有轨迹"""
+    """获取指定线路的所有轨迹（一次查询取出所有轨迹点），支持简化级别、范围裁剪和紧凑格式"""
     try:
         direction_id = request.args.get('direction_id', type=int)
-
-        # 根据trips表获取该线路的所有shape_id
-        query = """
-            SELECT DISTINCT t.shape_id, d.direction_id
-            FROM trips t
-            LEFT JOIN directions d ON t.route_id = d.route_id AND t.direction_id = d.direction_id
-            WHERE t.route_id = %s
-        """
-        params = [route_id]
-
-        if direction_id is not None:
-            query += " AND t.direction_id = %s"
-            params.append(direction_id)
-
-        shape_ids = execute_query(query, tuple(params))
-
-        if not shape_ids:
-            return jsonify(success_response([]))
-
-        # 获取所有shape的轨迹点
-        all_shapes = []
-        for shape_info in shape_ids:
-            shape_id = shape_info['shape_id']
-            shape_direction_id = shape_info.get('direction_id')
-
-            shape_query = """
-                SELECT shape_id, shape_pt_lat, shape_pt_lon,
-                       shape_pt_sequence, shape_dist_traveled
-                FROM shapes
-                WHERE shape_id = %s
-                ORDER BY shape_pt_sequence
-            """
-            shape_points = execute_query(shape_query, (shape_id,))
-
-            if shape_points:
-                all_shapes.append({
-                    'shape_id': shape_id,
-                    'direction_id': shape_direction_id,
-                    'points': shape_points
-                })
-
-        return jsonify(success_response(all_shapes))
+        bbox = parse_bbox(request.args.get('bbox', type=str))
+        fmt = negotiate(request.args.get('format', type=str), request.accept_mimetypes)
+        level, tolerance = simplification(request.args.get('tolerance', type=float),
+                                          request.args.get('zoom', type=float))
+
+        shapes = None
+        if level is not None:
+            # 优先使用预先计算的简化级别，尚未生成时回落到原始轨迹
+            query, params = route_shape_levels_query(route_id, level, direction_id)
+            rows = execute_query(query, params)
+            if rows:
+                shapes = group_level_shapes(rows, bbox, tolerance)
+        if shapes is None:
+            query, params = route_shapes_query(route_id, direction_id, bbox)
+            shapes = group_route_shapes(execute_query(query, params), tolerance)
+
+        if fmt == 'binary':
+            return Response(encode_binary(shapes), mimetype=SHAPE_FORMATS['binary'])
+        if fmt != 'json':
+            for shape in shapes:
+                shape.update(encode_points(shape.pop('points'), fmt))
+        return jsonify(success_response(shapes))
+    except ValueError as e:
+        return jsonify(error_response(str(e))), 400
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
 
 
 @app.route('/api/shapes/<shape_id>', methods=['GET'])
+@feed_cached('Accept')
 def get_shape(shape_id):
-    """获取线路轨迹"""
-    try:
-        query = """
-            SELECT shape_id, shape_pt_lat, shape_pt_lon,
-                   shape_pt_sequence, shape_dist_traveled
-            FROM shapes
-            WHERE shape_id = %s
-            ORDER BY shape_pt_sequence
-        """
-        shape_points = execute_query(query, (shape_id,))
-        if shape_points:
-            return jsonify(success_response(shape_points))
-        return jsonify(error_response("轨迹不存在", 404)), 404
+    """获取线路轨迹，zoom 选择简化级别（tolerance 指定容差时优先），format 参数或 Accept 头选择紧凑格式"""
+    try:
+        fmt = negotiate(request.args.get('format', type=str), request.accept_mimetypes)
+        level, tolerance = simplification(request.args.get('tolerance', type=float),
+                                          request.args.get('zoom', type=float))
+
+        shape_points = None
+        if level is not None:
+            row = execute_query_one(SHAPE_LEVEL_QUERY, (shape_id, level), prepare="api_shape_level")
+            if row:
+                shape_points = level_points(row)
+        if shape_points is None:
+            shape_points = execute_query(SHAPE_POINTS_QUERY, (shape_id,), prepare="api_shape")
+        if not shape_points:
+            return jsonify(error_response("轨迹不存在", 404)), 404
+        shape_points = simplify(shape_points, tolerance)
+
+        if fmt == 'binary':
+            return Response(encode_binary([{'shape_id': shape_id, 'points': shape_points}]),
+                            mimetype=SHAPE_FORMATS['binary'])
+        if fmt != 'json':
+            return jsonify(success_response({'shape_id': shape_id, **encode_points(shape_points, fmt)}))
+        return jsonify(success_response(shape_points))
+    except ValueError as e:
+        return jsonify(error_response(str(e))), 400
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def get_tile(z, x, y):
+    """获取 Mapbox Vector Tile，layers 参数选择图层（stops、shapes、vehicles，默认全部）"""
+    try:
+        tile = TileBounds(z, x, y)
+        layers = parse_layers(request.args.get('layers', type=str))
+
+        parts = []
+        for layer in layers:
+            if z < LAYER_MIN_ZOOM[layer]:
+                continue
+            if layer == 'vehicles':
+                # 所有瓦片共用同一份车辆位置，过期后才重新查询
+                rows = vehicle_positions.get()
+                if rows is None:
+                    rows = vehicle_positions.set(execute_query(VEHICLES_QUERY))
+                parts.append(build_layer(layer, rows, tile))
+                continue
+            # 静态图层按数据版本缓存，导入新数据后自动失效
+            key = (feed_version.current(), layer, z, x, y)
+            data = tile_cache.get(key)
+            if data is None:
+                query, params = tile_query(layer, tile)
+                data = tile_cache.put(key, build_layer(layer, execute_query(query, params), tile))
+            parts.append(data)
+
+        return Response(b''.join(parts), mimetype=MVT_MEDIA_TYPE,
+                        headers={'Cache-Control': cache_control(layers)})
+    except ValueError as e:
+        return jsonify(error_response(str(e))), 400
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
 
 
 @app.route('/api/calendar', methods=['GET'])
+@feed_cached()
 def get_calendar():
     """获取服务日历"""
     try:
-        query = """
-            SELECT c.service_id, c.monday, c.tuesday, c.wednesday,
-                   c.thursday, c.friday, c.saturday, c.sunday,
-                   c.start_date, c.end_date, ca.service_description
-            FROM calendar c
-            LEFT JOIN calendar_attributes ca ON c.service_id = ca.service_id
-            ORDER BY c.service_id
-        """
-        calendar = execute_query(query)
+        calendar = execute_query(CALENDAR_QUERY)
         return jsonify(success_response(calendar))
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
@@ -508,14 +480,9 @@ def get_calendar():
 def get_stats():
     """获取数据统计信息"""
     try:
-        stats = {
-            "agencies": execute_count("SELECT COUNT(*) FROM agency"),
-            "routes": execute_count("SELECT COUNT(*) FROM routes"),
-            "stops": execute_count("SELECT COUNT(*) FROM stops"),
-            "trips": execute_count("SELECT COUNT(*) FROM trips"),
-            "stop_times": execute_count("SELECT COUNT(*) FROM stop_times"),
-            "shapes": execute_count("SELECT COUNT(DISTINCT shape_id) FROM shapes")
-        }
+        # 在同一个快照中计数，避免导入过程中各表数量不一致
+        with connection_scope(readonly=True):
+            stats = {name: execute_count(query) for name, query in STATS_QUERIES.items()}
         return jsonify(success_response(stats))
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
@@ -527,27 +494,8 @@ def get_stats():
 def get_realtime_vehicles():
     """获取实时车辆位置信息"""
     try:
-        # 获取查询参数
-        route_id = request.args.get('route_id')
-        limit = min(int(request.args.get('limit', 100)), 500)  # 最大500条
-
-        # 构建查询语句
-        base_query = """
-            SELECT vehicle_id, trip_id, route_id, latitude, longitude,
-                   bearing, speed, position_timestamp, current_status, stop_id
-            FROM realtime_vehicle_positions
-            WHERE position_timestamp >= NOW() - INTERVAL '10 minutes'
-        """
-
-        params = []
-        if route_id:
-            base_query += " AND route_id = %s"
-            params.append(route_id)
-
-        base_query += " ORDER BY position_timestamp DESC LIMIT %s"
-        params.append(limit)
-
-        vehicles = execute_query(base_query, params)
+        query, params, statement = realtime_vehicles_query(request.args)
+        vehicles = execute_query(query, params, prepare=statement)
         return jsonify(success_response(vehicles))
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
@@ -557,68 +505,49 @@ def get_realtime_vehicles():
 def get_realtime_delays():
     """获取实时延误信息"""
     try:
-        # 获取查询参数
-        route_id = request.args.get('route_id')
-        stop_id = request.args.get('stop_id')
-        hours = min(int(request.args.get('hours', 2)), 24)  # 最多24小时
-        limit = min(int(request.args.get('limit', 200)), 1000)
-
-        # 构建查询语句
-        base_query = """
-            SELECT rdr.trip_id, rdr.route_id, rdr.stop_id, rdr.vehicle_id,
-                   rdr.scheduled_time, rdr.actual_time, rdr.arrival_delay,
-                   rdr.departure_delay, rdr.record_timestamp,
-                   r.route_short_name, r.route_long_name,
-                   s.stop_name
-            FROM realtime_delay_records rdr
-            LEFT JOIN routes r ON rdr.route_id = r.route_id
-            LEFT JOIN stops s ON rdr.stop_id = s.stop_id
-            WHERE record_timestamp >= NOW() - INTERVAL '%s hours'
-        """ % hours
-
-        params = []
-        if route_id:
-            base_query += " AND rdr.route_id = %s"
-            params.append(route_id)
-        if stop_id:
-            base_query += " AND rdr.stop_id = %s"
-            params.append(stop_id)
-
-        base_query += " ORDER BY rdr.record_timestamp DESC LIMIT %s"
-        params.append(limit)
-
-        delays = execute_query(base_query, params)
+        query, params = realtime_delays_query(request.args)
+        delays = execute_query(query, params)
         return jsonify(success_response(delays))
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
 
 
+@app.route('/api/realtime/delays/export', methods=['GET'])
+def export_realtime_delays():
+    """以 CSV 格式流式导出延误记录，不限制条数"""
+    try:
+        query, params = delay_export_query(request.args)
+    except Exception as e:
+        return jsonify(error_response(f"参数错误: {str(e)}", 400)), 400
+
+    def generate():
+        # 响应体在请求结束后才开始生成，因此使用独立的连接作用域；
+        # 历史记录导出允许少量复制延迟，使用只读副本分担主库压力
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(DELAY_EXPORT_COLUMNS)
+
+        with connection_scope(readonly=True):
+            for rows in stream_query(query, params, row_format='tuple'):
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    return Response(generate(), mimetype='text/csv', headers={
+        'Content-Disposition': 'attachment; filename=realtime_delays.csv'
+    })
+
+
 @app.route('/api/realtime/summary', methods=['GET'])
 def get_realtime_summary():
     """获取实时数据汇总"""
     try:
-        summary = {
-            "active_vehicles": execute_count("""
-                SELECT COUNT(DISTINCT vehicle_id)
-                FROM realtime_vehicle_positions
-                WHERE position_timestamp >= NOW() - INTERVAL '10 minutes'
-            """),
-            "recent_delays": execute_count("""
-                SELECT COUNT(*)
-                FROM realtime_delay_records
-                WHERE record_timestamp >= NOW() - INTERVAL '1 hour'
-            """),
-            "routes_with_delays": execute_count("""
-                SELECT COUNT(DISTINCT route_id)
-                FROM realtime_delay_records
-                WHERE record_timestamp >= NOW() - INTERVAL '1 hour'
-            """),
-            "avg_delay_minutes": execute_query_one("""
-                SELECT COALESCE(AVG(arrival_delay) / 60, 0) as avg_delay
-                FROM realtime_delay_records
-                WHERE record_timestamp >= NOW() - INTERVAL '1 hour'
-            """)['avg_delay']
-        }
+        summary = {name: execute_count(query) for name, query in REALTIME_SUMMARY_COUNT_QUERIES.items()}
+        summary["avg_delay_minutes"] = execute_query_one(REALTIME_AVG_DELAY_QUERY)['avg_delay']
         return jsonify(success_response(summary))
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
@@ -628,58 +557,8 @@ def get_realtime_summary():
 def get_route_punctuality():
     """获取线路准点率统计"""
     try:
-        # 获取查询参数
-        route_id = request.args.get('route_id')
-        date = request.args.get('date')
-        days = min(int(request.args.get('days', 7)), 90)  # 最多90天
-        limit = min(int(request.args.get('limit', 20)), 100)
-
-        # 构建查询语句
-        if route_id:
-            # 查询特定线路
-            query = """
-                SELECT
-                    rdp.route_id, r.route_short_name, r.route_long_name,
-                    rdp.stat_date, rdp.total_trips, rdp.punctuality_rate,
-                    rdp.avg_arrival_delay / 60 as avg_delay_minutes,
-                    rdp.on_time_trips, rdp.late_trips, rdp.very_late_trips
-                FROM route_daily_punctuality rdp
-                JOIN routes r ON rdp.route_id = r.route_id
-                WHERE rdp.route_id = %s
-            """
-            params = [route_id]
-
-            if date:
-                query += " AND rdp.stat_date = %s"
-                params.append(date)
-            else:
-                query += " AND rdp.stat_date >= CURRENT_DATE - INTERVAL '%s days'" % days
-
-            query += " ORDER BY rdp.stat_date DESC"
-            results = execute_query(query, params)
-        else:
-            # 查询所有线路的汇总
-            query = """
-                SELECT
-                    rdp.route_id, r.route_short_name, r.route_long_name,
-                    AVG(rdp.punctuality_rate) as avg_punctuality_rate,
-                    SUM(rdp.total_trips) as total_trips,
-                    AVG(rdp.avg_arrival_delay) / 60 as avg_delay_minutes,
-                    MAX(rdp.max_arrival_delay) / 60 as max_delay_minutes,
-                    SUM(rdp.on_time_trips) as on_time_trips,
-                    SUM(rdp.early_trips) as early_trips,
-                    SUM(rdp.late_trips) as late_trips,
-                    SUM(rdp.very_late_trips) as very_late_trips,
-                    MAX(rdp.stat_date) as last_stat_date
-                FROM route_daily_punctuality rdp
-                JOIN routes r ON rdp.route_id = r.route_id
-                WHERE rdp.stat_date >= CURRENT_DATE - INTERVAL '%s days'
-            """ % days
-            query += " GROUP BY rdp.route_id, r.route_short_name, r.route_long_name"
-            query += " ORDER BY avg_punctuality_rate DESC LIMIT %s"
-            params = [limit]
-            results = execute_query(query, params)
-
+        query, params = route_punctuality_query(request.args)
+        results = execute_query(query, params)
         return jsonify(success_response(results))
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
@@ -689,56 +568,8 @@ def get_route_punctuality():
 def get_stop_punctuality():
     """获取站点准点率统计"""
     try:
-        # 获取查询参数
-        stop_id = request.args.get('stop_id')
-        date = request.args.get('date')
-        days = min(int(request.args.get('days', 7)), 90)
-        limit = min(int(request.args.get('limit', 20)), 100)
-
-        if stop_id:
-            # 查询特定站点
-            query = """
-                SELECT
-                    sdp.stop_id, s.stop_name, s.stop_lat, s.stop_lon,
-                    sdp.stat_date, sdp.total_visits, sdp.punctuality_rate,
-                    sdp.avg_arrival_delay / 60 as avg_delay_minutes
-                FROM stop_daily_punctuality sdp
-                JOIN stops s ON sdp.stop_id = s.stop_id
-                WHERE sdp.stop_id = %s
-            """
-            params = [stop_id]
-
-            if date:
-                query += " AND sdp.stat_date = %s"
-                params.append(date)
-            else:
-                query += " AND sdp.stat_date >= CURRENT_DATE - INTERVAL '%s days'" % days
-
-            query += " ORDER BY sdp.stat_date DESC"
-            results = execute_query(query, params)
-        else:
-            # 查询所有站点的汇总
-            query = """
-                SELECT
-                    sdp.stop_id, s.stop_name, s.stop_lat, s.stop_lon,
-                    AVG(sdp.punctuality_rate) as avg_punctuality_rate,
-                    SUM(sdp.total_visits) as total_visits,
-                    AVG(sdp.avg_arrival_delay) / 60 as avg_delay_minutes,
-                    MAX(sdp.max_arrival_delay) / 60 as max_delay_minutes,
-                    SUM(sdp.on_time_visits) as on_time_visits,
-                    SUM(sdp.early_visits) as early_visits,
-                    SUM(sdp.late_visits) as late_visits,
-                    SUM(sdp.very_late_visits) as very_late_visits,
-                    MAX(sdp.stat_date) as last_stat_date
-                FROM stop_daily_punctuality sdp
-                JOIN stops s ON sdp.stop_id = s.stop_id
-                WHERE sdp.stat_date >= CURRENT_DATE - INTERVAL '%s days'
-            """ % days
-            query += " GROUP BY sdp.stop_id, s.stop_name, s.stop_lat, s.stop_lon"
-            query += " ORDER BY avg_punctuality_rate DESC LIMIT %s"
-            params = [limit]
-            results = execute_query(query, params)
-
+        query, params = stop_punctuality_query(request.args)
+        results = execute_query(query, params)
         return jsonify(success_response(results))
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
@@ -748,83 +579,18 @@ def get_stop_punctuality():
 def get_system_punctuality_overview():
     """获取系统准点率概览"""
     try:
-        # 获取查询参数
-        days = min(int(request.args.get('days', 7)), 90)
-
-        # 查询系统概览
-        query = """
-            SELECT
-                COUNT(DISTINCT rdp.route_id) as total_routes,
-                SUM(rdp.total_trips) as total_trips,
-                AVG(rdp.punctuality_rate) as system_punctuality_rate,
-                AVG(rdp.avg_arrival_delay) / 60 as system_avg_delay_minutes,
-                MAX(rdp.stat_date) as latest_data_date
-            FROM route_daily_punctuality rdp
-            WHERE rdp.stat_date >= CURRENT_DATE - INTERVAL '%s days'
-        """ % days
-
-        system_stats = execute_query_one(query)
-
-        if not system_stats or system_stats['total_routes'] == 0:
-            # 如果没有统计数据，返回默认值
-            overview = {
-                "total_routes": 0,
-                "total_trips": 0,
-                "system_punctuality_rate": 0,
-                "system_avg_delay_minutes": 0,
-                "latest_data_date": None,
-                "best_routes": [],
-                "worst_routes": [],
-                "analysis_period": f"最近 {days} 天",
-                "data_available": False
-            }
-            return jsonify(success_response(overview))
-
-        # 获取最佳和最差线路
-        best_routes_query = """
-            SELECT
-                rdp.route_id, r.route_short_name, r.route_long_name,
-                AVG(rdp.punctuality_rate) as avg_punctuality_rate,
-                SUM(rdp.total_trips) as total_trips
-            FROM route_daily_punctuality rdp
-            JOIN routes r ON rdp.route_id = r.route_id
-            WHERE rdp.stat_date >= CURRENT_DATE - INTERVAL '%s days'
-            GROUP BY rdp.route_id, r.route_short_name, r.route_long_name
-            ORDER BY avg_punctuality_rate DESC
-            LIMIT 5
-        """ % days
-
-        worst_routes_query = """
-            SELECT
-                rdp.route_id, r.route_short_name, r.route_long_name,
-                AVG(rdp.punctuality_rate) as avg_punctuality_rate,
-                SUM(rdp.total_trips) as total_trips
-            FROM route_daily_punctuality rdp
-            JOIN routes r ON rdp.route_id = r.route_id
-            WHERE rdp.stat_date >= CURRENT_DATE - INTERVAL '%s days'
-            AND rdp.total_trips >= 10  -- 至少10个班次
-            GROUP BY rdp.route_id, r.route_short_name, r.route_long_name
-            ORDER BY avg_punctuality_rate ASC
-            LIMIT 5
-        """ % days
-
-        best_routes = execute_query(best_routes_query)
-        worst_routes = execute_query(worst_routes_query)
-
-        # 构建返回结果
-        overview = {
-            "total_routes": system_stats['total_routes'],
-            "total_trips": system_stats['total_trips'],
-            "system_punctuality_rate": round(float(system_stats['system_punctuality_rate'] or 0), 2),
-            "system_avg_delay_minutes": round(float(system_stats['system_avg_delay_minutes'] or 0), 2),
-            "latest_data_date": system_stats['latest_data_date'].strftime('%Y-%m-%d') if system_stats['latest_data_date'] else None,
-            "best_routes": best_routes,
-            "worst_routes": worst_routes,
-            "analysis_period": f"最近 {days} 天",
-            "data_available": True
-        }
-
-        return jsonify(success_response(overview))
+        days = punctuality_days(request.args)
+        system_query, best_routes_query, worst_routes_query = punctuality_overview_queries(days)
+
+        # 概览和最佳/最差线路在同一个快照中查询，保证数据一致
+        best_routes = worst_routes = []
+        with connection_scope(readonly=True):
+            system_stats = execute_query_one(system_query)
+            if has_punctuality_data(system_stats):
+                best_routes = execute_query(best_routes_query)
+                worst_routes = execute_query(worst_routes_query)
+
+        return jsonify(success_response(punctuality_overview(system_stats, best_routes, worst_routes, days)))
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
 
@@ -833,56 +599,9 @@ def get_system_punctuality_overview():
 def get_hourly_punctuality():
     """获取时段准点率统计"""
     try:
-        # 获取查询参数
-        route_id = request.args.get('route_id')
-        date = request.args.get('date')
-
-        if not date:
-            date = 'CURRENT_DATE'
-
-        # 构建查询语句
-        query = """
-            SELECT
-                hour_of_day,
-                AVG(punctuality_rate) as avg_punctuality_rate,
-                SUM(total_trips) as total_trips,
-                AVG(avg_arrival_delay) / 60 as avg_delay_minutes
-            FROM hourly_punctuality_stats
-            WHERE stat_date = %s
-        """ % ('CURRENT_DATE' if date == 'CURRENT_DATE' else f"'{date}'")
-
-        params = []
-        if route_id:
-            query += " AND route_id = %s"
-            params.append(route_id)
-
-        query += " GROUP BY hour_of_day ORDER BY hour_of_day"
-
-        hourly_stats = execute_query(query, params)
-
+        query, params = hourly_punctuality_query(request.args)
         # 确保返回24小时的数据
-        result = []
-        hour_data = {stat['hour_of_day']: stat for stat in hourly_stats}
-
-        for hour in range(24):
-            if hour in hour_data:
-                result.append({
-                    'hour': hour,
-                    'hour_label': f"{hour:02d}:00",
-                    'punctuality_rate': round(float(hour_data[hour]['avg_punctuality_rate'] or 0), 2),
-                    'total_trips': hour_data[hour]['total_trips'],
-                    'avg_delay_minutes': round(float(hour_data[hour]['avg_delay_minutes'] or 0), 2)
-                })
-            else:
-                result.append({
-                    'hour': hour,
-                    'hour_label': f"{hour:02d}:00",
-                    'punctuality_rate': 0,
-                    'total_trips': 0,
-                    'avg_delay_minutes': 0
-                })
-
-        return jsonify(success_response(result))
+        return jsonify(success_response(hourly_punctuality(execute_query(query, params))))
     except Exception as e:
         return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
 
@@ -892,23 +611,8 @@ def punctuality_config():
     """获取或更新准点率配置"""
     try:
         if request.method == 'GET':
-            # 获取配置
-            query = "SELECT config_key, config_value, description FROM punctuality_config ORDER BY config_key"
-            configs = execute_query(query)
-
-            # 转换为字典格式
-            config_dict = {}
-            for config in configs:
-                # 尝试转换为数值类型
-                try:
-                    if '.' in config['config_value']:
-                        config_dict[config['config_key']] = float(config['config_value'])
-                    else:
-                        config_dict[config['config_key']] = int(config['config_value'])
-                except ValueError:
-                    config_dict[config['config_key']] = config['config_value']
-
-            return jsonify(success_response(config_dict))
+            configs = execute_query(PUNCTUALITY_CONFIG_QUERY)
+            return jsonify(success_response(punctuality_config_values(configs)))
 
         else:  # PUT
             # 更新配置
@@ -917,12 +621,7 @@ def punctuality_config():
                 return jsonify(error_response("配置数据不能为空", 400)), 400
 
             for key, value in configs:
-                query = """
-                    UPDATE punctuality_config
-                    SET config_value = %s, updated_at = CURRENT_TIMESTAMP
-                    WHERE config_key = %s
-                """
-                execute_query(query, (str(value), key))
+                execute_query(PUNCTUALITY_CONFIG_UPDATE, (str(value), key))
 
             return jsonify(success_response({"message": "配置更新成功"}))
 
@@ -951,4 +650,11 @@ if __name__ == '__main__':
     print(f"调试模式: {debug}")
     print(f"API 文档: http://localhost:{port}/api/health")
 
+    # 启动时构建搜索索引，使第一次搜索不必等待加载
+    try:
+        Database.ensure_initialized()
+        search_index.ensure_ready()
+    except Exception as e:
+        print(f"搜索索引构建失败，将在第一次搜索时重试: {e}")
+
     app.run(host='0.0.0.0', port=port, debug=debug)
@@ -0,0 +1,646 @@
+#!/usr/bin/env python3
+"""
+GTFS 数据 RESTful API 服务（ASGI 版本）
+与 api.py 提供相同的接口和响应格式，基于 Quart 和 asyncpg，
+等待数据库时不占用线程，单个进程即可服务大量并发连接
+
+响应格式、参数解析和 SQL 语句与 api.py 共用 api_common.py；本模块不导入 api.py，
+进程中不会加载 Flask、psycopg2 和同步连接池
+
+启动方式:
+    hypercorn api_asgi:app --bind 0.0.0.0:5000
+"""
+
+from quart import Quart, Response, jsonify, request
+from db_async import AsyncDatabase, connection_scope, execute_query, execute_query_one, execute_count, stream_query
+from pagination import CursorError, KeysetPage, count_query, estimated_rows
+from shape_geometry import (parse_bbox, simplification, simplify, level_points, route_shapes_query,
+                            group_route_shapes, route_shape_levels_query, group_level_shapes, SHAPE_LEVEL_QUERY)
+from shape_formats import SHAPE_FORMATS, negotiate, encode_points, encode_binary
+from search_index import search_index, STOPS_QUERY, ROUTES_QUERY, fuzzy_queries, merge_fuzzy
+from vector_tiles import (TileBounds, MVT_MEDIA_TYPE, LAYER_MIN_ZOOM, VEHICLES_QUERY, parse_layers, tile_query,
+                          build_layer, cache_control, tile_cache, vehicle_positions)
+from feed_version import feed_version, FEED_VERSION_QUERY
+from http_cache import make_etag, etag_matches, cache_headers
+from api_common import (
+    DELAY_EXPORT_COLUMNS, success_response, error_response,
+    pagination_args, offset_query, offset_pagination, metrics_args, search_args,
+    AGENCIES_QUERY, AGENCY_QUERY, ROUTE_QUERY, ROUTE_DIRECTIONS_QUERY, STOP_QUERY, STOP_ROUTES_QUERY,
+    TRIP_QUERY, TRIP_STOP_TIMES_QUERY, SHAPE_POINTS_QUERY, CALENDAR_QUERY, STATS_QUERIES,
+    routes_list, stops_list, trips_list, route_stops_query,
+    REALTIME_SUMMARY_COUNT_QUERIES, REALTIME_AVG_DELAY_QUERY,
+    realtime_vehicles_query, realtime_delays_query, delay_export_query,
+    PUNCTUALITY_CONFIG_QUERY, PUNCTUALITY_CONFIG_UPDATE, punctuality_days,
+    route_punctuality_query, stop_punctuality_query, punctuality_overview_queries,
+    has_punctuality_data, punctuality_overview, hourly_punctuality_query, hourly_punctuality,
+    punctuality_config_values,
+)
+from functools import wraps
+import asyncio
+from query_metrics import metrics
+import csv
+import io
+import os
+
+app = Quart(__name__)
+
+
+@app.before_serving
+async def startup():
+    """初始化数据库连接池并构建搜索索引"""
+    await AsyncDatabase.initialize()
+    try:
+        await load_search_index()
+    except Exception as e:
+        print(f"搜索索引构建失败，将在第一次搜索时重试: {e}")
+
+
+async def load_search_index():
+    """从数据库加载搜索索引"""
+    search_index.build(await execute_query(STOPS_QUERY), await execute_query(ROUTES_QUERY))
+
+
+async def refresh_search_index():
+    """后台重建过期的搜索索引"""
+    try:
+        await load_search_index()
+    except Exception as e:
+        print(f"搜索索引重建失败: {e}")
+    finally:
+        search_index.release_refresh()
+
+
+async def current_feed_version() -> str:
+    """返回当前数据版本，缓存过期时重新查询"""
+    if feed_version.expired():
+        return feed_version.update(await execute_query_one(FEED_VERSION_QUERY))
+    return feed_version.value
+
+
+def feed_cached(*vary: str):
+    """静态 GTFS 接口的 HTTP 缓存装饰器，见 api.feed_cached"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            try:
+                version = await current_feed_version()
+            except Exception as e:
+                print(f"数据版本查询失败，跳过 HTTP 缓存: {e}")
+                return await view(*args, **kwargs)
+            if not feed_version.known:
+                return await view(*args, **kwargs)
+
+            etag = make_etag(version, request.full_path, [request.headers.get(name, '') for name in vary])
+            headers = cache_headers(etag, vary)
+            if etag_matches(request.headers.get('If-None-Match'), etag):
+                return Response('', status=304, headers=headers)
+
+            response = await app.make_response(await view(*args, **kwargs))
+            if response.status_code == 200:
+                response.headers.update(headers)
+            return response
+        return wrapper
+    return decorator
+
+
+@app.after_serving
+async def shutdown():
+    """关闭数据库连接池"""
+    await AsyncDatabase.close_all_connections()
+
+
+@app.after_request
+async def add_cors_headers(response):
+    """允许跨域访问（与 api.py 中 flask_cors 的默认配置一致）"""
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    if request.method == 'OPTIONS':
+        response.headers['Access-Control-Allow-Methods'] = 'GET, PUT, OPTIONS'
+        requested = request.headers.get('Access-Control-Request-Headers')
+        if requested:
+            response.headers['Access-Control-Allow-Headers'] = requested
+    return response
+
+
+async def query_total(mode: str, from_sql: str, where_sql: str, params: list):
+    """按 count 参数统计总数，与 api.query_total 相同"""
+    query = count_query(mode, from_sql, where_sql)
+    if mode == 'exact':
+        return await execute_count(query, tuple(params)), False
+    if mode == 'estimate':
+        return estimated_rows(await execute_query_one(query, tuple(params))), True
+    return None, False
+
+
+async def paginate(options, columns_sql: str, from_sql: str, where_sql: str,
+                   params: list, keys: list, order_by: str):
+    """执行分页查询，返回 (当前页的行, 分页信息)，与 api.paginate 相同"""
+    page_size = options['page_size']
+    keyset = KeysetPage(keys, page_size, options['cursor']) if options['keyset'] else None
+    total, estimated = await query_total(options['count'], from_sql, where_sql, params)
+
+    if keyset is not None:
+        query, query_params = keyset.query(columns_sql, from_sql, where_sql, params)
+        rows, pagination = keyset.result(await execute_query(query, tuple(query_params)))
+    else:
+        query, query_params = offset_query(columns_sql, from_sql, where_sql, params, order_by,
+                                           options['page'], page_size)
+        rows = await execute_query(query, query_params)
+        pagination = offset_pagination(options['page'], page_size, total)
+
+    pagination.update({"total": total, "total_is_estimate": estimated})
+    return rows, pagination
+
+
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    """健康检查接口"""
+    try:
+        result = await execute_query_one("SELECT 1 as status")
+        if result:
+            return jsonify(success_response({
+                "status": "healthy",
+                "database": "connected",
+                "pool": AsyncDatabase.pool_stats()
+            }))
+        return jsonify(error_response("数据库连接失败", 500)), 500
+    except Exception as e:
+        return jsonify(error_response(f"健康检查失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/metrics', methods=['GET'])
+async def get_metrics():
+    """获取查询性能统计: 各语句的耗时直方图、行数、慢查询次数以及连接池等待时间"""
+    try:
+        limit, order_by = metrics_args(request.args)
+        result = metrics.snapshot(limit=limit, order_by=order_by)
+        result['pool'] = AsyncDatabase.pool_stats()
+        return jsonify(success_response(result))
+    except ValueError as e:
+        return jsonify(error_response(str(e))), 400
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/agencies', methods=['GET'])
+@feed_cached()
+async def get_agencies():
+    """获取所有运营机构"""
+    try:
+        agencies = await execute_query(AGENCIES_QUERY)
+        return jsonify(success_response(agencies))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/agencies/<agency_id>', methods=['GET'])
+@feed_cached()
+async def get_agency(agency_id):
+    """获取指定运营机构详情"""
+    try:
+        agency = await execute_query_one(AGENCY_QUERY, (agency_id,), prepare="api_agency")
+        if agency:
+            return jsonify(success_response(agency))
+        return jsonify(error_response("运营机构不存在", 404)), 404
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/routes', methods=['GET'])
+async def get_routes():
+    """获取所有线路，支持分页（page 或 cursor）和筛选"""
+    try:
+        routes, pagination = paginate(pagination_args(request.args), **routes_list(request.args))
+        return jsonify(success_response({
+            "routes": routes,
+            "pagination": pagination
+        }))
+    except (ValueError, CursorError) as e:
+        return jsonify(error_response(str(e))), 400
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/routes/<route_id>', methods=['GET'])
+@feed_cached()
+async def get_route(route_id):
+    """获取指定线路详情"""
+    try:
+        route = await execute_query_one(ROUTE_QUERY, (route_id,), prepare="api_route")
+        if route:
+            return jsonify(success_response(route))
+        return jsonify(error_response("线路不存在", 404)), 404
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/routes/<route_id>/directions', methods=['GET'])
+@feed_cached()
+async def get_route_directions(route_id):
+    """获取线路的所有方向"""
+    try:
+        directions = await execute_query(ROUTE_DIRECTIONS_QUERY, (route_id,), prepare="api_route_directions")
+        return jsonify(success_response(directions))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/routes/<route_id>/stops', methods=['GET'])
+@feed_cached()
+async def get_route_stops(route_id):
+    """获取线路的所有站点"""
+    try:
+        query, params = route_stops_query(route_id, request.args.get('direction_id', type=int))
+        stops = await execute_query(query, params)
+        return jsonify(success_response(stops))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/stops', methods=['GET'])
+async def get_stops():
+    """获取所有站点，支持分页（page 或 cursor）和地理位置筛选"""
+    try:
+        stops, pagination = paginate(pagination_args(request.args), **stops_list(request.args))
+        return jsonify(success_response({
+            "stops": stops,
+            "pagination": pagination
+        }))
+    except (ValueError, CursorError) as e:
+        return jsonify(error_response(str(e))), 400
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/stops/<stop_id>', methods=['GET'])
+@feed_cached()
+async def get_stop(stop_id):
+    """获取指定站点详情"""
+    try:
+        stop = await execute_query_one(STOP_QUERY, (stop_id,), prepare="api_stop")
+        if stop:
+            return jsonify(success_response(stop))
+        return jsonify(error_response("站点不存在", 404)), 404
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/stops/<stop_id>/routes', methods=['GET'])
+@feed_cached()
+async def get_stop_routes(stop_id):
+    """获取经过指定站点的所有线路"""
+    try:
+        routes = await execute_query(STOP_ROUTES_QUERY, (stop_id,), prepare="api_stop_routes")
+        return jsonify(success_response(routes))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/search', methods=['GET'])
+async def search_suggestions():
+    """站点和线路联想搜索，按匹配程度排序"""
+    try:
+        text, types, limit, fuzzy = search_args(request.args)
+    except ValueError as e:
+        return jsonify(error_response(str(e))), 400
+
+    try:
+        if not search_index.ready:
+            await load_search_index()
+        elif search_index.claim_refresh():
+            asyncio.ensure_future(refresh_search_index())
+
+        results = search_index.search(text, types, limit)
+        if fuzzy and len(results) < limit:
+            results = merge_fuzzy(results, [
+                (kind, await execute_query(query, params))
+                for kind, query, params in fuzzy_queries(text, types, limit)
+            ], limit)
+
+        return jsonify(success_response(results))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/trips', methods=['GET'])
+async def get_trips():
+    """获取班次信息，支持按线路筛选和分页（page 或 cursor）"""
+    try:
+        trips, pagination = paginate(pagination_args(request.args), **trips_list(request.args))
+        return jsonify(success_response({
+            "trips": trips,
+            "pagination": pagination
+        }))
+    except (ValueError, CursorError) as e:
+        return jsonify(error_response(str(e))), 400
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/trips/<trip_id>', methods=['GET'])
+@feed_cached()
+async def get_trip(trip_id):
+    """获取指定班次详情"""
+    try:
+        trip = await execute_query_one(TRIP_QUERY, (trip_id,), prepare="api_trip")
+        if trip:
+            return jsonify(success_response(trip))
+        return jsonify(error_response("班次不存在", 404)), 404
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/trips/<trip_id>/stop_times', methods=['GET'])
+@feed_cached()
+async def get_trip_stop_times(trip_id):
+    """获取班次的所有站点时刻表"""
+    try:
+        stop_times = await execute_query(TRIP_STOP_TIMES_QUERY, (trip_id,), prepare="api_trip_stop_times")
+        return jsonify(success_response(stop_times))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/routes/<route_id>/shapes', methods=['GET'])
+@feed_cached('Accept')
+async def get_route_shapes(route_id):
+    """获取指定线路的所有轨迹（一次查询取出所有轨迹点），支持简化级别、范围裁剪和紧凑格式"""
+    try:
+        direction_id = request.args.get('direction_id', type=int)
+        bbox = parse_bbox(request.args.get('bbox', type=str))
+        fmt = negotiate(request.args.get('format', type=str), request.accept_mimetypes)
+        level, tolerance = simplification(request.args.get('tolerance', type=float),
+                                          request.args.get('zoom', type=float))
+
+        shapes = None
+        if level is not None:
+            # 优先使用预先计算的简化级别，尚未生成时回落到原始轨迹
+            query, params = route_shape_levels_query(route_id, level, direction_id)
+            rows = await execute_query(query, params)
+            if rows:
+                shapes = group_level_shapes(rows, bbox, tolerance)
+        if shapes is None:
+            query, params = route_shapes_query(route_id, direction_id, bbox)
+            shapes = group_route_shapes(await execute_query(query, params), tolerance)
+
+        if fmt == 'binary':
+            return Response(encode_binary(shapes), mimetype=SHAPE_FORMATS['binary'])
+        if fmt != 'json':
+            for shape in shapes:
+                shape.update(encode_points(shape.pop('points'), fmt))
+        return jsonify(success_response(shapes))
+    except ValueError as e:
+        return jsonify(error_response(str(e))), 400
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/shapes/<shape_id>', methods=['GET'])
+@feed_cached('Accept')
+async def get_shape(shape_id):
+    """获取线路轨迹，zoom 选择简化级别（tolerance 指定容差时优先），format 参数或 Accept 头选择紧凑格式"""
+    try:
+        fmt = negotiate(request.args.get('format', type=str), request.accept_mimetypes)
+        level, tolerance = simplification(request.args.get('tolerance', type=float),
+                                          request.args.get('zoom', type=float))
+
+        shape_points = None
+        if level is not None:
+            row = await execute_query_one(SHAPE_LEVEL_QUERY, (shape_id, level), prepare="api_shape_level")
+            if row:
+                shape_points = level_points(row)
+        if shape_points is None:
+            shape_points = await execute_query(SHAPE_POINTS_QUERY, (shape_id,), prepare="api_shape")
+        if not shape_points:
+            return jsonify(error_response("轨迹不存在", 404)), 404
+        shape_points = simplify(shape_points, tolerance)
+
+        if fmt == 'binary':
+            return Response(encode_binary([{'shape_id': shape_id, 'points': shape_points}]),
+                            mimetype=SHAPE_FORMATS['binary'])
+        if fmt != 'json':
+            return jsonify(success_response({'shape_id': shape_id, **encode_points(shape_points, fmt)}))
+        return jsonify(success_response(shape_points))
+    except ValueError as e:
+        return jsonify(error_response(str(e))), 400
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+async def get_tile(z, x, y):
+    """获取 Mapbox Vector Tile，layers 参数选择图层（stops、shapes、vehicles，默认全部）"""
+    try:
+        tile = TileBounds(z, x, y)
+        layers = parse_layers(request.args.get('layers', type=str))
+
+        parts = []
+        for layer in layers:
+            if z < LAYER_MIN_ZOOM[layer]:
+                continue
+            if layer == 'vehicles':
+                # 所有瓦片共用同一份车辆位置，过期后才重新查询
+                rows = vehicle_positions.get()
+                if rows is None:
+                    rows = vehicle_positions.set(await execute_query(VEHICLES_QUERY))
+                parts.append(build_layer(layer, rows, tile))
+                continue
+            # 静态图层按数据版本缓存，导入新数据后自动失效
+            key = (await current_feed_version(), layer, z, x, y)
+            data = tile_cache.get(key)
+            if data is None:
+                query, params = tile_query(layer, tile)
+                data = tile_cache.put(key, build_layer(layer, await execute_query(query, params), tile))
+            parts.append(data)
+
+        return Response(b''.join(parts), mimetype=MVT_MEDIA_TYPE,
+                        headers={'Cache-Control': cache_control(layers)})
+    except ValueError as e:
+        return jsonify(error_response(str(e))), 400
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/calendar', methods=['GET'])
+@feed_cached()
+async def get_calendar():
+    """获取服务日历"""
+    try:
+        calendar = await execute_query(CALENDAR_QUERY)
+        return jsonify(success_response(calendar))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/stats', methods=['GET'])
+async def get_stats():
+    """获取数据统计信息"""
+    try:
+        # 在同一个快照中计数，避免导入过程中各表数量不一致
+        async with connection_scope(readonly=True):
+            stats = {name: await execute_count(query) for name, query in STATS_QUERIES.items()}
+        return jsonify(success_response(stats))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+# ===== 准点率和实时数据接口 =====
+
+@app.route('/api/realtime/vehicles', methods=['GET'])
+async def get_realtime_vehicles():
+    """获取实时车辆位置信息"""
+    try:
+        query, params, statement = realtime_vehicles_query(request.args)
+        vehicles = await execute_query(query, params, prepare=statement)
+        return jsonify(success_response(vehicles))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/realtime/delays', methods=['GET'])
+async def get_realtime_delays():
+    """获取实时延误信息"""
+    try:
+        query, params = realtime_delays_query(request.args)
+        delays = await execute_query(query, params)
+        return jsonify(success_response(delays))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/realtime/delays/export', methods=['GET'])
+async def export_realtime_delays():
+    """以 CSV 格式流式导出延误记录，不限制条数"""
+    try:
+        query, params = delay_export_query(request.args)
+    except Exception as e:
+        return jsonify(error_response(f"参数错误: {str(e)}", 400)), 400
+
+    async def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(DELAY_EXPORT_COLUMNS)
+
+        async with connection_scope(readonly=True):
+            async for rows in stream_query(query, params, row_format='tuple'):
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    return Response(generate(), mimetype='text/csv', headers={
+        'Content-Disposition': 'attachment; filename=realtime_delays.csv'
+    })
+
+
+@app.route('/api/realtime/summary', methods=['GET'])
+async def get_realtime_summary():
+    """获取实时数据汇总"""
+    try:
+        summary = {name: await execute_count(query) for name, query in REALTIME_SUMMARY_COUNT_QUERIES.items()}
+        summary["avg_delay_minutes"] = (await execute_query_one(REALTIME_AVG_DELAY_QUERY))['avg_delay']
+        return jsonify(success_response(summary))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/punctuality/routes', methods=['GET'])
+async def get_route_punctuality():
+    """获取线路准点率统计"""
+    try:
+        query, params = route_punctuality_query(request.args)
+        results = await execute_query(query, params)
+        return jsonify(success_response(results))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/punctuality/stops', methods=['GET'])
+async def get_stop_punctuality():
+    """获取站点准点率统计"""
+    try:
+        query, params = stop_punctuality_query(request.args)
+        results = await execute_query(query, params)
+        return jsonify(success_response(results))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/punctuality/overview', methods=['GET'])
+async def get_system_punctuality_overview():
+    """获取系统准点率概览"""
+    try:
+        days = punctuality_days(request.args)
+        system_query, best_routes_query, worst_routes_query = punctuality_overview_queries(days)
+
+        # 概览和最佳/最差线路在同一个快照中查询，保证数据一致
+        best_routes = worst_routes = []
+        async with connection_scope(readonly=True):
+            system_stats = await execute_query_one(system_query)
+            if has_punctuality_data(system_stats):
+                best_routes = await execute_query(best_routes_query)
+                worst_routes = await execute_query(worst_routes_query)
+
+        return jsonify(success_response(punctuality_overview(system_stats, best_routes, worst_routes, days)))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/punctuality/hourly', methods=['GET'])
+async def get_hourly_punctuality():
+    """获取时段准点率统计"""
+    try:
+        query, params = hourly_punctuality_query(request.args)
+        # 确保返回24小时的数据
+        return jsonify(success_response(hourly_punctuality(await execute_query(query, params))))
+    except Exception as e:
+        return jsonify(error_response(f"查询失败: {str(e)}", 500)), 500
+
+
+@app.route('/api/punctuality/config', methods=['GET', 'PUT'])
+async def punctuality_config():
+    """获取或更新准点率配置"""
+    try:
+        if request.method == 'GET':
+            configs = await execute_query(PUNCTUALITY_CONFIG_QUERY)
+            return jsonify(success_response(punctuality_config_values(configs)))
+
+        else:  # PUT
+            # 更新配置
+            configs = await request.get_json()
+            if not configs:
+                return jsonify(error_response("配置数据不能为空", 400)), 400
+
+            for key, value in configs:
+                await execute_query(PUNCTUALITY_CONFIG_UPDATE, (str(value), key))
+
+            return jsonify(success_response({"message": "配置更新成功"}))
+
+    except Exception as e:
+        return jsonify(error_response(f"操作失败: {str(e)}", 500)), 500
+
+
+@app.errorhandler(404)
+async def not_found(error):
+    """404 错误处理"""
+    return jsonify(error_response("接口不存在", 404)), 404
+
+
+@app.errorhandler(500)
+async def internal_error(error):
+    """500 错误处理"""
+    return jsonify(error_response("服务器内部错误", 500)), 500
+
+
+if __name__ == '__main__':
+    port = int(os.getenv('PORT', 5000))
+    debug = os.getenv('DEBUG', 'True').lower() == 'true'
+
+    print("启动 GTFS API 服务（ASGI）...")
+    print(f"端口: {port}")
+    print(f"调试模式: {debug}")
+    print(f"API 文档: http://localhost:{port}/api/health")
+
+    app.run(host='0.0.0.0', port=port, debug=debug)
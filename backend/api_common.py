@@ -0,0 +1,738 @@
+"""
+api.py（Flask）和 api_asgi.py（Quart）共用的接口定义
+
+两个应用提供相同的接口和响应格式。这里集中定义与 Web 框架和数据库驱动无关的部分:
+响应格式、请求参数的解析、各接口的 SQL 语句以及查询结果的整理。
+应用只负责执行查询（同步或 await）并生成响应，本模块不导入 Flask、Quart、psycopg2 或 asyncpg。
+
+参数解析函数接受 request.args（Flask 和 Quart 都是 werkzeug 的 MultiDict，支持 get(key, default, type=...)）。
+
+使用方法:
+    query, params = route_stops_query(route_id, request.args.get('direction_id', type=int))
+    return jsonify(success_response(execute_query(query, params)))
+"""
+
+import os
+from typing import Dict, Any, List, Optional, Tuple
+
+from pagination import COUNT_MODES, nulls_last
+from search_index import SEARCH_TYPES
+
+# 实时数据接口需要读取最新数据，始终使用主库
+REALTIME_PATH_PREFIX = '/api/realtime/'
+
+# /api/metrics 支持的排序字段
+METRICS_ORDER_FIELDS = ('total_ms', 'avg_ms', 'max_ms', 'count', 'rows', 'slow')
+
+# /api/realtime/delays/export 导出的列
+DELAY_EXPORT_COLUMNS = [
+    'trip_id', 'route_id', 'stop_id', 'vehicle_id', 'scheduled_time', 'actual_time',
+    'arrival_delay', 'departure_delay', 'record_timestamp'
+]
+
+
+def success_response(data: Any, message: str = "success") -> Dict:
+    """成功响应格式"""
+    return {
+        "code": 200,
+        "message": message,
+        "data": data
+    }
+
+
+def error_response(message: str, code: int = 400) -> Dict:
+    """错误响应格式"""
+    return {
+        "code": code,
+        "message": message,
+        "data": None
+    }
+
+
+# ===== 分页 =====
+
+# page_size 的上限，超出范围的 page_size 和 page 会被截断到有效范围内
+MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 1000))
+
+
+def pagination_args(args) -> Dict[str, Any]:
+    """
+    解析列表接口的分页参数
+
+    带 cursor 参数（可以为空，表示第一页）时使用键集分页，否则使用 page/page_size 的 OFFSET 分页。
+    count 参数控制总数统计方式: exact、estimate 或 none；
+    默认 OFFSET 分页精确计数，键集分页使用规划器估计值。
+    page 小于 1 时按 1 处理，page_size 截断到 1 ~ MAX_PAGE_SIZE。
+
+    Raises:
+        ValueError: count 参数无效
+    """
+    keyset = 'cursor' in args
+    count = args.get('count', 'estimate' if keyset else 'exact', type=str)
+    if count not in COUNT_MODES:
+        raise ValueError(f"count 参数必须是 {', '.join(COUNT_MODES)} 之一")
+    return {
+        'keyset': keyset,
+        'cursor': args.get('cursor', type=str),
+        'page': max(args.get('page', 1, type=int), 1),
+        'page_size': min(max(args.get('page_size', 20, type=int), 1), MAX_PAGE_SIZE),
+        'count': count,
+    }
+
+
+def offset_query(columns_sql: str, from_sql: str, where_sql: str, params: list,
+                 order_by: str, page: int, page_size: int) -> Tuple[str, tuple]:
+    """OFFSET 分页的查询语句和参数"""
+    query = f"""
+        SELECT {columns_sql}
+        {from_sql}
+        WHERE {where_sql}
+        ORDER BY {order_by}
+        LIMIT %s OFFSET %s
+    """
+    return query, tuple(params) + (page_size, (page - 1) * page_size)
+
+
+def offset_pagination(page: int, page_size: int, total: Optional[int]) -> Dict[str, Any]:
+    """OFFSET 分页的分页信息，total 为 None（count=none）时不计算总页数"""
+    return {
+        "page": page,
+        "page_size": page_size,
+        "total_pages": (total + page_size - 1) // page_size if total is not None else None
+    }
+
+
+# ===== 静态 GTFS 接口 =====
+
+AGENCY_COLUMNS = """agency_id, agency_name, agency_url, agency_timezone,
+                   agency_lang, agency_phone, agency_fare_url, agency_email"""
+
+AGENCIES_QUERY = f"""
+    SELECT {AGENCY_COLUMNS}
+    FROM agency
+    ORDER BY agency_name
+"""
+
+AGENCY_QUERY = f"""
+    SELECT {AGENCY_COLUMNS}
+    FROM agency
+    WHERE agency_id = %s
+"""
+
+ROUTE_COLUMNS = """r.route_id, r.agency_id, r.route_short_name, r.route_long_name,
+                   r.route_desc, r.route_type, r.route_url, r.route_color, r.route_text_color,
+                   ra.category, ra.subcategory, ra.running_way"""
+
+ROUTE_FROM = "FROM routes r LEFT JOIN route_attributes ra ON r.route_id = ra.route_id"
+
+ROUTE_QUERY = f"""
+    SELECT {ROUTE_COLUMNS}
+    {ROUTE_FROM}
+    WHERE r.route_id = %s
+"""
+
+ROUTE_DIRECTIONS_QUERY = """
+    SELECT route_id, direction_id, direction
+    FROM directions
+    WHERE route_id = %s
+    ORDER BY direction_id
+"""
+
+STOP_COLUMNS = """stop_id, stop_code, stop_name, stop_lat, stop_lon,
+                  zone_id, stop_desc, stop_url, location_type,
+                  parent_station, stop_timezone, wheelchair_boarding, platform_code"""
+
+STOP_QUERY = f"""
+    SELECT {STOP_COLUMNS}
+    FROM stops
+    WHERE stop_id = %s
+"""
+
+STOP_ROUTES_QUERY = """
+    SELECT DISTINCT r.route_id, r.route_short_name, r.route_long_name,
+           r.route_type, r.route_color, r.route_text_color
+    FROM routes r
+    JOIN trips t ON r.route_id = t.route_id
+    JOIN stop_times st ON t.trip_id = st.trip_id
+    WHERE st.stop_id = %s
+    ORDER BY r.route_short_name, r.route_long_name
+"""
+
+TRIP_COLUMNS = """trip_id, route_id, service_id, trip_headsign,
+                  trip_short_name, direction_id, block_id, shape_id,
+                  wheelchair_accessible, bikes_allowed"""
+
+TRIP_QUERY = f"""
+    SELECT {TRIP_COLUMNS}
+    FROM trips
+    WHERE trip_id = %s
+"""
+
+TRIP_STOP_TIMES_QUERY = """
+    SELECT st.trip_id, st.arrival_time, st.departure_time,
+           st.stop_id, st.stop_sequence, st.stop_headsign,
+           st.pickup_type, st.drop_off_type, st.shape_dist_traveled,
+           s.stop_name, s.stop_lat, s.stop_lon
+    FROM stop_times st
+    JOIN stops s ON st.stop_id = s.stop_id
+    WHERE st.trip_id = %s
+    ORDER BY st.stop_sequence
+"""
+
+SHAPE_POINTS_QUERY = """
+    SELECT shape_id, shape_pt_lat, shape_pt_lon,
+           shape_pt_sequence, shape_dist_traveled
+    FROM shapes
+    WHERE shape_id = %s
+    ORDER BY shape_pt_sequence
+"""
+
+CALENDAR_QUERY = """
+    SELECT c.service_id, c.monday, c.tuesday, c.wednesday,
+           c.thursday, c.friday, c.saturday, c.sunday,
+           c.start_date, c.end_date, ca.service_description
+    FROM calendar c
+    LEFT JOIN calendar_attributes ca ON c.service_id = ca.service_id
+    ORDER BY c.service_id
+"""
+
+# /api/stats 的各项计数，在同一个只读快照中执行
+STATS_QUERIES = {
+    "agencies": "SELECT COUNT(*) FROM agency",
+    "routes": "SELECT COUNT(*) FROM routes",
+    "stops": "SELECT COUNT(*) FROM stops",
+    "trips": "SELECT COUNT(*) FROM trips",
+    "stop_times": "SELECT COUNT(*) FROM stop_times",
+    "shapes": "SELECT COUNT(DISTINCT shape_id) FROM shapes",
+}
+
+
+# 列表接口的排序键: 键集分页和 OFFSET 分页使用相同的顺序，并与 schema.sql 中的索引一致
+# （idx_routes_name、idx_stops_name、trips 主键）。线路名称可能为 NULL，与原来的
+# ORDER BY route_short_name, route_long_name 一样排在最后
+ROUTE_SORT_KEYS = [*nulls_last('r.route_short_name'), *nulls_last('r.route_long_name'), 'r.route_id']
+STOP_SORT_KEYS = ["stop_name", "stop_id"]
+TRIP_SORT_KEYS = ["trip_id"]
+
+
+def _where(clauses: List[str]) -> str:
+    return " AND ".join(clauses) if clauses else "1=1"
+
+
+def routes_list(args) -> Dict[str, Any]:
+    """/api/routes 的分页查询（paginate 的参数），支持 agency_id、route_type、search 筛选"""
+    agency_id = args.get('agency_id', type=str)
+    route_type = args.get('route_type', type=int)
+    search = args.get('search', type=str)
+
+    where_clauses = []
+    params = []
+
+    if agency_id:
+        where_clauses.append("r.agency_id = %s")
+        params.append(agency_id)
+
+    if route_type is not None:
+        where_clauses.append("r.route_type = %s")
+        params.append(route_type)
+
+    if search:
+        where_clauses.append(
+            "(r.route_short_name ILIKE %s OR r.route_long_name ILIKE %s)"
+        )
+        search_pattern = f"%{search}%"
+        params.extend([search_pattern, search_pattern])
+
+    return {
+        'columns_sql': ROUTE_COLUMNS,
+        'from_sql': ROUTE_FROM,
+        'where_sql': _where(where_clauses),
+        'params': params,
+        'keys': ROUTE_SORT_KEYS,
+        'order_by': ', '.join(ROUTE_SORT_KEYS),
+    }
+
+
+def stops_list(args) -> Dict[str, Any]:
+    """/api/stops 的分页查询，支持 search 和 lat/lon/radius（公里）筛选"""
+    search = args.get('search', type=str)
+    lat = args.get('lat', type=float)
+    lon = args.get('lon', type=float)
+    radius = args.get('radius', 1.0, type=float)
+
+    where_clauses = []
+    params = []
+
+    if search:
+        where_clauses.append("(stop_name ILIKE %s OR stop_code ILIKE %s)")
+        search_pattern = f"%{search}%"
+        params.extend([search_pattern, search_pattern])
+
+    if lat is not None and lon is not None:
+        where_clauses.append("""
+            (6371 * acos(
+                cos(radians(%s)) * cos(radians(stop_lat)) *
+                cos(radians(stop_lon) - radians(%s)) +
+                sin(radians(%s)) * sin(radians(stop_lat))
+            )) <= %s
+        """)
+        params.extend([lat, lon, lat, radius])
+
+    return {
+        'columns_sql': STOP_COLUMNS,
+        'from_sql': "FROM stops",
+        'where_sql': _where(where_clauses),
+        'params': params,
+        'keys': STOP_SORT_KEYS,
+        'order_by': ', '.join(STOP_SORT_KEYS),
+    }
+
+
+def trips_list(args) -> Dict[str, Any]:
+    """/api/trips 的分页查询，支持 route_id、service_id、direction_id 筛选"""
+    route_id = args.get('route_id', type=str)
+    service_id = args.get('service_id', type=str)
+    direction_id = args.get('direction_id', type=int)
+
+    where_clauses = []
+    params = []
+
+    if route_id:
+        where_clauses.append("route_id = %s")
+        params.append(route_id)
+
+    if service_id:
+        where_clauses.append("service_id = %s")
+        params.append(service_id)
+
+    if direction_id is not None:
+        where_clauses.append("direction_id = %s")
+        params.append(direction_id)
+
+    return {
+        'columns_sql': TRIP_COLUMNS,
+        'from_sql': "FROM trips",
+        'where_sql': _where(where_clauses),
+        'params': params,
+        'keys': TRIP_SORT_KEYS,
+        'order_by': ', '.join(TRIP_SORT_KEYS),
+    }
+
+
+def route_stops_query(route_id: str, direction_id: Optional[int]) -> Tuple[str, tuple]:
+    """线路经过的站点，按站序排列"""
+    where_clause = "r.route_id = %s"
+    params = [route_id]
+
+    if direction_id is not None:
+        where_clause += " AND t.direction_id = %s"
+        params.append(direction_id)
+
+    query = f"""
+        SELECT DISTINCT s.stop_id, s.stop_code, s.stop_name,
+               s.stop_lat, s.stop_lon, s.stop_desc,
+               MIN(st.stop_sequence) as min_sequence
+        FROM stops s
+        JOIN stop_times st ON s.stop_id = st.stop_id
+        JOIN trips t ON st.trip_id = t.trip_id
+        JOIN routes r ON t.route_id = r.route_id
+        WHERE {where_clause}
+        GROUP BY s.stop_id, s.stop_code, s.stop_name, s.stop_lat, s.stop_lon, s.stop_desc
+        ORDER BY min_sequence
+    """
+    return query, tuple(params)
+
+
+def metrics_args(args) -> Tuple[int, str]:
+    """
+    解析 /api/metrics 的参数，返回 (limit, order_by)
+
+    Raises:
+        ValueError: order_by 无效
+    """
+    limit = min(args.get('limit', 50, type=int), 500)
+    order_by = args.get('order_by', 'total_ms')
+    if order_by not in METRICS_ORDER_FIELDS:
+        raise ValueError(f"order_by 只能是 {', '.join(METRICS_ORDER_FIELDS)}")
+    return limit, order_by
+
+
+def search_args(args) -> Tuple[str, List[str], int, bool]:
+    """
+    解析 /api/search 的参数，返回 (text, types, limit, fuzzy)
+
+    Raises:
+        ValueError: types 包含未知类型
+    """
+    text = args.get('q', '', type=str)
+    limit = min(max(args.get('limit', 10, type=int), 1), 50)
+    types = args.get('types', ','.join(SEARCH_TYPES), type=str).split(',')
+    fuzzy = args.get('fuzzy', 'true', type=str).lower() == 'true'
+
+    if not set(types) <= set(SEARCH_TYPES):
+        raise ValueError(f"types 参数只能包含 {', '.join(SEARCH_TYPES)}")
+    return text, types, limit, fuzzy
+
+
+# ===== 实时数据接口 =====
+
+REALTIME_SUMMARY_COUNT_QUERIES = {
+    "active_vehicles": """
+        SELECT COUNT(DISTINCT vehicle_id)
+        FROM realtime_vehicle_positions
+        WHERE position_timestamp >= NOW() - INTERVAL '10 minutes'
+    """,
+    "recent_delays": """
+        SELECT COUNT(*)
+        FROM realtime_delay_records
+        WHERE record_timestamp >= NOW() - INTERVAL '1 hour'
+    """,
+    "routes_with_delays": """
+        SELECT COUNT(DISTINCT route_id)
+        FROM realtime_delay_records
+        WHERE record_timestamp >= NOW() - INTERVAL '1 hour'
+    """,
+}
+
+REALTIME_AVG_DELAY_QUERY = """
+    SELECT COALESCE(AVG(arrival_delay) / 60, 0) as avg_delay
+    FROM realtime_delay_records
+    WHERE record_timestamp >= NOW() - INTERVAL '1 hour'
+"""
+
+
+def realtime_vehicles_query(args) -> Tuple[str, list, str]:
+    """最近 10 分钟的车辆位置，返回 (query, params, 预备语句名)"""
+    route_id = args.get('route_id')
+    limit = min(int(args.get('limit', 100)), 500)  # 最大500条
+
+    query = """
+        SELECT vehicle_id, trip_id, route_id, latitude, longitude,
+               bearing, speed, position_timestamp, current_status, stop_id
+        FROM realtime_vehicle_positions
+        WHERE position_timestamp >= NOW() - INTERVAL '10 minutes'
+    """
+
+    params = []
+    if route_id:
+        query += " AND route_id = %s"
+        params.append(route_id)
+
+    query += " ORDER BY position_timestamp DESC LIMIT %s"
+    params.append(limit)
+
+    # 按是否筛选线路区分两条预备语句
+    statement = "api_realtime_vehicles_route" if route_id else "api_realtime_vehicles"
+    return query, params, statement
+
+
+def realtime_delays_query(args) -> Tuple[str, list]:
+    """最近 hours 小时（最多 24）的延误记录"""
+    route_id = args.get('route_id')
+    stop_id = args.get('stop_id')
+    hours = min(int(args.get('hours', 2)), 24)  # 最多24小时
+    limit = min(int(args.get('limit', 200)), 1000)
+
+    query = """
+        SELECT rdr.trip_id, rdr.route_id, rdr.stop_id, rdr.vehicle_id,
+               rdr.scheduled_time, rdr.actual_time, rdr.arrival_delay,
+               rdr.departure_delay, rdr.record_timestamp,
+               r.route_short_name, r.route_long_name,
+               s.stop_name
+        FROM realtime_delay_records rdr
+        LEFT JOIN routes r ON rdr.route_id = r.route_id
+        LEFT JOIN stops s ON rdr.stop_id = s.stop_id
+        WHERE record_timestamp >= NOW() - INTERVAL '%s hours'
+    """ % hours
+
+    params = []
+    if route_id:
+        query += " AND rdr.route_id = %s"
+        params.append(route_id)
+    if stop_id:
+        query += " AND rdr.stop_id = %s"
+        params.append(stop_id)
+
+    query += " ORDER BY rdr.record_timestamp DESC LIMIT %s"
+    params.append(limit)
+    return query, params
+
+
+def delay_export_query(args) -> Tuple[str, tuple]:
+    """导出最近 hours 小时（最多 90 天）的延误记录，列顺序与 DELAY_EXPORT_COLUMNS 一致"""
+    route_id = args.get('route_id')
+    hours = min(int(args.get('hours', 24)), 24 * 90)  # 最多90天
+
+    query = """
+        SELECT %s
+        FROM realtime_delay_records
+        WHERE record_timestamp >= NOW() - INTERVAL '%s hours'
+    """ % (', '.join(DELAY_EXPORT_COLUMNS), hours)
+
+    params = []
+    if route_id:
+        query += " AND route_id = %s"
+        params.append(route_id)
+    query += " ORDER BY record_timestamp"
+    return query, tuple(params)
+
+
+# ===== 准点率接口 =====
+
+PUNCTUALITY_CONFIG_QUERY = "SELECT config_key, config_value, description FROM punctuality_config ORDER BY config_key"
+
+PUNCTUALITY_CONFIG_UPDATE = """
+    UPDATE punctuality_config
+    SET config_value = %s, updated_at = CURRENT_TIMESTAMP
+    WHERE config_key = %s
+"""
+
+
+def punctuality_days(args) -> int:
+    """统计天数参数，最多 90 天"""
+    return min(int(args.get('days', 7)), 90)
+
+
+def route_punctuality_query(args) -> Tuple[str, list]:
+    """指定 route_id 时返回该线路每天的准点率，否则返回各线路的汇总（按准点率降序）"""
+    route_id = args.get('route_id')
+    date = args.get('date')
+    days = punctuality_days(args)
+    limit = min(int(args.get('limit', 20)), 100)
+
+    if route_id:
+        # 查询特定线路
+        query = """
+            SELECT
+                rdp.route_id, r.route_short_name, r.route_long_name,
+                rdp.stat_date, rdp.total_trips, rdp.punctuality_rate,
+                rdp.avg_arrival_delay / 60 as avg_delay_minutes,
+                rdp.on_time_trips, rdp.late_trips, rdp.very_late_trips
+            FROM route_daily_punctuality rdp
+            JOIN routes r ON rdp.route_id = r.route_id
+            WHERE rdp.route_id = %s
+        """
+        params = [route_id]
+
+        if date:
+            query += " AND rdp.stat_date = %s"
+            params.append(date)
+        else:
+            query += " AND rdp.stat_date >= CURRENT_DATE - INTERVAL '%s days'" % days
+
+        query += " ORDER BY rdp.stat_date DESC"
+        return query, params
+
+    # 查询所有线路的汇总
+    query = """
+        SELECT
+            rdp.route_id, r.route_short_name, r.route_long_name,
+            AVG(rdp.punctuality_rate) as avg_punctuality_rate,
+            SUM(rdp.total_trips) as total_trips,
+            AVG(rdp.avg_arrival_delay) / 60 as avg_delay_minutes,
+            MAX(rdp.max_arrival_delay) / 60 as max_delay_minutes,
+            SUM(rdp.on_time_trips) as on_time_trips,
+            SUM(rdp.early_trips) as early_trips,
+            SUM(rdp.late_trips) as late_trips,
+            SUM(rdp.very_late_trips) as very_late_trips,
+            MAX(rdp.stat_date) as last_stat_date
+        FROM route_daily_punctuality rdp
+        JOIN routes r ON rdp.route_id = r.route_id
+        WHERE rdp.stat_date >= CURRENT_DATE - INTERVAL '%s days'
+    """ % days
+    query += " GROUP BY rdp.route_id, r.route_short_name, r.route_long_name"
+    query += " ORDER BY avg_punctuality_rate DESC LIMIT %s"
+    return query, [limit]
+
+
+def stop_punctuality_query(args) -> Tuple[str, list]:
+    """指定 stop_id 时返回该站点每天的准点率，否则返回各站点的汇总（按准点率降序）"""
+    stop_id = args.get('stop_id')
+    date = args.get('date')
+    days = punctuality_days(args)
+    limit = min(int(args.get('limit', 20)), 100)
+
+    if stop_id:
+        # 查询特定站点
+        query = """
+            SELECT
+                sdp.stop_id, s.stop_name, s.stop_lat, s.stop_lon,
+                sdp.stat_date, sdp.total_visits, sdp.punctuality_rate,
+                sdp.avg_arrival_delay / 60 as avg_delay_minutes
+            FROM stop_daily_punctuality sdp
+            JOIN stops s ON sdp.stop_id = s.stop_id
+            WHERE sdp.stop_id = %s
+        """
+        params = [stop_id]
+
+        if date:
+            query += " AND sdp.stat_date = %s"
+            params.append(date)
+        else:
+            query += " AND sdp.stat_date >= CURRENT_DATE - INTERVAL '%s days'" % days
+
+        query += " ORDER BY sdp.stat_date DESC"
+        return query, params
+
+    # 查询所有站点的汇总
+    query = """
+        SELECT
+            sdp.stop_id, s.stop_name, s.stop_lat, s.stop_lon,
+            AVG(sdp.punctuality_rate) as avg_punctuality_rate,
+            SUM(sdp.total_visits) as total_visits,
+            AVG(sdp.avg_arrival_delay) / 60 as avg_delay_minutes,
+            MAX(sdp.max_arrival_delay) / 60 as max_delay_minutes,
+            SUM(sdp.on_time_visits) as on_time_visits,
+            SUM(sdp.early_visits) as early_visits,
+            SUM(sdp.late_visits) as late_visits,
+            SUM(sdp.very_late_visits) as very_late_visits,
+            MAX(sdp.stat_date) as last_stat_date
+        FROM stop_daily_punctuality sdp
+        JOIN stops s ON sdp.stop_id = s.stop_id
+        WHERE sdp.stat_date >= CURRENT_DATE - INTERVAL '%s days'
+    """ % days
+    query += " GROUP BY sdp.stop_id, s.stop_name, s.stop_lat, s.stop_lon"
+    query += " ORDER BY avg_punctuality_rate DESC LIMIT %s"
+    return query, [limit]
+
+
+def punctuality_overview_queries(days: int) -> Tuple[str, str, str]:
+    """系统准点率概览的三条查询: (系统汇总, 最佳线路, 最差线路)"""
+    system_query = """
+        SELECT
+            COUNT(DISTINCT rdp.route_id) as total_routes,
+            SUM(rdp.total_trips) as total_trips,
+            AVG(rdp.punctuality_rate) as system_punctuality_rate,
+            AVG(rdp.avg_arrival_delay) / 60 as system_avg_delay_minutes,
+            MAX(rdp.stat_date) as latest_data_date
+        FROM route_daily_punctuality rdp
+        WHERE rdp.stat_date >= CURRENT_DATE - INTERVAL '%s days'
+    """ % days
+
+    best_routes_query = """
+        SELECT
+            rdp.route_id, r.route_short_name, r.route_long_name,
+            AVG(rdp.punctuality_rate) as avg_punctuality_rate,
+            SUM(rdp.total_trips) as total_trips
+        FROM route_daily_punctuality rdp
+        JOIN routes r ON rdp.route_id = r.route_id
+        WHERE rdp.stat_date >= CURRENT_DATE - INTERVAL '%s days'
+        GROUP BY rdp.route_id, r.route_short_name, r.route_long_name
+        ORDER BY avg_punctuality_rate DESC
+        LIMIT 5
+    """ % days
+
+    worst_routes_query = """
+        SELECT
+            rdp.route_id, r.route_short_name, r.route_long_name,
+            AVG(rdp.punctuality_rate) as avg_punctuality_rate,
+            SUM(rdp.total_trips) as total_trips
+        FROM route_daily_punctuality rdp
+        JOIN routes r ON rdp.route_id = r.route_id
+        WHERE rdp.stat_date >= CURRENT_DATE - INTERVAL '%s days'
+        AND rdp.total_trips >= 10  -- 至少10个班次
+        GROUP BY rdp.route_id, r.route_short_name, r.route_long_name
+        ORDER BY avg_punctuality_rate ASC
+        LIMIT 5
+    """ % days
+
+    return system_query, best_routes_query, worst_routes_query
+
+
+def has_punctuality_data(system_stats: Optional[Dict[str, Any]]) -> bool:
+    return bool(system_stats) and system_stats['total_routes'] != 0
+
+
+def punctuality_overview(system_stats: Optional[Dict[str, Any]], best_routes: list,
+                         worst_routes: list, days: int) -> Dict[str, Any]:
+    """整理系统准点率概览，没有统计数据时返回默认值"""
+    if not has_punctuality_data(system_stats):
+        return {
+            "total_routes": 0,
+            "total_trips": 0,
+            "system_punctuality_rate": 0,
+            "system_avg_delay_minutes": 0,
+            "latest_data_date": None,
+            "best_routes": [],
+            "worst_routes": [],
+            "analysis_period": f"最近 {days} 天",
+            "data_available": False
+        }
+
+    return {
+        "total_routes": system_stats['total_routes'],
+        "total_trips": system_stats['total_trips'],
+        "system_punctuality_rate": round(float(system_stats['system_punctuality_rate'] or 0), 2),
+        "system_avg_delay_minutes": round(float(system_stats['system_avg_delay_minutes'] or 0), 2),
+        "latest_data_date": system_stats['latest_data_date'].strftime('%Y-%m-%d') if system_stats['latest_data_date'] else None,
+        "best_routes": best_routes,
+        "worst_routes": worst_routes,
+        "analysis_period": f"最近 {days} 天",
+        "data_available": True
+    }
+
+
+def hourly_punctuality_query(args) -> Tuple[str, list]:
+    """指定日期（默认今天）各时段的准点率，可按 route_id 筛选"""
+    route_id = args.get('route_id')
+    date = args.get('date')
+
+    if not date:
+        date = 'CURRENT_DATE'
+
+    query = """
+        SELECT
+            hour_of_day,
+            AVG(punctuality_rate) as avg_punctuality_rate,
+            SUM(total_trips) as total_trips,
+            AVG(avg_arrival_delay) / 60 as avg_delay_minutes
+        FROM hourly_punctuality_stats
+        WHERE stat_date = %s
+    """ % ('CURRENT_DATE' if date == 'CURRENT_DATE' else f"'{date}'")
+
+    params = []
+    if route_id:
+        query += " AND route_id = %s"
+        params.append(route_id)
+
+    query += " GROUP BY hour_of_day ORDER BY hour_of_day"
+    return query, params
+
+
+def hourly_punctuality(hourly_stats: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """补齐 24 个时段，没有数据的时段为 0"""
+    result = []
+    hour_data = {stat['hour_of_day']: stat for stat in hourly_stats}
+
+    for hour in range(24):
+        if hour in hour_data:
+            result.append({
+                'hour': hour,
+                'hour_label': f"{hour:02d}:00",
+                'punctuality_rate': round(float(hour_data[hour]['avg_punctuality_rate'] or 0), 2),
+                'total_trips': hour_data[hour]['total_trips'],
+                'avg_delay_minutes': round(float(hour_data[hour]['avg_delay_minutes'] or 0), 2)
+            })
+        else:
+            result.append({
+                'hour': hour,
+                'hour_label': f"{hour:02d}:00",
+                'punctuality_rate': 0,
+                'total_trips': 0,
+                'avg_delay_minutes': 0
+            })
+    return result
+
+
+def punctuality_config_values(configs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """把配置行转换为字典，数值配置转换为 int 或 float"""
+    config_dict = {}
+    for config in configs:
+        try:
+            if '.' in config['config_value']:
+                config_dict[config['config_key']] = float(config['config_value'])
+            else:
+                config_dict[config['config_key']] = int(config['config_value'])
+        except ValueError:
+            config_dict[config['config_key']] = config['config_value']
+    return config_dict
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+GTFS 导入性能基准测试
+
+使用 gtfs_data/gtfs_SF 以及按倍数放大的合成数据（复制 trips、shapes 和 stop_times），
+也可以使用 generate_stop_times.py 生成的带 stop_times 的数据集（--feed），
+分别以不同加载策略运行 GTFSImporter，记录每张表的行数、耗时、rows/s 以及进程峰值内存，
+结果以 JSON 格式保存，便于比较不同版本之间的性能变化。
+
+注意: 基准测试会重建目标数据库中的 GTFS 表，请使用单独的数据库（默认 gtfs_bench）。
+
+使用方法:
+    createdb gtfs_bench
+    python benchmark_importer.py
+    python benchmark_importer.py --scales 1 10 --strategies copy copy_parallel
+    python benchmark_importer.py --output results/2025-11-20.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any
+
+from generate_stop_times import build_scaled_feed
+from gtfs_importer import GTFSImporter
+
+
+DEFAULT_FEED = Path(__file__).resolve().parent.parent / 'gtfs_data' / 'gtfs_SF'
+DEFAULT_SCHEMA = Path(__file__).resolve().parent / 'schema.sql'
+
+# 加载策略: 名称 -> GTFSImporter 参数
+STRATEGIES: Dict[str, Dict[str, Any]] = {
+    'insert': {'loader': 'insert'},
+    'copy': {'loader': 'copy'},
+    'typed': {'loader': 'typed'},
+    'copy_parallel': {'loader': 'copy', 'workers': 4},
+    'copy_fast_load': {'loader': 'copy', 'fast_load': True},
+}
+
+
+def _peak_rss_kb() -> int:
+    """当前进程的峰值常驻内存（KB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 返回字节，Linux 返回 KB
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _run_strategy(feed_dir: str, db_params: Dict[str, Any],
+                  options: Dict[str, Any], verbose: bool) -> Dict[str, Any]:
+    """在独立子进程中运行一次导入，返回该次运行的测量结果"""
+    importer = GTFSImporter(**db_params, **options)
+    output = sys.stdout if verbose else io.StringIO()
+
+    with contextlib.redirect_stdout(output):
+        importer.connect()
+        try:
+            importer.clean_tables()
+            start = time.perf_counter()
+            importer.import_from_directory(Path(feed_dir))
+            wall_seconds = time.perf_counter() - start
+        finally:
+            importer.disconnect()
+
+    tables = {
+        table: {
+            'status': 'ok',
+            'rows': stats['rows'],
+            'seconds': round(stats['seconds'], 4),
+            'rows_per_sec': round(stats['rows'] / stats['seconds'], 1) if stats['seconds'] else None,
+        }
+        for table, stats in importer.import_stats.items()
+    }
+    # 导入失败的表也写入结果，避免只看 rows/s 时误以为数据完整；
+    # 未通过校验的外键（表名.约束名）单独列在 failures 中
+    for name, error in importer.failures.items():
+        if name in importer.TABLE_ORDER:
+            tables[name] = {'status': 'failed', 'rows': 0, 'error': error}
+    total_rows = sum(stats['rows'] for stats in tables.values())
+
+    return {
+        'complete': not importer.failures,
+        'failures': dict(importer.failures),
+        'total_rows': total_rows,
+        'wall_seconds': round(wall_seconds, 4),
+        'rows_per_sec': round(total_rows / wall_seconds, 1) if wall_seconds else None,
+        'peak_rss_kb': _peak_rss_kb(),
+        'phases': {phase: round(seconds, 4) for phase, seconds in importer.phase_stats.items()},
+        'tables': tables,
+    }
+
+
+def init_schema(db_params: Dict[str, Any], schema_file: Path):
+    """在基准数据库中重建 GTFS 表结构"""
+    importer = GTFSImporter(**db_params)
+    with contextlib.redirect_stdout(io.StringIO()):
+        importer.connect()
+    try:
+        with open(schema_file, 'r', encoding='utf-8') as f:
+            importer.cursor.execute(f.read())
+        importer.conn.commit()
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            importer.disconnect()
+
+
+def run_benchmarks(feed: Path, scales: List[int], strategies: List[str],
+                   db_params: Dict[str, Any], work_dir: Path,
+                   verbose: bool = False) -> List[Dict[str, Any]]:
+    """按数据规模和加载策略依次运行基准测试"""
+    results = []
+    # 每次运行使用新的子进程，保证峰值内存互不影响
+    context = multiprocessing.get_context('spawn')
+
+    for scale in scales:
+        feed_dir = feed if scale == 1 else build_scaled_feed(feed, work_dir / f"x{scale}", scale)
+        print(f"\nDataset x{scale}: {feed_dir}")
+
+        for name in strategies:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(
+                    _run_strategy, str(feed_dir), db_params, STRATEGIES[name], verbose
+                ).result()
+
+            if not result['total_rows']:
+                raise RuntimeError(f"No rows were imported from {feed_dir} with strategy {name}")
+
+            result.update({'scale': scale, 'strategy': name, 'options': STRATEGIES[name]})
+            results.append(result)
+            print(f"  {name:16} {result['total_rows']:>12,} rows  {result['wall_seconds']:>9.2f}s  "
+                  f"{result['rows_per_sec'] or 0:>12,.0f} rows/s  "
+                  f"peak RSS {result['peak_rss_kb'] / 1024:>8.1f} MB"
+                  + ('' if result['complete'] else f"  FAILED: {', '.join(result['failures'])}"))
+
+    return results
+
+
+def main():
+    """基准测试主入口"""
+    parser = argparse.ArgumentParser(description='Benchmark GTFSImporter loading strategies')
+    parser.add_argument('--feed', type=str, default=str(DEFAULT_FEED),
+                        help='GTFS directory to benchmark (default: gtfs_data/gtfs_SF)')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100],
+                        help='Scale factors for trips and shapes (default: 1 10 100)')
+    parser.add_argument('--strategies', nargs='+', choices=list(STRATEGIES),
+                        default=list(STRATEGIES),
+                        help='Loading strategies to run (default: all)')
+    parser.add_argument('--output', type=str, default='benchmark_results.json',
+                        help='Path of the JSON results file (default: benchmark_results.json)')
+    parser.add_argument('--work-dir', type=str,
+                        help='Directory for generated datasets (default: temporary directory)')
+    parser.add_argument('--schema-file', type=str, default=str(DEFAULT_SCHEMA),
+                        help='Schema script used to recreate the tables (default: schema.sql)')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Show importer output')
+
+    parser.add_argument('--host', type=str, default='localhost')
+    parser.add_argument('--port', type=int, default=5432)
+    parser.add_argument('--database', type=str, default='gtfs_bench',
+                        help='Benchmark database, its GTFS tables are recreated (default: gtfs_bench)')
+    parser.add_argument('--user', type=str)
+    parser.add_argument('--password', type=str)
+
+    args = parser.parse_args()
+
+    # 路径错误时导入器只会跳过每张表，得到 0 行的"成功"结果，因此在连接数据库之前检查
+    feed = Path(args.feed)
+    if not feed.is_dir():
+        parser.error(f'feed directory not found: {feed}')
+    if not any((feed / file_name).is_file() for file_name in GTFSImporter.FILE_TO_TABLE):
+        parser.error(f'no GTFS files found in {feed}')
+
+    db_params = {
+        'host': args.host,
+        'port': args.port,
+        'database': args.database,
+        'user': args.user,
+        'password': args.password,
+    }
+
+    init_schema(db_params, Path(args.schema_file))
+
+    with tempfile.TemporaryDirectory(prefix='gtfs_bench_') as temp_dir:
+        work_dir = Path(args.work_dir) if args.work_dir else Path(temp_dir)
+        try:
+            results = run_benchmarks(feed, args.scales, args.strategies,
+                                     db_params, work_dir, args.verbose)
+        except RuntimeError as e:
+            print(f"\nError: {e}")
+            sys.exit(1)
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'feed': args.feed,
+        'database': f"{args.database}@{args.host}:{args.port}",
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,16 +5,322 @@
 """
 
 import psycopg2
-from psycopg2 import pool
+from psycopg2 import pool, extensions, sql
 from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Any, Optional
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+from typing import List, Dict, Any, Optional, Iterator, Union
 import os
+import re
+import threading
+import time
+
+from db_common import ROW_FORMATS, DEFAULT_STREAM_BATCH, _EXPLAINABLE, _numbered_placeholders
+from query_metrics import metrics
+
+
+def _explain(conn, query, params) -> Optional[str]:
+    """
+    获取慢查询的执行计划（只做规划，不再次执行）
+
+    在保存点中执行，EXPLAIN 失败不会影响当前事务
+    """
+    text = _statement_text(conn, query)
+    if not text.lstrip().lower().startswith(_EXPLAINABLE):
+        return None
+    if conn.info.transaction_status not in (extensions.TRANSACTION_STATUS_IDLE,
+                                            extensions.TRANSACTION_STATUS_INTRANS):
+        return None
+
+    explain = sql.SQL("EXPLAIN ") + query if isinstance(query, sql.Composable) else "EXPLAIN " + text
+    # 使用普通游标，避免 EXPLAIN 本身被计入统计
+    with conn.cursor(cursor_factory=extensions.cursor) as cursor:
+        savepoint = not conn.autocommit
+        try:
+            if savepoint:
+                cursor.execute("SAVEPOINT query_metrics_explain")
+            cursor.execute(explain, params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+            if savepoint:
+                cursor.execute("RELEASE SAVEPOINT query_metrics_explain")
+            return plan
+        except psycopg2.Error:
+            if savepoint:
+                try:
+                    cursor.execute("ROLLBACK TO SAVEPOINT query_metrics_explain")
+                except psycopg2.Error:
+                    pass
+            return None
+
+
+def _statement_text(conn, query) -> str:
+    if isinstance(query, sql.Composable):
+        return query.as_string(conn)
+    if isinstance(query, bytes):
+        return query.decode('utf-8', 'replace')
+    return query
+
+
+class _TimedCursorMixin:
+    """记录每条语句的耗时和行数，慢查询附带执行计划写入日志"""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(query, vars)
+            failed = False
+            return result
+        finally:
+            self._record(query, vars, time.perf_counter() - start, failed)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = super().executemany(query, vars_list)
+            failed = False
+            return result
+        finally:
+            self._record(query, None, time.perf_counter() - start, failed)
+
+    def _record(self, query, params, elapsed: float, failed: bool):
+        text = _statement_text(self.connection, query)
+        if metrics.record(text, elapsed, self.rowcount, error=failed):
+            plan = _explain(self.connection, query, params) if self.name is None else None
+            metrics.log_slow_query(text, elapsed, self.rowcount, plan)
+
+
+class TimedCursor(_TimedCursorMixin, extensions.cursor):
+    """带统计的普通游标，连接池中连接的默认游标"""
+
+
+class TimedDictCursor(_TimedCursorMixin, RealDictCursor):
+    """带统计的字典游标"""
+
+
+class PoolTimeout(pool.PoolError):
+    """在超时时间内没有可用连接"""
+
+
+class ConnectionPool:
+    """
+    线程安全的数据库连接池
+
+    - 连接用尽时在条件变量上排队等待，超过 timeout 抛出 PoolTimeout
+    - 取出空闲超过 health_check_after 秒的连接时先执行 SELECT 1 检查
+    - 连接存活超过 max_lifetime 秒后在归还或取出时关闭并重建
+    - 归还时回滚未结束的事务，丢弃已断开的连接
+    """
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float = 30.0,
+                 max_lifetime: float = 3600.0, health_check_after: float = 30.0,
+                 **conn_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"invalid pool size: minconn={minconn}, maxconn={maxconn}")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self._conn_kwargs = conn_kwargs
+
+        self._cond = threading.Condition()
+        # 空闲连接栈（后进先出，保持热连接）: (conn, 最近归还时间)
+        self._idle = deque()
+        # 连接创建时间: {id(conn): created_at}
+        self._created: Dict[int, float] = {}
+        # 各连接上已注册的预备语句名: {id(conn): {name}}
+        self._prepared: Dict[int, set] = {}
+        self._in_use = 0
+        self._waiting = 0
+        # 已占用名额但仍在建立中的连接数
+        self._opening = 0
+        self._closed = False
+
+        for _ in range(minconn):
+            conn = self._connect()
+            with self._cond:
+                self._created[id(conn)] = time.monotonic()
+                self._idle.append((conn, time.monotonic()))
+
+    def _connect(self):
+        """建立新连接（在锁外调用），调用方在持有锁时登记到 _created"""
+        return psycopg2.connect(**self._conn_kwargs)
+
+    def _expired(self, conn) -> bool:
+        """连接是否已关闭或超过最长存活时间（调用方需持有锁）"""
+        created = self._created.get(id(conn), 0.0)
+        return conn.closed or (self.max_lifetime and time.monotonic() - created > self.max_lifetime)
+
+    def _discard(self, conn):
+        """关闭连接并释放其名额（调用方需持有锁）"""
+        self._created.pop(id(conn), None)
+        self._prepared.pop(id(conn), None)
+        if not conn.closed:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
+    @property
+    def _total(self) -> int:
+        return len(self._idle) + self._in_use + self._opening
+
+    def getconn(self, timeout: Optional[float] = None):
+        """获取连接，连接池已满时最多等待 timeout 秒"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            conn, idle_since = None, None
+            with self._cond:
+                self._waiting += 1
+                try:
+                    while True:
+                        if self._closed:
+                            raise pool.PoolError("connection pool is closed")
+
+                        while self._idle and conn is None:
+                            candidate, since = self._idle.pop()
+                            if self._expired(candidate):
+                                self._discard(candidate)
+                            else:
+                                conn, idle_since = candidate, since
+
+                        if conn is not None:
+                            self._in_use += 1
+                            break
+                        if self._total < self.maxconn:
+                            self._opening += 1
+                            break
+
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise PoolTimeout(
+                                f"no connection available within {timeout:.1f}s "
+                                f"(max {self.maxconn} connections in use)"
+                            )
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            # 建立新连接和健康检查都在锁外进行，避免阻塞其他线程
+            if conn is None:
+                try:
+                    conn = self._connect()
+                finally:
+                    with self._cond:
+                        self._opening -= 1
+                        if conn is not None:
+                            self._created[id(conn)] = time.monotonic()
+                            self._in_use += 1
+                        self._cond.notify()
+                return conn
+
+            if time.monotonic() - idle_since < self.health_check_after or self._healthy(conn):
+                return conn
+
+            with self._cond:
+                self._in_use -= 1
+                self._discard(conn)
+                self._cond.notify()
+
+    @staticmethod
+    def _healthy(conn) -> bool:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def putconn(self, conn, close: bool = False):
+        """归还连接，close=True 时直接关闭"""
+        if not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+        with self._cond:
+            self._in_use -= 1
+            if close or self._closed or self._expired(conn):
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def prepared_statements(self, conn) -> set:
+        """返回连接上已注册的预备语句名集合（连接被关闭后随之清除）"""
+        with self._cond:
+            return self._prepared.setdefault(id(conn), set())
+
+    def closeall(self):
+        """关闭所有空闲连接，使用中的连接在归还时关闭"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def owns(self, conn) -> bool:
+        """连接是否由本连接池创建且尚未关闭"""
+        with self._cond:
+            return id(conn) in self._created
+
+    def stats(self) -> Dict[str, int]:
+        """连接池计量: 使用中、空闲、等待中的连接数"""
+        with self._cond:
+            return {
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'opening': self._opening,
+                'max': self.maxconn,
+            }
+
+
+# 只读副本复制延迟的查询；不处于恢复状态（独立实例）或已重放全部 WAL 时延迟为 0
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
 
 
 class Database:
-    """数据库连接管理类"""
+    """
+    数据库连接管理类
+
+    配置只读副本后，只读查询（没有指定 primary 的 execute_query* 和 stream_query）
+    轮询分配到复制延迟不超过 max_replica_lag 秒的副本，所有副本都不可用或延迟过大时回落到主库。
+    """
 
     _connection_pool = None
+    _replica_pools: List[ConnectionPool] = []
+    _init_lock = threading.Lock()
+    # 是否为热点查询使用预备语句
+    prepared_statements = True
+
+    # 副本允许的最大复制延迟（秒），以及复制延迟的检查间隔（秒）
+    max_replica_lag = 5.0
+    replica_check_interval = 1.0
+    # 各副本最近一次检查的结果: {index: (检查时间, 延迟秒数，不可用时为 None)}
+    _replica_lag: Dict[int, tuple] = {}
+    _replica_check_lock = threading.Lock()
+    _replica_turn = count()
 
     @classmethod
     def initialize(cls,
@@ -24,120 +330,439 @@ class Database:
                    user: str = None,
                    password: str = None,
                    minconn: int = 1,
-                   maxconn: int = 10):
-        """初始化数据库连接池"""
+                   maxconn: int = 10,
+                   timeout: float = 30.0,
+                   max_lifetime: float = 3600.0,
+                   health_check_after: float = 30.0,
+                   prepared_statements: bool = True,
+                   replicas: Optional[List[Dict[str, Any]]] = None,
+                   max_replica_lag: Optional[float] = None):
+        """
+        初始化数据库连接池
+
+        Args:
+            timeout: 连接池已满时获取连接的最长等待秒数
+            max_lifetime: 连接的最长存活秒数，超过后回收重建
+            health_check_after: 连接空闲超过该秒数后，取出时先做健康检查
+            prepared_statements: 是否为传入 prepare 名称的查询使用预备语句
+            replicas: 只读副本的连接参数列表，如 [{'host': 'replica1', 'port': 5432}]，
+                      未指定的参数与主库相同；默认读取环境变量 DB_REPLICAS（host:port，逗号分隔）
+            max_replica_lag: 副本允许的最大复制延迟（秒），默认读取环境变量 DB_MAX_REPLICA_LAG 或 5 秒
+        """
         if user is None:
             user = os.getenv('USER', 'postgres')
+        if replicas is None:
+            replicas = _parse_replicas(os.getenv('DB_REPLICAS', ''))
+        if max_replica_lag is None:
+            max_replica_lag = float(os.getenv('DB_MAX_REPLICA_LAG', 5.0))
+        cls.prepared_statements = prepared_statements
+        cls.max_replica_lag = max_replica_lag
+
+        primary_params = {
+            'host': host,
+            'port': port,
+            'database': database,
+            'user': user,
+            'password': password,
+            # 通过连接直接创建的游标也计入查询统计
+            'cursor_factory': TimedCursor,
+        }
+        pool_options = {
+            'timeout': timeout,
+            'max_lifetime': max_lifetime,
+            'health_check_after': health_check_after,
+        }
 
         try:
-            cls._connection_pool = psycopg2.pool.SimpleConnectionPool(
-                minconn,
-                maxconn,
-                host=host,
-                port=port,
-                database=database,
-                user=user,
-                password=password
-            )
+            cls._connection_pool = ConnectionPool(minconn, maxconn, **pool_options, **primary_params)
+            # 副本连接按需建立，不预先占用连接
+            cls._replica_pools = [
+                ConnectionPool(0, maxconn, **pool_options, **{**primary_params, **replica})
+                for replica in replicas
+            ]
+            cls._replica_lag = {}
             print(f"数据库连接池初始化成功: {database}@{host}")
+            for replica in replicas:
+                print(f"  只读副本: {replica.get('host', host)}:{replica.get('port', port)}")
         except Exception as e:
             print(f"数据库连接池初始化失败: {e}")
             raise
 
     @classmethod
-    def get_connection(cls):
-        """从连接池获取连接"""
+    def ensure_initialized(cls):
+        """连接池未初始化时使用默认参数初始化（多线程下只初始化一次）"""
+        if cls._connection_pool is None:
+            with cls._init_lock:
+                if cls._connection_pool is None:
+                    cls.initialize()
+
+    @classmethod
+    def get_connection(cls, readonly: bool = False):
+        """
+        从连接池获取连接
+
+        Args:
+            readonly: 连接只用于读取时可以分配到只读副本
+        """
+        cls.ensure_initialized()
+        start = time.perf_counter()
+        try:
+            if readonly:
+                for index in cls._replica_order():
+                    try:
+                        return cls._replica_pools[index].getconn()
+                    except psycopg2.OperationalError:
+                        cls._replica_lag[index] = (time.monotonic(), None)
+                    except pool.PoolError:
+                        # 副本连接池已满或等待超时（PoolTimeout），副本本身可用，不标记为失效，
+                        # 直接尝试下一个副本或主库
+                        pass
+            return cls._connection_pool.getconn()
+        finally:
+            metrics.record_pool_wait(time.perf_counter() - start)
+
+    @classmethod
+    def _replica_order(cls) -> List[int]:
+        """按轮询顺序返回当前可用（复制延迟在允许范围内）的副本编号"""
+        total = len(cls._replica_pools)
+        if not total:
+            return []
+        start = next(cls._replica_turn)
+        order = [(start + offset) % total for offset in range(total)]
+        return [index for index in order if cls._replica_fresh(index)]
+
+    @classmethod
+    def _replica_fresh(cls, index: int) -> bool:
+        """副本的复制延迟是否在允许范围内，检查结果缓存 replica_check_interval 秒"""
+        checked_at, lag = cls._replica_lag.get(index, (None, None))
+        now = time.monotonic()
+        # 同一时间只有一个线程检查延迟，其他线程使用上一次的结果
+        if (checked_at is None or now - checked_at >= cls.replica_check_interval) \
+                and cls._replica_check_lock.acquire(blocking=False):
+            try:
+                lag = cls._check_replica_lag(cls._replica_pools[index])
+                cls._replica_lag[index] = (now, lag)
+            finally:
+                cls._replica_check_lock.release()
+        return lag is not None and lag <= cls.max_replica_lag
+
+    @staticmethod
+    def _check_replica_lag(replica: ConnectionPool) -> Optional[float]:
+        """查询副本的复制延迟（秒），副本不可用时返回 None"""
+        conn = None
+        try:
+            conn = replica.getconn(timeout=1.0)
+            with conn.cursor() as cursor:
+                cursor.execute(REPLICA_LAG_QUERY)
+                return float(cursor.fetchone()[0])
+        except (psycopg2.Error, pool.PoolError):
+            return None
+        finally:
+            if conn is not None:
+                replica.putconn(conn)
+
+    @classmethod
+    def pool_stats(cls) -> Dict[str, Any]:
+        """返回连接池计量，未初始化时返回空字典；配置了副本时附带各副本的计量和复制延迟"""
         if cls._connection_pool is None:
-            cls.initialize()
-        return cls._connection_pool.getconn()
+            return {}
+        stats = cls._connection_pool.stats()
+        if cls._replica_pools:
+            stats['replicas'] = [
+                {**replica.stats(), 'lag': cls._replica_lag.get(index, (None, None))[1]}
+                for index, replica in enumerate(cls._replica_pools)
+            ]
+        return stats
+
+    @classmethod
+    def pool_for(cls, conn) -> Optional[ConnectionPool]:
+        """返回连接所属的连接池（主库或某个副本）"""
+        for replica in cls._replica_pools:
+            if replica.owns(conn):
+                return replica
+        return cls._connection_pool
 
     @classmethod
     def return_connection(cls, conn):
-        """归还连接到连接池"""
-        if cls._connection_pool:
-            cls._connection_pool.putconn(conn)
+        """归还连接到其所属的连接池"""
+        owner = cls.pool_for(conn)
+        if owner:
+            owner.putconn(conn)
 
     @classmethod
     def close_all_connections(cls):
         """关闭所有连接"""
         if cls._connection_pool:
             cls._connection_pool.closeall()
+            for replica in cls._replica_pools:
+                replica.closeall()
             print("所有数据库连接已关闭")
 
 
-def execute_query(query: str, params: tuple = None) -> List[Dict[str, Any]]:
+def _parse_replicas(value: str) -> List[Dict[str, Any]]:
+    """解析 host:port 逗号分隔的副本列表，端口可省略"""
+    replicas = []
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        host, _, port = item.partition(':')
+        replica: Dict[str, Any] = {'host': host}
+        if port:
+            replica['port'] = int(port)
+        replicas.append(replica)
+    return replicas
+
+
+class ConnectionScope:
+    """
+    连接作用域: 作用域内的查询共享同一个连接，连接在第一次查询时才从连接池取出
+
+    primary=False 时连接可以来自只读副本
+    """
+
+    def __init__(self, primary: bool = False):
+        self.conn = None
+        self.primary = primary
+        # 是否处于只读快照事务中
+        self.snapshot = False
+        # 为 True 时退出作用域回滚而不是提交（如请求返回了错误状态码）
+        self.rollback_only = False
+
+    def connection(self):
+        """返回作用域绑定的连接，首次调用时从连接池获取"""
+        if self.conn is None:
+            self.conn = Database.get_connection(readonly=not self.primary)
+        return self.conn
+
+
+_current_scope: "ContextVar[Optional[ConnectionScope]]" = ContextVar('db_connection_scope', default=None)
+
+
+def _end_transaction(conn, commit: bool):
+    """结束连接上的当前事务，连接已断开时忽略错误（归还时会被连接池丢弃）"""
+    try:
+        if commit:
+            conn.commit()
+        else:
+            conn.rollback()
+    except psycopg2.Error:
+        if commit:
+            raise
+
+
+@contextmanager
+def connection_scope(readonly: bool = False, primary: bool = False) -> Iterator[ConnectionScope]:
+    """
+    绑定一个连接到当前请求或工作单元
+
+    作用域内的 execute_query / execute_query_one / execute_count 复用同一个连接，
+    退出时提交事务并归还连接，发生异常或设置了 scope.rollback_only 时回滚。嵌套使用时加入外层作用域。
+
+    Args:
+        readonly: 在 REPEATABLE READ READ ONLY 事务中执行作用域内的查询，
+                  多个查询看到同一个数据快照；快照在退出该作用域时结束。
+                  外层作用域已有未结束的事务时沿用该事务。
+        primary: 强制使用主库（写入或需要最新数据时）。默认连接可以来自只读副本；
+                 外层作用域已经在副本上取得连接时，本作用域单独使用一个主库连接。
+
+    使用方法:
+        with connection_scope(readonly=True):
+            routes = execute_count("SELECT COUNT(*) FROM routes")
+            stops = execute_count("SELECT COUNT(*) FROM stops")
+    """
+    outer = _current_scope.get()
+    if outer is not None and primary and not outer.primary:
+        if outer.conn is None:
+            outer.primary = True
+        else:
+            outer = None
+    scope = outer or ConnectionScope(primary)
+    token = None if outer else _current_scope.set(scope)
+    # 由本作用域开启、需要由本作用域结束的事务
+    owns_transaction = outer is None
+
+    try:
+        if readonly:
+            conn = scope.connection()
+            if conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE:
+                with conn.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+                owns_transaction = True
+                scope.snapshot = True
+        yield scope
+    except BaseException:
+        if owns_transaction and scope.conn is not None:
+            _end_transaction(scope.conn, commit=False)
+        raise
+    else:
+        if owns_transaction and scope.conn is not None:
+            _end_transaction(scope.conn, commit=not scope.rollback_only)
+    finally:
+        if readonly and owns_transaction:
+            scope.snapshot = False
+        if outer is None:
+            _current_scope.reset(token)
+            if scope.conn is not None:
+                Database.return_connection(scope.conn)
+
+
+@contextmanager
+def _checkout():
+    """获取查询使用的连接: 有连接作用域时复用其连接，否则临时借用（可以来自只读副本）"""
+    scope = _current_scope.get()
+    if scope is not None:
+        conn = scope.connection()
+        try:
+            yield conn
+        except psycopg2.Error:
+            # 查询失败后事务处于中止状态，快照外直接回滚，使同一作用域内的后续查询仍可执行
+            if not scope.snapshot and conn.info.transaction_status == extensions.TRANSACTION_STATUS_INERROR:
+                _end_transaction(conn, commit=False)
+            raise
+        return
+
+    conn = Database.get_connection(readonly=True)
+    try:
+        yield conn
+    finally:
+        Database.return_connection(conn)
+
+
+_STATEMENT_NAME = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+def _execute(cursor, conn, query: str, params, prepare: Optional[str]):
+    """
+    执行查询；指定 prepare 且启用预备语句时，在该连接上首次执行前 PREPARE 一次，
+    之后通过 EXECUTE 复用服务端已解析和规划的语句
+    """
+    pool = Database.pool_for(conn)
+    if prepare is None or not Database.prepared_statements or pool is None:
+        cursor.execute(query, params)
+        return
+
+    if not _STATEMENT_NAME.match(prepare):
+        raise ValueError(f"invalid prepared statement name: {prepare}")
+
+    prepared = pool.prepared_statements(conn)
+    if prepare not in prepared:
+        cursor.execute(f"PREPARE {prepare} AS {_numbered_placeholders(query)}")
+        prepared.add(prepare)
+
+    params = tuple(params or ())
+    if params:
+        cursor.execute(f"EXECUTE {prepare} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cursor.execute(f"EXECUTE {prepare}")
+
+
+def execute_query(query: str, params: tuple = None, prepare: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     执行查询并返回结果
 
     Args:
         query: SQL 查询语句
-        params: 查询参数
+        params: 查询参数（只支持按位置的 %s 占位符）
+        prepare: 预备语句名称，同一名称必须始终对应同一条 SQL
 
     Returns:
         查询结果列表，每行为一个字典
     """
-    conn = None
     try:
-        conn = Database.get_connection()
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute(query, params)
+        with _checkout() as conn, conn.cursor(cursor_factory=TimedDictCursor) as cursor:
+            _execute(cursor, conn, query, params, prepare)
             results = cursor.fetchall()
             return [dict(row) for row in results]
     except Exception as e:
         print(f"查询执行失败: {e}")
         raise
-    finally:
-        if conn:
-            Database.return_connection(conn)
 
 
-def execute_query_one(query: str, params: tuple = None) -> Optional[Dict[str, Any]]:
+def execute_query_one(query: str, params: tuple = None,
+                      prepare: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """
     执行查询并返回单条结果
 
     Args:
         query: SQL 查询语句
         params: 查询参数
+        prepare: 预备语句名称，见 execute_query
 
     Returns:
         单条查询结果字典，如果没有结果返回 None
     """
-    conn = None
     try:
-        conn = Database.get_connection()
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute(query, params)
+        with _checkout() as conn, conn.cursor(cursor_factory=TimedDictCursor) as cursor:
+            _execute(cursor, conn, query, params, prepare)
             result = cursor.fetchone()
             return dict(result) if result else None
     except Exception as e:
         print(f"查询执行失败: {e}")
         raise
-    finally:
-        if conn:
-            Database.return_connection(conn)
 
 
-def execute_count(query: str, params: tuple = None) -> int:
+def execute_count(query: str, params: tuple = None, prepare: Optional[str] = None) -> int:
     """
     执行计数查询
 
     Args:
         query: SQL 查询语句
         params: 查询参数
+        prepare: 预备语句名称，见 execute_query
 
     Returns:
         计数结果
     """
-    conn = None
     try:
-        conn = Database.get_connection()
-        with conn.cursor() as cursor:
-            cursor.execute(query, params)
+        with _checkout() as conn, conn.cursor(cursor_factory=TimedCursor) as cursor:
+            _execute(cursor, conn, query, params, prepare)
             result = cursor.fetchone()
             return result[0] if result else 0
     except Exception as e:
         print(f"计数查询执行失败: {e}")
         raise
-    finally:
-        if conn:
-            Database.return_connection(conn)
+
+
+_cursor_ids = count(1)
+
+
+def stream_query(query: str, params: tuple = None, batch_size: int = DEFAULT_STREAM_BATCH,
+                 row_format: str = 'dict') -> Iterator[Union[List[Any], Dict[str, List[Any]]]]:
+    """
+    使用服务端游标流式执行查询，按批返回结果
+
+    与 execute_query 不同，结果不会一次性读入内存，内存占用只与 batch_size 有关，
+    适合导出长时间范围的延误记录、遍历全部轨迹点等大结果集。
+    游标在迭代结束或生成器被关闭时释放；没有连接作用域时，迭代期间会一直占用一个连接。
+
+    Args:
+        query: SQL 查询语句
+        params: 查询参数
+        batch_size: 每批行数，同时也是每次从服务端读取的行数
+        row_format: 'dict' 每行为字典；'tuple' 每行为元组；
+                    'columns' 每批为 {列名: 值列表}
+
+    Yields:
+        每批的行列表，row_format='columns' 时为按列组织的字典
+    """
+    if row_format not in ROW_FORMATS:
+        raise ValueError(f"row_format must be one of {', '.join(ROW_FORMATS)}")
+
+    cursor_factory = TimedDictCursor if row_format == 'dict' else TimedCursor
+    try:
+        with _checkout() as conn, conn.cursor(name=f"stream_{next(_cursor_ids)}",
+                                               cursor_factory=cursor_factory) as cursor:
+            cursor.itersize = batch_size
+            cursor.execute(query, params)
+            names = None
+
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if row_format != 'columns':
+                    yield rows
+                    continue
+                if names is None:
+                    names = [column[0] for column in cursor.description]
+                yield {name: list(values) for name, values in zip(names, zip(*rows))}
+    except Exception as e:
+        print(f"流式查询执行失败: {e}")
+        raise
@@ -0,0 +1,295 @@
+"""
+异步数据库连接模块
+基于 asyncpg 提供与 db.py 相同的查询接口，供 ASGI 版本的 API（api_asgi.py）使用
+
+查询语句沿用 psycopg2 的 %s 占位符，执行前转换为 asyncpg 使用的 $1, $2, ...
+
+execute_query 等函数接受 prepare 参数只是为了与 db.py 的调用方式一致（api_asgi.py 与 api.py 共用同样的调用），
+参数本身不起作用: asyncpg 每个连接按 SQL 文本自动缓存预备语句（statement_cache_size，
+见 AsyncDatabase.initialize 的 prepared_statements），不需要像 db.py 那样显式 PREPARE 并命名。
+"""
+
+import asyncpg
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import date
+from typing import List, Dict, Any, Optional, AsyncIterator, Union
+import os
+import time
+
+from db_common import ROW_FORMATS, DEFAULT_STREAM_BATCH, _EXPLAINABLE, _numbered_placeholders
+from query_metrics import metrics
+
+
+def _encode_date(value) -> str:
+    # 与 psycopg2 一致，日期参数既可以是 datetime.date 也可以是 'YYYY-MM-DD' 字符串
+    return value.isoformat() if isinstance(value, date) else str(value)
+
+
+async def _init_connection(conn):
+    """新连接的初始化: 使用文本格式编解码日期"""
+    await conn.set_type_codec(
+        'date', schema='pg_catalog', format='text',
+        encoder=_encode_date, decoder=date.fromisoformat
+    )
+
+
+class AsyncDatabase:
+    """异步数据库连接管理类"""
+
+    _connection_pool = None
+    timeout = 30.0
+
+    @classmethod
+    async def initialize(cls,
+                         host: str = 'localhost',
+                         port: int = 5432,
+                         database: str = 'gtfs_db',
+                         user: str = None,
+                         password: str = None,
+                         minconn: int = 1,
+                         maxconn: int = 20,
+                         timeout: float = 30.0,
+                         max_inactive_lifetime: float = 300.0,
+                         prepared_statements: bool = True):
+        """
+        初始化数据库连接池
+
+        Args:
+            timeout: 连接池已满时获取连接的最长等待秒数
+            max_inactive_lifetime: 空闲连接的最长保留秒数
+            prepared_statements: 是否缓存预备语句（asyncpg 按 SQL 文本自动缓存）
+        """
+        if user is None:
+            user = os.getenv('USER', 'postgres')
+
+        try:
+            cls._connection_pool = await asyncpg.create_pool(
+                host=host,
+                port=port,
+                database=database,
+                user=user,
+                password=password,
+                min_size=minconn,
+                max_size=maxconn,
+                max_inactive_connection_lifetime=max_inactive_lifetime,
+                statement_cache_size=100 if prepared_statements else 0,
+                init=_init_connection
+            )
+            cls.timeout = timeout
+            print(f"异步数据库连接池初始化成功: {database}@{host}")
+        except Exception as e:
+            print(f"异步数据库连接池初始化失败: {e}")
+            raise
+
+    @classmethod
+    async def get_connection(cls):
+        """从连接池获取连接"""
+        if cls._connection_pool is None:
+            await cls.initialize()
+        start = time.perf_counter()
+        try:
+            return await cls._connection_pool.acquire(timeout=cls.timeout)
+        finally:
+            metrics.record_pool_wait(time.perf_counter() - start)
+
+    @classmethod
+    async def return_connection(cls, conn):
+        """归还连接到连接池"""
+        if cls._connection_pool:
+            await cls._connection_pool.release(conn)
+
+    @classmethod
+    def pool_stats(cls) -> Dict[str, int]:
+        """返回连接池计量，未初始化时返回空字典"""
+        pool = cls._connection_pool
+        if pool is None:
+            return {}
+        size, idle = pool.get_size(), pool.get_idle_size()
+        return {'in_use': size - idle, 'idle': idle, 'max': pool.get_max_size()}
+
+    @classmethod
+    async def close_all_connections(cls):
+        """关闭所有连接"""
+        if cls._connection_pool:
+            await cls._connection_pool.close()
+            cls._connection_pool = None
+            print("所有异步数据库连接已关闭")
+
+
+class AsyncConnectionScope:
+    """连接作用域: 作用域内的查询共享同一个连接"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+_current_scope: "ContextVar[Optional[AsyncConnectionScope]]" = ContextVar(
+    'db_async_connection_scope', default=None
+)
+
+
+@asynccontextmanager
+async def connection_scope(readonly: bool = False) -> AsyncIterator[AsyncConnectionScope]:
+    """
+    绑定一个连接到当前任务，与 db.connection_scope 相同
+
+    readonly=True 时作用域内的查询在 REPEATABLE READ READ ONLY 事务中执行，看到同一个数据快照。
+    嵌套使用时加入外层作用域。同一个连接不能并发执行查询，作用域内不要用 asyncio.gather 并发查询。
+    """
+    outer = _current_scope.get()
+    if outer is not None:
+        yield outer
+        return
+
+    conn = await AsyncDatabase.get_connection()
+    scope = AsyncConnectionScope(conn)
+    token = _current_scope.set(scope)
+    try:
+        if readonly:
+            async with conn.transaction(isolation='repeatable_read', readonly=True):
+                yield scope
+        else:
+            yield scope
+    finally:
+        _current_scope.reset(token)
+        await AsyncDatabase.return_connection(conn)
+
+
+@asynccontextmanager
+async def _checkout():
+    """获取查询使用的连接: 有连接作用域时复用其连接，否则临时从连接池借用"""
+    scope = _current_scope.get()
+    if scope is not None:
+        yield scope.conn
+        return
+
+    conn = await AsyncDatabase.get_connection()
+    try:
+        yield conn
+    finally:
+        await AsyncDatabase.return_connection(conn)
+
+
+def _args(params) -> tuple:
+    return tuple(params or ())
+
+
+async def _explain(conn, query: str, args: tuple) -> Optional[str]:
+    """获取慢查询的执行计划；在事务中时使用保存点，失败不影响当前事务"""
+    if not query.lstrip().lower().startswith(_EXPLAINABLE):
+        return None
+    try:
+        async with conn.transaction():
+            rows = await conn.fetch("EXPLAIN " + query, *args)
+        return "\n".join(row[0] for row in rows)
+    except asyncpg.PostgresError:
+        return None
+
+
+async def _fetch(conn, method: str, query: str, params):
+    """执行查询并记录耗时和行数，method 为 fetch / fetchrow / fetchval"""
+    query = _numbered_placeholders(query)
+    args = _args(params)
+    start = time.perf_counter()
+    result = None
+    failed = True
+    try:
+        result = await getattr(conn, method)(query, *args)
+        failed = False
+        return result
+    finally:
+        elapsed = time.perf_counter() - start
+        rows = len(result) if method == 'fetch' and result is not None else int(result is not None)
+        if metrics.record(query, elapsed, rows, error=failed):
+            metrics.log_slow_query(query, elapsed, rows, await _explain(conn, query, args))
+
+
+async def execute_query(query: str, params: tuple = None, prepare: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    执行查询并返回结果
+
+    Args:
+        query: SQL 查询语句
+        params: 查询参数（只支持按位置的 %s 占位符）
+        prepare: 不使用，只为与 db.execute_query 的参数一致（asyncpg 自动缓存预备语句，见模块说明）
+
+    Returns:
+        查询结果列表，每行为一个字典
+    """
+    try:
+        async with _checkout() as conn:
+            rows = await _fetch(conn, 'fetch', query, params)
+            return [dict(row) for row in rows]
+    except Exception as e:
+        print(f"查询执行失败: {e}")
+        raise
+
+
+async def execute_query_one(query: str, params: tuple = None,
+                            prepare: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    执行查询并返回单条结果
+
+    Returns:
+        单条查询结果字典，如果没有结果返回 None
+    """
+    try:
+        async with _checkout() as conn:
+            row = await _fetch(conn, 'fetchrow', query, params)
+            return dict(row) if row else None
+    except Exception as e:
+        print(f"查询执行失败: {e}")
+        raise
+
+
+async def execute_count(query: str, params: tuple = None, prepare: Optional[str] = None) -> int:
+    """
+    执行计数查询
+
+    Returns:
+        计数结果
+    """
+    try:
+        async with _checkout() as conn:
+            result = await _fetch(conn, 'fetchval', query, params)
+            return result or 0
+    except Exception as e:
+        print(f"计数查询执行失败: {e}")
+        raise
+
+
+async def stream_query(query: str, params: tuple = None, batch_size: int = DEFAULT_STREAM_BATCH,
+                       row_format: str = 'dict') -> AsyncIterator[Union[List[Any], Dict[str, List[Any]]]]:
+    """
+    使用服务端游标流式执行查询，按批返回结果，参数与 db.stream_query 相同
+
+    游标需要在事务中使用，不在事务中时自动开启一个事务。
+    """
+    if row_format not in ROW_FORMATS:
+        raise ValueError(f"row_format must be one of {', '.join(ROW_FORMATS)}")
+
+    try:
+        async with _checkout() as conn:
+            transaction = None if conn.is_in_transaction() else conn.transaction(readonly=True)
+            if transaction is not None:
+                await transaction.start()
+            try:
+                cursor = await conn.cursor(_numbered_placeholders(query), *_args(params),
+                                           prefetch=batch_size)
+                while True:
+                    rows = await cursor.fetch(batch_size)
+                    if not rows:
+                        break
+                    if row_format == 'dict':
+                        yield [dict(row) for row in rows]
+                    elif row_format == 'tuple':
+                        yield [tuple(row) for row in rows]
+                    else:
+                        yield {name: list(values) for name, values in zip(rows[0].keys(), zip(*rows))}
+            finally:
+                if transaction is not None:
+                    await transaction.rollback()
+    except Exception as e:
+        print(f"流式查询执行失败: {e}")
+        raise
@@ -0,0 +1,24 @@
+"""
+db.py（psycopg2）和 db_async.py（asyncpg）共用的部分
+
+只包含与数据库驱动无关的常量和 SQL 文本处理，db_async.py 从这里导入，
+ASGI 进程不会因此加载 psycopg2 和同步连接池。
+"""
+
+import re
+from itertools import count
+
+# 可以获取执行计划的语句
+_EXPLAINABLE = ('select', 'with', 'insert', 'update', 'delete', 'values', 'execute')
+
+# stream_query 的行格式: 字典、元组、按列组织的列表
+ROW_FORMATS = ('dict', 'tuple', 'columns')
+DEFAULT_STREAM_BATCH = 2000
+
+_PLACEHOLDER = re.compile(r'%%|%s')
+
+
+def _numbered_placeholders(query: str) -> str:
+    """将 psycopg2 的 %s 占位符依次转换为 PREPARE（和 asyncpg）使用的 $1, $2, ..."""
+    numbers = count(1)
+    return _PLACEHOLDER.sub(lambda m: '%' if m.group() == '%%' else f"${next(numbers)}", query)
@@ -0,0 +1,82 @@
+"""
+当前 GTFS 数据集的版本
+
+静态数据只在 gtfs_importer.py 导入新数据集时变化，按数据版本缓存的结果（矢量瓦片的静态图层、
+静态接口的 ETag）在版本变化后自动失效。版本由 feed_info 表中的 feed_version、有效期
+和 gtfs_importer.py 写入 feed_imports 表的最近导入时间组成（数据集没有 feed_info 时，
+每次导入仍会产生新版本）。数据库查询结果缓存 FEED_VERSION_CHECK_INTERVAL 秒，
+导入新数据后最多经过这段时间就会生效。
+
+使用方法:
+    from feed_version import feed_version
+
+    version = feed_version.current()        # Flask（同步）
+
+    if feed_version.expired():              # Quart（异步）
+        feed_version.update(await execute_query_one(FEED_VERSION_QUERY))
+    version = feed_version.value
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Any, Optional
+
+FEED_VERSION_QUERY = """
+    SELECT fi.feed_version, fi.feed_start_date, fi.feed_end_date, fl.imported_at
+    FROM (
+        -- 格式化为文本，psycopg2 和 asyncpg 得到相同的版本字符串
+        SELECT to_char(MAX(imported_at) AT TIME ZONE 'UTC', 'YYYYMMDD"T"HH24MISS.US') AS imported_at
+        FROM public.feed_imports
+    ) fl
+    LEFT JOIN LATERAL (
+        SELECT feed_version, feed_start_date, feed_end_date FROM feed_info LIMIT 1
+    ) fi ON TRUE
+"""
+
+_VERSION_FIELDS = ('feed_version', 'feed_start_date', 'feed_end_date', 'imported_at')
+
+# 既没有 feed_info 也没有导入记录时使用的版本，此时不生成 ETag
+UNKNOWN_VERSION = 'unknown'
+
+
+class FeedVersion:
+    """缓存的数据集版本，过期后由调用方重新查询"""
+
+    def __init__(self, check_interval: Optional[float] = None):
+        if check_interval is None:
+            check_interval = float(os.getenv('FEED_VERSION_CHECK_INTERVAL', 30))
+        self.check_interval = check_interval
+        self._value: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> str:
+        return self._value or UNKNOWN_VERSION
+
+    @property
+    def known(self) -> bool:
+        return self.value != UNKNOWN_VERSION
+
+    def expired(self) -> bool:
+        return self._value is None or time.monotonic() - self._checked_at > self.check_interval
+
+    def update(self, row: Optional[Dict[str, Any]]) -> str:
+        """用 FEED_VERSION_QUERY 的结果更新版本"""
+        parts = [row.get(field) for field in _VERSION_FIELDS] if row else []
+        value = '/'.join(str(part) for part in parts if part is not None) or UNKNOWN_VERSION
+        with self._lock:
+            self._value, self._checked_at = value, time.monotonic()
+        return value
+
+    def current(self) -> str:
+        """返回当前版本，过期时从数据库重新查询（同步版本，用于 Flask）"""
+        if self.expired():
+            # 只有同步版本需要 psycopg2，api_asgi.py 导入本模块时不加载 db.py
+            from db import execute_query_one
+            return self.update(execute_query_one(FEED_VERSION_QUERY))
+        return self.value
+
+
+feed_version = FeedVersion()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+合成 stop_times 数据生成脚本
+
+bundled 的 gtfs_data/gtfs_SF 不包含 stop_times.txt。此脚本根据现有的 trips.txt、
+shapes.txt 和 stops.txt 生成接近真实的时刻表:
+- 将站点匹配到每条轨迹附近，并按沿轨迹的距离排序得到停站序列
+- 同一线路、方向和服务日的班次在运营时段内均匀发车
+- 站间行驶时间由距离和随机车速决定，中途站有随机停站时间，
+  末班车时间可以超过 24:00:00
+
+通过 --scale 复制 trips 和 shapes（id 加 _x{k} 后缀）并错开发车时间，
+可以将 stop_times 放大到数千万行，用于离线测试相关接口的性能。
+
+使用方法:
+    python generate_stop_times.py
+    python generate_stop_times.py --scale 10 --output ../gtfs_data/gtfs_SF_x10
+    python gtfs_importer.py --dir ../gtfs_data/gtfs_SF_synthetic --loader copy
+"""
+
+import argparse
+import csv
+import math
+import random
+import shutil
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional
+
+from gtfs_parser import read_columns, format_time
+
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'gtfs_data'
+
+EARTH_RADIUS_METERS = 6371000
+
+# 站点距轨迹的最大距离，以及相邻停站的最小间距（米）
+STOP_MATCH_METERS = 40
+MIN_STOP_SPACING_METERS = 120
+
+# 运营时段（秒），结束时间超过 24 小时以覆盖跨午夜的班次
+SERVICE_START = 5 * 3600
+SERVICE_END = 25 * 3600
+
+# 车速范围（米/秒）和中途站停站时间范围（秒）
+SPEED_RANGE = (4.0, 7.5)
+DWELL_RANGE = (10, 40)
+
+# 空间网格大小（度），需要大于 STOP_MATCH_METERS 对应的经纬度跨度
+GRID_SIZE = 0.001
+
+# 放大数据集时需要复制的文件，以及每份副本中需要加后缀以保持唯一的列
+SCALED_FILES: Dict[str, Tuple[str, ...]] = {
+    'trips.txt': ('trip_id', 'shape_id'),
+    'shapes.txt': ('shape_id',),
+    'stop_times.txt': ('trip_id',),
+}
+
+STOP_TIMES_COLUMNS = [
+    'trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence',
+    'stop_headsign', 'pickup_type', 'drop_off_type', 'shape_dist_traveled', 'timepoint'
+]
+
+# 停站模式: [(stop_id, 沿轨迹距离（米）, shape_dist_traveled)]
+StopPattern = List[Tuple[str, float, Optional[float]]]
+
+
+def build_scaled_feed(source: Path, target: Path, factor: int) -> Path:
+    """
+    生成放大 factor 倍的数据集
+
+    trips、shapes（以及存在时的 stop_times）被复制 factor 份，
+    第 k 份副本的 trip_id / shape_id 加上 _x{k} 后缀；其他文件原样复制。
+    """
+    target.mkdir(parents=True, exist_ok=True)
+
+    for path in sorted(source.glob('*.txt')):
+        key_columns = SCALED_FILES.get(path.name)
+        if key_columns is None or factor == 1:
+            if path.resolve() != (target / path.name).resolve():
+                shutil.copyfile(path, target / path.name)
+            continue
+
+        with open(target / path.name, 'w', encoding='utf-8', newline='') as out:
+            writer = csv.writer(out)
+            for copy in range(factor):
+                with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+                    reader = csv.reader(f)
+                    header = next(reader)
+                    if copy == 0:
+                        writer.writerow(header)
+                    key_indexes = [header.index(c) for c in key_columns if c in header]
+
+                    for row in reader:
+                        if copy:
+                            for index in key_indexes:
+                                if row[index]:
+                                    row[index] = f"{row[index]}_x{copy}"
+                        writer.writerow(row)
+
+    return target
+
+
+def _distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """两点间距离（米），城市范围内使用等距圆柱投影近似"""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_METERS * math.hypot(x, y)
+
+
+def _cell(lat: float, lon: float) -> Tuple[int, int]:
+    return int(math.floor(lat / GRID_SIZE)), int(math.floor(lon / GRID_SIZE))
+
+
+def load_stop_grid(stops_path: Path) -> Dict[Tuple[int, int], List[Tuple[str, float, float]]]:
+    """读取站点并建立网格索引: {网格: [(stop_id, lat, lon)]}"""
+    stops = read_columns(stops_path)
+    grid = defaultdict(list)
+    location_types = stops['location_type'] if 'location_type' in stops else [None] * len(stops)
+
+    for stop_id, lat, lon, location_type in zip(
+            stops['stop_id'], stops['stop_lat'], stops['stop_lon'], location_types):
+        # 只有普通站点（location_type 为空或 0）可以出现在 stop_times 中
+        if location_type or math.isnan(lat) or math.isnan(lon):
+            continue
+        grid[_cell(lat, lon)].append((stop_id, lat, lon))
+
+    return grid
+
+
+def build_stop_patterns(shapes_path: Path, grid) -> Dict[str, StopPattern]:
+    """为每条轨迹匹配附近站点，生成按沿轨迹距离排序的停站模式"""
+    shapes = read_columns(shapes_path)
+    points = defaultdict(list)
+    for shape_id, lat, lon, sequence, dist in zip(
+            shapes['shape_id'], shapes['shape_pt_lat'], shapes['shape_pt_lon'],
+            shapes['shape_pt_sequence'], shapes['shape_dist_traveled']):
+        points[shape_id].append((sequence, lat, lon, None if math.isnan(dist) else dist))
+
+    patterns = {}
+    for shape_id, shape_points in points.items():
+        shape_points.sort()
+        # 每个站点只保留距轨迹最近的一次匹配: {stop_id: (距离, 沿轨迹米数, shape_dist_traveled)}
+        best: Dict[str, Tuple[float, float, Optional[float]]] = {}
+        along = 0.0
+        prev = None
+
+        for _, lat, lon, dist in shape_points:
+            if prev is not None:
+                along += _distance(prev[0], prev[1], lat, lon)
+            prev = (lat, lon)
+
+            row, col = _cell(lat, lon)
+            for d_row in (-1, 0, 1):
+                for d_col in (-1, 0, 1):
+                    for stop_id, stop_lat, stop_lon in grid.get((row + d_row, col + d_col), ()):
+                        offset = _distance(lat, lon, stop_lat, stop_lon)
+                        if offset <= STOP_MATCH_METERS and (
+                                stop_id not in best or offset < best[stop_id][0]):
+                            best[stop_id] = (offset, along, dist)
+
+        pattern: StopPattern = []
+        for stop_id, (_, along, dist) in sorted(best.items(), key=lambda item: item[1][1]):
+            if pattern and along - pattern[-1][1] < MIN_STOP_SPACING_METERS:
+                continue
+            pattern.append((stop_id, along, dist))
+
+        if len(pattern) >= 2:
+            patterns[shape_id] = pattern
+
+    return patterns
+
+
+def schedule_trips(trips_path: Path) -> List[Tuple[str, str, float, float]]:
+    """
+    为每个班次安排首站发车时间
+
+    同一线路、方向和服务日的班次按 trip_id 排序后在运营时段内均匀发车。
+
+    Returns:
+        [(trip_id, shape_id, 首站发车秒数, 发车间隔秒数)]
+    """
+    groups = defaultdict(list)
+    with open(trips_path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            key = (row['route_id'], row.get('direction_id'), row['service_id'])
+            groups[key].append((row['trip_id'], row.get('shape_id') or ''))
+
+    scheduled = []
+    for trips in groups.values():
+        trips.sort()
+        headway = (SERVICE_END - SERVICE_START) / len(trips)
+        for index, (trip_id, shape_id) in enumerate(trips):
+            scheduled.append((trip_id, shape_id, SERVICE_START + index * headway, headway))
+
+    return scheduled
+
+
+def _trip_rows(trip_id: str, pattern: StopPattern, start: float,
+               rng: random.Random) -> List[List[str]]:
+    """生成单个班次的 stop_times 行"""
+    speed = rng.uniform(*SPEED_RANGE)
+    rows = []
+    clock = start
+    last = len(pattern) - 1
+
+    for index, (stop_id, along, dist) in enumerate(pattern):
+        if index:
+            clock += (along - pattern[index - 1][1]) / speed
+        arrival = int(round(clock))
+        dwell = rng.randint(*DWELL_RANGE) if 0 < index < last else 0
+        clock += dwell
+
+        rows.append([
+            trip_id,
+            format_time(arrival),
+            format_time(arrival + dwell),
+            stop_id,
+            str(index + 1),
+            '',
+            '',
+            '',
+            '' if dist is None else f"{dist:.5f}",
+            '1' if index in (0, last) else '0',
+        ])
+
+    return rows
+
+
+def generate(feed_dir: Path, output_dir: Path, scale: int = 1, seed: int = 42) -> int:
+    """
+    生成合成数据集: 复制（并按 scale 放大）原始文件，写入 stop_times.txt
+
+    Returns:
+        生成的 stop_times 行数
+    """
+    rng = random.Random(seed)
+
+    print(f"Building stop patterns from {feed_dir}...")
+    grid = load_stop_grid(feed_dir / 'stops.txt')
+    patterns = build_stop_patterns(feed_dir / 'shapes.txt', grid)
+    trips = schedule_trips(feed_dir / 'trips.txt')
+    print(f"  {len(patterns):,} shapes with stop patterns, {len(trips):,} trips")
+
+    build_scaled_feed(feed_dir, output_dir, scale)
+
+    row_count = 0
+    skipped = 0
+    with open(output_dir / 'stop_times.txt', 'w', encoding='utf-8', newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(STOP_TIMES_COLUMNS)
+
+        for copy in range(scale):
+            suffix = f"_x{copy}" if copy else ''
+            for trip_id, shape_id, start, headway in trips:
+                pattern = patterns.get(shape_id)
+                if pattern is None:
+                    skipped += 1
+                    continue
+                # 副本在原班次之间错开发车，保持发车间隔均匀
+                rows = _trip_rows(trip_id + suffix, pattern, start + headway * copy / scale, rng)
+                writer.writerows(rows)
+                row_count += len(rows)
+
+    if skipped:
+        print(f"  Skipped {skipped:,} trips without a usable shape")
+    return row_count
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic stop_times.txt from trips, shapes and stops'
+    )
+    parser.add_argument('--feed', type=str, default=str(DATA_DIR / 'gtfs_SF'),
+                        help='Source GTFS directory (default: gtfs_data/gtfs_SF)')
+    parser.add_argument('--output', type=str, default=str(DATA_DIR / 'gtfs_SF_synthetic'),
+                        help='Output GTFS directory (default: gtfs_data/gtfs_SF_synthetic)')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='Copies of every trip and shape to generate (default: 1)')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Random seed (default: 42)')
+    args = parser.parse_args()
+
+    feed_dir = Path(args.feed)
+    output_dir = Path(args.output)
+    if args.scale < 1:
+        parser.error('--scale must be >= 1')
+    if feed_dir.resolve() == output_dir.resolve():
+        parser.error('--output must differ from --feed')
+
+    start = time.perf_counter()
+    row_count = generate(feed_dir, output_dir, args.scale, args.seed)
+    elapsed = time.perf_counter() - start
+
+    print(f"Wrote {row_count:,} stop_times rows to {output_dir / 'stop_times.txt'} "
+          f"in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,23 +9,98 @@ GTFS 数据导入工具 for PostgreSQL
     python gtfs_importer.py --zip path/to/gtfs.zip
     python gtfs_importer.py --dir path/to/gtfs_folder
     python gtfs_importer.py --zip gtfs.zip --clean --host localhost --database gtfs_db
+    python gtfs_importer.py --dir path/to/gtfs_folder --loader copy
+    python gtfs_importer.py --zip gtfs.zip --loader copy --swap
+    python gtfs_importer.py --zip gtfs.zip --diff
+    python gtfs_importer.py --dir path/to/gtfs_folder --clean --checkpoint
+    python gtfs_importer.py --dir path/to/gtfs_folder --resume
 """
 
 import argparse
 import csv
+import io
 import os
+import queue
 import sys
+import time
 import zipfile
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Iterable, Dict, Any, Callable, IO, Set, Tuple
 import psycopg2
-from psycopg2 import sql
-from psycopg2.extras import execute_batch
+from psycopg2 import sql, errors
+from psycopg2.extras import execute_batch, execute_values
+
+import gtfs_parser
+from shape_geometry import build_shape_levels
+
+
+class CSVCopyStream:
+    """
+    将 CSV 文本行迭代器包装为 COPY FROM STDIN 可读取的类文件对象
+
+    按需从源读取行，内存占用与文件大小无关；会跳过引号外的空行，
+    与 csv.DictReader 的行为保持一致。
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        self._lines = iter(lines)
+        self._buffer = []
+        self._buffered = 0
+        self._in_quotes = False
+
+    def read(self, size: int = -1) -> str:
+        """读取最多 size 个字符，size < 0 时读取全部剩余内容"""
+        while size < 0 or self._buffered < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            if not self._in_quotes and not line.strip():
+                continue
+            # 奇数个引号说明该行开始或结束了一个跨行的引号字段
+            if line.count('"') % 2:
+                self._in_quotes = not self._in_quotes
+            self._buffer.append(line)
+            self._buffered += len(line)
+
+        data = ''.join(self._buffer)
+        if 0 <= size < len(data):
+            data, rest = data[:size], data[size:]
+            self._buffer = [rest]
+            self._buffered = len(rest)
+        else:
+            self._buffer = []
+            self._buffered = 0
+        return data
 
 
 class GTFSImporter:
     """将 GTFS 数据导入 PostgreSQL 数据库"""
 
+    # 支持的加载方式: insert 为逐批 INSERT，copy 为 COPY FROM STDIN 流式加载，
+    # typed 为按列批量解析类型后以原生类型参数 INSERT
+    LOADERS = ('insert', 'copy', 'typed')
+
+    # 数据库列类型到 gtfs_parser 列类型的映射
+    PG_COLUMN_TYPES = {
+        'double precision': gtfs_parser.FLOAT,
+        'integer': gtfs_parser.INT,
+        'date': gtfs_parser.DATE,
+    }
+
+    # 零停机切换使用的 schema: 新数据先导入影子 schema，切换后旧表移入 retired schema
+    LIVE_SCHEMA = 'public'
+    SHADOW_SCHEMA = 'gtfs_shadow'
+    RETIRED_SCHEMA = 'gtfs_retired'
+
+    # 断点续传检查点表及默认分块大小
+    CHECKPOINT_TABLE = 'import_checkpoints'
+
+    # 导入记录表，API 根据最近一次导入判断数据版本（ETag、瓦片缓存）
+    IMPORT_LOG_TABLE = 'feed_imports'
+    DEFAULT_CHUNK_ROWS = 100000
+
     # 定义表导入顺序（遵循外键约束）
     TABLE_ORDER = [
         'agency',
@@ -47,6 +122,15 @@ class GTFSImporter:
         'attributions'
     ]
 
+    # GTFS 规范要求的表，验证时行数为 0 视为导入失败
+    REQUIRED_TABLES = ['agency', 'routes', 'stops', 'trips', 'stop_times']
+
+    # 导入后根据 GTFS 表生成的派生表，与 GTFS 表一起切换
+    DERIVED_TABLES = ['shape_levels']
+
+    # 增量导入时记录变化的键的表（用于只更新相应的派生数据）: {表名: 键列}
+    DIFF_TRACKED_KEYS = {'shapes': 'shape_id'}
+
     # GTFS txt 文件到数据库表名的映射
     FILE_TO_TABLE = {
         'agency.txt': 'agency',
@@ -70,15 +154,47 @@ class GTFSImporter:
 
     def __init__(self, host: str = 'localhost', port: int = 5432,
                  database: str = 'gtfs_db', user: Optional[str] = None,
-                 password: Optional[str] = None):
+                 password: Optional[str] = None, loader: str = 'insert',
+                 workers: int = 1, fast_load: bool = False,
+                 schema: Optional[str] = None, diff: bool = False,
+                 checkpoint: bool = False, resume: bool = False,
+                 chunk_rows: int = DEFAULT_CHUNK_ROWS):
         """使用数据库连接参数初始化导入器"""
+        if loader not in self.LOADERS:
+            raise ValueError(f"Unknown loader: {loader} (expected one of {', '.join(self.LOADERS)})")
+        if workers < 1:
+            raise ValueError(f"workers must be >= 1, got {workers}")
+        if chunk_rows < 1:
+            raise ValueError(f"chunk_rows must be >= 1, got {chunk_rows}")
         self.host = host
         self.port = port
         self.database = database
         self.user = user or os.environ.get('USER', 'postgres')
         self.password = password
+        self.loader = loader
+        self.workers = workers
+        self.fast_load = fast_load
+        # 导入目标 schema，None 表示使用数据库默认 search_path
+        self.schema = schema
+        self.diff = diff
+        # 分块提交并记录检查点；resume 时从已有检查点继续
+        self.checkpoint = checkpoint or resume
+        self.resume = resume
+        self.chunk_rows = chunk_rows
         self.conn = None
         self.cursor = None
+        # 每张表的导入统计: {table: {'rows': int, 'seconds': float}}
+        self.import_stats: Dict[str, Dict[str, Any]] = {}
+        # 增量导入统计: {table: {'staged': int, 'inserted': int, 'updated': int, 'deleted': int}}
+        self.diff_stats: Dict[str, Dict[str, int]] = {}
+        # 增量导入中新增、修改或删除了行的键: {table: {key}}，只包含 DIFF_TRACKED_KEYS 中的表
+        self.diff_changed: Dict[str, Set[str]] = {}
+        # 各导入阶段耗时: {phase: seconds}
+        self.phase_stats: Dict[str, float] = {}
+        # 导入失败的表和未通过校验的外键: {名称: 错误信息}，--swap 模式下不为空时不切换
+        self.failures: Dict[str, str] = {}
+        # 最近一次导入中找到了数据文件的表（verify_import 只验证这些表）
+        self.imported_tables: List[str] = []
 
     def connect(self):
         """连接到 PostgreSQL 数据库"""
@@ -94,6 +210,8 @@ class GTFSImporter:
 
             self.conn = psycopg2.connect(**conn_params)
             self.cursor = self.conn.cursor()
+            if self.schema:
+                self.use_schema(self.schema)
             print(f"Connected to database '{self.database}' at {self.host}:{self.port}")
         except psycopg2.Error as e:
             print(f"Error connecting to database: {e}")
@@ -107,6 +225,35 @@ class GTFSImporter:
             self.conn.close()
             print("Database connection closed")
 
+    def use_schema(self, schema: Optional[str]):
+        """将当前连接的 search_path 切换到指定 schema（None 表示线上 schema）"""
+        self.schema = schema
+        self.cursor.execute(sql.SQL("SET search_path TO {}").format(
+            sql.Identifier(schema or self.LIVE_SCHEMA)
+        ))
+        self.conn.commit()
+
+    def _open_workers(self, count: int) -> List['GTFSImporter']:
+        """创建 count 个使用相同连接参数、各自独占连接的工作导入器"""
+        workers = []
+        for _ in range(count):
+            worker = GTFSImporter(self.host, self.port, self.database, self.user,
+                                  self.password, loader=self.loader, schema=self.schema,
+                                  checkpoint=self.checkpoint, resume=self.resume,
+                                  chunk_rows=self.chunk_rows)
+            worker.connect()
+            workers.append(worker)
+        return workers
+
+    @contextmanager
+    def _phase(self, name: str):
+        """记录一个导入阶段的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_stats[name] = self.phase_stats.get(name, 0.0) + time.perf_counter() - start
+
     def clean_tables(self, tables: Optional[List[str]] = None):
         """清空指定表或所有表"""
         try:
@@ -134,99 +281,941 @@ class GTFSImporter:
             print(f"  Skipping {table_name}: file not found")
             return 0
 
-        try:
-            with open(file_path, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                rows = list(reader)
+        with open(file_path, 'r', encoding='utf-8-sig') as f:
+            return self.import_stream(f, table_name)
 
-                if not rows:
-                    print(f"  Skipping {table_name}: no data")
+    def import_stream(self, f: IO[str], table_name: str) -> int:
+        """从已打开的文本流（磁盘文件或 ZIP 成员）导入单张表"""
+        try:
+            start = time.perf_counter()
+            if self.checkpoint:
+                state = self._read_checkpoint(table_name)
+                if state and state['completed'] and self._checkpoint_matches(state, table_name, f):
+                    print(f"  Skipping {table_name}: already imported "
+                          f"({state['row_count']:,} rows)")
                     return 0
+                row_count = self._load_checkpointed(f, table_name, state)
+            else:
+                row_count = self._load_rows(f, table_name)
 
-                # 从第一行获取列名
-                columns = list(rows[0].keys())
+            if not row_count:
+                self.conn.rollback()
+                print(f"  Skipping {table_name}: no data")
+                return 0
 
-                # 准备 INSERT 语句
-                insert_query = sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
-                    sql.Identifier(table_name),
-                    sql.SQL(', ').join(map(sql.Identifier, columns)),
-                    sql.SQL(', ').join(sql.Placeholder() * len(columns))
-                )
-
-                # 准备批量插入的数据
-                data = []
-                for row in rows:
-                    # 将空字符串转换为 None 以正确处理 NULL
-                    values = tuple(v if v != '' else None for v in row.values())
-                    data.append(values)
-
-                # 执行批量插入
-                execute_batch(self.cursor, insert_query, data, page_size=1000)
-                self.conn.commit()
+            self.conn.commit()
+            elapsed = time.perf_counter() - start
+            self.import_stats[table_name] = {'rows': row_count, 'seconds': elapsed}
 
-                print(f"  Imported {len(rows):,} rows into {table_name}")
-                return len(rows)
+            print(f"  Imported {row_count:,} rows into {table_name} "
+                  f"in {elapsed:.2f}s ({self._rate(row_count, elapsed)} rows/s)")
+            return row_count
 
         except Exception as e:
             self.conn.rollback()
             print(f"  Error importing {table_name}: {e}")
+            self.failures[table_name] = str(e).strip()
+            return 0
+
+    def _load_rows(self, f: IO[str], table_name: str) -> int:
+        """使用当前加载方式导入文本流中的全部数据（不提交），返回导入行数"""
+        if self.loader == 'copy':
+            return self._copy_rows(f, table_name)
+        if self.loader == 'typed':
+            return self._typed_rows(f, table_name)
+        return self._insert_rows(f, table_name)
+
+    @property
+    def _checkpoint_table(self) -> sql.Identifier:
+        # 检查点表只在线上 schema 中（由 schema.sql 创建）
+        return sql.Identifier(self.LIVE_SCHEMA, self.CHECKPOINT_TABLE)
+
+    def prepare_checkpoints(self, tables: List[str]):
+        """非续传模式下清除这些表的旧检查点（检查点表由 schema.sql 创建）"""
+        if not self.resume:
+            self.cursor.execute(sql.SQL("DELETE FROM {} WHERE table_name = ANY(%s)").format(
+                self._checkpoint_table
+            ), (tables,))
+        self.conn.commit()
+
+    def _read_checkpoint(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """读取表的检查点"""
+        self.cursor.execute(sql.SQL("""
+            SELECT file_name, file_size, file_crc, file_mtime, byte_offset, row_count, completed
+            FROM {} WHERE table_name = %s
+        """).format(self._checkpoint_table), (table_name,))
+        row = self.cursor.fetchone()
+        self.conn.commit()
+        if row is None:
+            return None
+        keys = ('file_name', 'file_size', 'file_crc', 'file_mtime', 'byte_offset', 'row_count', 'completed')
+        return dict(zip(keys, row))
+
+    def _save_checkpoint(self, table_name: str, file_name: str,
+                         identity: Tuple[Optional[int], Optional[int], Optional[int]],
+                         byte_offset: int, row_count: int, completed: bool):
+        """在当前事务中写入检查点，与对应的数据块一起提交"""
+        file_size, file_crc, file_mtime = identity
+        self.cursor.execute(sql.SQL("""
+            INSERT INTO {} (table_name, file_name, file_size, file_crc, file_mtime, byte_offset, row_count,
+                            completed)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (table_name) DO UPDATE SET
+                file_name = EXCLUDED.file_name,
+                file_size = EXCLUDED.file_size,
+                file_crc = EXCLUDED.file_crc,
+                file_mtime = EXCLUDED.file_mtime,
+                byte_offset = EXCLUDED.byte_offset,
+                row_count = EXCLUDED.row_count,
+                completed = EXCLUDED.completed,
+                updated_at = CURRENT_TIMESTAMP
+        """).format(self._checkpoint_table),
+            (table_name, file_name, file_size, file_crc, file_mtime, byte_offset, row_count, completed))
+
+    def _load_checkpointed(self, f: IO[str], table_name: str,
+                           state: Optional[Dict[str, Any]]) -> int:
+        """
+        分块导入文件，每块数据与检查点（文件、字节偏移、行数）在同一事务中提交
+
+        存在匹配的检查点时从记录的字节偏移继续导入。
+
+        Returns:
+            该表累计导入的行数（包括之前运行中已导入的部分）
+        """
+        # 直接读取底层字节流，以便记录和定位字节偏移
+        raw = f.buffer
+        header = raw.readline()
+        if not header.strip():
+            return 0
+
+        file_name = self._file_name_for(table_name)
+        identity = self._stream_identity(f)
+        offset, row_count = len(header), 0
+
+        if state and self._checkpoint_matches(state, table_name, f):
+            offset, row_count = state['byte_offset'], state['row_count']
+            raw.seek(offset)
+            print(f"  Resuming {table_name} at row {row_count:,} (byte {offset:,})")
+        elif state:
+            print(f"  Warning: checkpoint for {table_name} does not match the current file, "
+                  f"starting from the beginning")
+
+        header_text = header.decode('utf-8-sig')
+        while True:
+            chunk, size = self._read_chunk(raw, self.chunk_rows)
+            if not size:
+                break
+            row_count += self._load_rows(io.StringIO(header_text + chunk.decode('utf-8')), table_name)
+            offset += size
+            self._save_checkpoint(table_name, file_name, identity, offset, row_count, False)
+            self.conn.commit()
+
+        if row_count:
+            self._save_checkpoint(table_name, file_name, identity, offset, row_count, True)
+        return row_count
+
+    @staticmethod
+    def _read_chunk(raw: IO[bytes], max_rows: int) -> Tuple[bytes, int]:
+        """
+        从字节流中读取最多 max_rows 行完整的 CSV 记录
+
+        Returns:
+            (数据块, 读取的字节数)，跨行的引号字段不会被截断
+        """
+        lines = []
+        rows = 0
+        size = 0
+        in_quotes = False
+        while rows < max_rows:
+            line = raw.readline()
+            if not line:
+                break
+            lines.append(line)
+            size += len(line)
+            if line.count(b'"') % 2:
+                in_quotes = not in_quotes
+            if not in_quotes and line.strip():
+                rows += 1
+        return b''.join(lines), size
+
+    def _checkpoint_matches(self, state: Dict[str, Any], table_name: str, f: IO[str]) -> bool:
+        """检查点是否对应同一文件（文件名、大小、CRC 和修改时间都相同）"""
+        return (state['file_name'] == self._file_name_for(table_name)
+                and (state['file_size'], state['file_crc'], state['file_mtime']) == self._stream_identity(f))
+
+    @staticmethod
+    def _stream_identity(f: IO[str]) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+        """
+        返回 (文件大小, CRC32, 修改时间（纳秒）)，用于确认检查点对应同一文件
+
+        ZIP 成员使用 open_zip_member 附加的 ZipInfo（解压后大小和 CRC），修改时间为 None；
+        磁盘文件没有 CRC（计算需要读完整个文件），用大小和修改时间识别，
+        替换为大小相同的新文件时修改时间不同，不会从旧的字节偏移继续；
+        都无法获取时返回 (None, None, None)。
+        """
+        info = getattr(f, 'zip_info', None)
+        if info is not None:
+            return info.file_size, info.CRC, None
+        try:
+            stat = os.fstat(f.buffer.fileno())
+            return stat.st_size, None, stat.st_mtime_ns
+        except (OSError, AttributeError, io.UnsupportedOperation):
+            return None, None, None
+
+    def _insert_rows(self, f, table_name: str) -> int:
+        """读取整个文件并通过批量 INSERT 导入，返回导入行数"""
+        reader = csv.DictReader(f)
+        rows = list(reader)
+
+        if not rows:
+            return 0
+
+        # 从第一行获取列名
+        columns = list(rows[0].keys())
+
+        # 准备 INSERT 语句
+        insert_query = sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
+            sql.Identifier(table_name),
+            sql.SQL(', ').join(map(sql.Identifier, columns)),
+            sql.SQL(', ').join(sql.Placeholder() * len(columns))
+        )
+
+        # 准备批量插入的数据
+        data = []
+        for row in rows:
+            # 将空字符串转换为 None 以正确处理 NULL
+            values = tuple(v if v != '' else None for v in row.values())
+            data.append(values)
+
+        # 执行批量插入
+        execute_batch(self.cursor, insert_query, data, page_size=1000)
+        return len(rows)
+
+    def _copy_rows(self, f, table_name: str) -> int:
+        """通过 COPY FROM STDIN 流式导入文件，返回导入行数"""
+        header = f.readline()
+        if not header.strip():
+            return 0
+
+        columns = next(csv.reader([header]))
+        column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+
+        # NULL '' 配合 FORCE_NULL 使带引号和不带引号的空字符串都转换为 NULL
+        copy_query = sql.SQL(
+            "COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '', FORCE_NULL ({}))"
+        ).format(sql.Identifier(table_name), column_list, column_list)
+
+        self.cursor.copy_expert(copy_query.as_string(self.conn), CSVCopyStream(f))
+        return self.cursor.rowcount
+
+    def _typed_rows(self, f, table_name: str) -> int:
+        """按列批量解析并转换为目标列类型后导入，返回导入行数"""
+        self.cursor.execute("""
+            SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute
+            WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+        """, (table_name,))
+        # 只转换数据库中为数值或日期的列，例如 arrival_time 在库中是 TEXT，保持原样
+        column_types = {
+            name: self.PG_COLUMN_TYPES.get(pg_type, gtfs_parser.TEXT)
+            for name, pg_type in self.cursor.fetchall()
+        }
+
+        row_count = 0
+        insert_query = None
+        for batch in gtfs_parser.iter_column_batches(f, column_types=column_types):
+            if insert_query is None:
+                insert_query = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+                    sql.Identifier(table_name),
+                    sql.SQL(', ').join(map(sql.Identifier, batch.names))
+                ).as_string(self.conn)
+            execute_values(self.cursor, insert_query, batch.rows(), page_size=1000)
+            row_count += len(batch)
+
+        return row_count
+
+    @staticmethod
+    def _rate(rows: int, seconds: float) -> str:
+        """格式化导入速率"""
+        return f"{rows / seconds:,.0f}" if seconds > 0 else "N/A"
+
+    def _file_name_for(self, table: str) -> Optional[str]:
+        """查找表对应的 GTFS 文件名"""
+        for fname, tname in self.FILE_TO_TABLE.items():
+            if tname == table:
+                return fname
+        return None
+
+    def _import_tables(self, open_table: Callable[[str], Optional[IO[str]]],
+                       tables: Optional[List[str]] = None):
+        """
+        导入各表：单工作线程时按 TABLE_ORDER 依次导入，否则按依赖图并行导入
+
+        Args:
+            open_table: 根据表名返回已打开的文本流，文件不存在时返回 None
+            tables: 要导入的表，默认全部
+        """
+        tables_to_import = [
+            table for table in (tables if tables else self.TABLE_ORDER)
+            if self._file_name_for(table)
+        ]
+        self.imported_tables = []
+        start = time.perf_counter()
+        self.phase_stats = {}
+
+        if self.checkpoint:
+            self.prepare_checkpoints(tables_to_import)
+
+        if self.diff:
+            changed_rows = self._diff_tables(open_table, tables_to_import)
+            elapsed = time.perf_counter() - start
+            print(f"\nTotal rows changed: {changed_rows:,} in {elapsed:.2f}s")
+            self.print_phase_report()
+            return
+
+        indexes, constraints = [], []
+        if self.fast_load:
+            with self._phase('drop_indexes'):
+                indexes, constraints = self.drop_secondary_objects(tables_to_import)
+
+        try:
+            with self._phase('load'):
+                if self.workers > 1 and len(tables_to_import) > 1:
+                    total_rows = self._import_tables_parallel(open_table, tables_to_import)
+                else:
+                    total_rows = sum(
+                        self._import_table(self, open_table, table) for table in tables_to_import
+                    )
+        finally:
+            # 即使加载失败也要恢复索引和约束，避免表结构残缺
+            if self.fast_load:
+                with self._phase('rebuild_indexes'):
+                    self.rebuild_indexes(indexes)
+                with self._phase('restore_constraints'):
+                    self.restore_constraints(constraints)
+                with self._phase('analyze'):
+                    self.analyze_tables(tables_to_import)
+
+        elapsed = time.perf_counter() - start
+        print(f"\nTotal rows imported: {total_rows:,} in {elapsed:.2f}s "
+              f"({self._rate(total_rows, elapsed)} rows/s, loader: {self.loader}, "
+              f"workers: {self.workers})")
+        self.print_phase_report()
+
+    def _table_columns(self, table: str) -> List[str]:
+        """按定义顺序返回表的所有列名"""
+        self.cursor.execute("""
+            SELECT attname FROM pg_attribute
+            WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+            ORDER BY attnum
+        """, (table,))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def _primary_key(self, table: str) -> List[str]:
+        """返回表的主键列，没有主键时返回空列表"""
+        self.cursor.execute("""
+            SELECT a.attname
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+            WHERE i.indrelid = %s::regclass AND i.indisprimary
+            ORDER BY array_position(i.indkey::int2[], a.attnum)
+        """, (table,))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def _diff_tables(self, open_table: Callable[[str], Optional[IO[str]]],
+                     tables: List[str]) -> int:
+        """
+        增量导入：将新数据加载到临时表，按主键和行哈希与线上数据比较，
+        只应用新增、修改和删除的行
+
+        整个过程在一个事务中完成；删除按子表到父表的顺序执行，
+        新增和修改按父表到子表的顺序执行，以满足外键约束。
+
+        Returns:
+            变化的总行数
+        """
+        self.diff_stats = {}
+        self.diff_changed = {}
+        staged = []
+
+        try:
+            with self._phase('stage'):
+                for table in tables:
+                    f = open_table(table)
+                    if f is None:
+                        print(f"  Skipping {table}: file not found")
+                        continue
+                    with f:
+                        rows = self._stage_table(f, table)
+                    self.diff_stats[table] = {'staged': rows, 'inserted': 0, 'updated': 0, 'deleted': 0}
+                    staged.append(table)
+                    self.imported_tables.append(table)
+
+            plans = {table: self._diff_plan(table) for table in staged}
+
+            with self._phase('delete'):
+                for table in reversed(staged):
+                    self.cursor.execute(plans[table]['delete'])
+                    self.diff_stats[table]['deleted'] = self.cursor.rowcount
+                    self._track_changed(table)
+
+            with self._phase('upsert'):
+                for table in staged:
+                    if plans[table]['update'] is not None:
+                        self.cursor.execute(plans[table]['update'])
+                        self.diff_stats[table]['updated'] = self.cursor.rowcount
+                        self._track_changed(table)
+                    self.cursor.execute(plans[table]['insert'])
+                    self.diff_stats[table]['inserted'] = self.cursor.rowcount
+                    self._track_changed(table)
+
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        print("\nDiff summary:")
+        changed_rows = 0
+        for table in staged:
+            stats = self.diff_stats[table]
+            changed = stats['inserted'] + stats['updated'] + stats['deleted']
+            changed_rows += changed
+            print(f"  {table:25} +{stats['inserted']:<8,} ~{stats['updated']:<8,} "
+                  f"-{stats['deleted']:<8,} ({stats['staged']:,} rows in feed)")
+        return changed_rows
+
+    def _track_changed(self, table: str):
+        """记录刚执行的增量语句（带 RETURNING）影响的键"""
+        if table in self.DIFF_TRACKED_KEYS:
+            self.diff_changed.setdefault(table, set()).update(row[0] for row in self.cursor.fetchall())
+
+    def _stage_table(self, f: IO[str], table: str) -> int:
+        """将新数据通过 COPY 加载到事务级临时表 diff_stage_<table>"""
+        stage = f"diff_stage_{table}"
+        self.cursor.execute(sql.SQL("CREATE TEMP TABLE {} (LIKE {}) ON COMMIT DROP").format(
+            sql.Identifier(stage), sql.Identifier(table)
+        ))
+        rows = self._copy_rows(f, stage)
+        self.cursor.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(stage)))
+        print(f"  Staged {rows:,} rows for {table}")
+        return rows
+
+    def _diff_plan(self, table: str) -> Dict[str, Optional[sql.Composed]]:
+        """
+        生成线上表 l 与临时表 s 之间的增量语句
+
+        有主键的表按主键匹配、按行哈希判断修改；没有主键的表以整行哈希作为键，
+        只会产生新增和删除。
+        """
+        columns = self._table_columns(table)
+        key = self._primary_key(table)
+        live = sql.Identifier(table)
+        stage = sql.Identifier(f"diff_stage_{table}")
+
+        def row_hash(alias: str) -> sql.Composed:
+            return sql.SQL("md5(ROW({})::text)").format(sql.SQL(', ').join(
+                sql.Identifier(alias, column) for column in columns
+            ))
+
+        if key:
+            match = sql.SQL(' AND ').join(
+                sql.SQL("l.{0} = s.{0}").format(sql.Identifier(column)) for column in key
+            )
+        else:
+            match = sql.SQL("{} = {}").format(row_hash('l'), row_hash('s'))
+
+        plan: Dict[str, Optional[sql.Composed]] = {
+            'delete': sql.SQL(
+                "DELETE FROM {} l WHERE NOT EXISTS (SELECT 1 FROM {} s WHERE {})"
+            ).format(live, stage, match),
+            'insert': sql.SQL(
+                "INSERT INTO {} ({}) SELECT {} FROM {} s "
+                "WHERE NOT EXISTS (SELECT 1 FROM {} l WHERE {})"
+            ).format(
+                live,
+                sql.SQL(', ').join(map(sql.Identifier, columns)),
+                sql.SQL(', ').join(sql.Identifier('s', column) for column in columns),
+                stage, live, match
+            ),
+            'update': None
+        }
+
+        value_columns = [column for column in columns if column not in key]
+        if key and value_columns:
+            plan['update'] = sql.SQL(
+                "UPDATE {} l SET {} FROM {} s WHERE {} AND {} <> {}"
+            ).format(
+                live,
+                sql.SQL(', ').join(
+                    sql.SQL("{0} = s.{0}").format(sql.Identifier(column)) for column in value_columns
+                ),
+                stage, match, row_hash('l'), row_hash('s')
+            )
+
+        tracked = self.DIFF_TRACKED_KEYS.get(table)
+        if tracked:
+            returning = sql.SQL(" RETURNING {}").format(sql.Identifier('l', tracked))
+            plan['delete'] += returning
+            plan['insert'] += sql.SQL(" RETURNING {}").format(sql.Identifier(tracked))
+            if plan['update'] is not None:
+                plan['update'] += returning
+
+        return plan
+
+    def print_phase_report(self):
+        """输出各导入阶段耗时"""
+        if len(self.phase_stats) <= 1:
+            return
+
+        print("\nPhase timings:")
+        for phase, seconds in self.phase_stats.items():
+            print(f"  {phase:25} {seconds:>10.2f}s")
+
+    def drop_secondary_objects(self, tables: List[str]) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str, str]]]:
+        """
+        删除待导入表上的二级索引和外键约束，加快批量加载
+
+        主键和唯一约束对应的索引会保留，用于保证数据正确性。
+
+        Returns:
+            (索引列表 [(索引名, 索引定义)], 外键列表 [(表名, 约束名, 约束定义)])
+        """
+        self.cursor.execute("""
+            SELECT i.relname, pg_get_indexdef(i.oid)
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN pg_class t ON t.oid = x.indrelid
+            JOIN pg_namespace n ON t.relnamespace = n.oid
+            WHERE n.nspname = current_schema()
+              AND t.relname = ANY(%s)
+              AND NOT EXISTS (
+                  SELECT 1 FROM pg_constraint c
+                  WHERE c.conindid = x.indexrelid AND c.contype IN ('p', 'u', 'x')
+              )
+            ORDER BY i.relname
+        """, (tables,))
+        indexes = self.cursor.fetchall()
+
+        self.cursor.execute("""
+            SELECT t.relname, c.conname, pg_get_constraintdef(c.oid)
+            FROM pg_constraint c
+            JOIN pg_class t ON c.conrelid = t.oid
+            JOIN pg_namespace n ON t.relnamespace = n.oid
+            WHERE c.contype = 'f'
+              AND n.nspname = current_schema()
+              AND t.relname = ANY(%s)
+            ORDER BY t.relname, c.conname
+        """, (tables,))
+        constraints = self.cursor.fetchall()
+
+        for table, name, _ in constraints:
+            self.cursor.execute(sql.SQL("ALTER TABLE {} DROP CONSTRAINT {}").format(
+                sql.Identifier(table), sql.Identifier(name)
+            ))
+        for name, _ in indexes:
+            self.cursor.execute(sql.SQL("DROP INDEX {}").format(sql.Identifier(name)))
+        self.conn.commit()
+
+        print(f"Fast load: dropped {len(indexes)} indexes and {len(constraints)} foreign keys")
+        return indexes, constraints
+
+    def rebuild_indexes(self, indexes: List[Tuple[str, str]]):
+        """使用多个连接并行重建索引"""
+        if not indexes:
+            return
+
+        worker_count = min(len(indexes), max(self.workers, os.cpu_count() or 1))
+        idle_workers: 'queue.Queue[GTFSImporter]' = queue.Queue()
+        all_workers = self._open_workers(worker_count)
+        for worker in all_workers:
+            idle_workers.put(worker)
+
+        def build(index: Tuple[str, str]):
+            name, definition = index
+            worker = idle_workers.get()
+            try:
+                start = time.perf_counter()
+                worker.cursor.execute(definition)
+                worker.conn.commit()
+                print(f"  Rebuilt index {name} in {time.perf_counter() - start:.2f}s")
+            except Exception:
+                worker.conn.rollback()
+                raise
+            finally:
+                idle_workers.put(worker)
+
+        try:
+            with ThreadPoolExecutor(max_workers=worker_count) as executor:
+                for future in [executor.submit(build, index) for index in indexes]:
+                    future.result()
+        finally:
+            for worker in all_workers:
+                worker.disconnect()
+
+    def restore_constraints(self, constraints: List[Tuple[str, str, str]]) -> List[str]:
+        """
+        重新添加外键约束，每个约束只需对整表做一次校验
+
+        已有数据违反约束时，约束以 NOT VALID 方式恢复（表结构保持完整，约束仍对新数据生效），
+        并记入 failures: --swap 模式下据此放弃切换；其他模式下数据已经提交到线上表，
+        只输出警告，导入照常记录（API 缓存随之失效）。
+
+        Returns:
+            未通过校验的约束（表名.约束名）
+        """
+        failed = []
+        for table, name, definition in constraints:
+            add_query = sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {}").format(
+                sql.Identifier(table), sql.Identifier(name), sql.SQL(definition)
+            )
+            try:
+                self.cursor.execute(add_query)
+                self.conn.commit()
+            except psycopg2.Error as e:
+                self.conn.rollback()
+                print(f"  Warning: {table}.{name} failed validation, restored as NOT VALID: {e}")
+                self.cursor.execute(add_query + sql.SQL(" NOT VALID"))
+                self.conn.commit()
+                self.failures[f"{table}.{name}"] = str(e).strip()
+                failed.append(f"{table}.{name}")
+        return failed
+
+    def analyze_tables(self, tables: List[str]):
+        """更新已导入表的统计信息"""
+        for table in tables:
+            self.cursor.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(table)))
+        self.conn.commit()
+
+    @staticmethod
+    def _import_table(importer: 'GTFSImporter',
+                      open_table: Callable[[str], Optional[IO[str]]], table: str) -> int:
+        """使用指定导入器（及其连接）导入单张表"""
+        f = open_table(table)
+        if f is None:
+            print(f"  Skipping {table}: file not found")
             return 0
 
+        importer.imported_tables.append(table)
+        with f:
+            return importer.import_stream(f, table)
+
+    def load_dependencies(self, tables: List[str]) -> Dict[str, Set[str]]:
+        """
+        根据数据库中的外键约束构建表依赖图
+
+        Returns:
+            {表名: 该表依赖的父表集合}，只包含 tables 内部的依赖
+        """
+        dependencies = {table: set() for table in tables}
+
+        self.cursor.execute("""
+            SELECT child.relname, parent.relname
+            FROM pg_constraint c
+            JOIN pg_class child ON c.conrelid = child.oid
+            JOIN pg_class parent ON c.confrelid = parent.oid
+            JOIN pg_namespace n ON child.relnamespace = n.oid
+            WHERE c.contype = 'f' AND n.nspname = current_schema()
+        """)
+        for child, parent in self.cursor.fetchall():
+            if child in dependencies and parent in dependencies and child != parent:
+                dependencies[child].add(parent)
+        self.conn.commit()
+
+        return dependencies
+
+    def _import_tables_parallel(self, open_table: Callable[[str], Optional[IO[str]]],
+                                tables: List[str]) -> int:
+        """
+        按外键依赖图并行导入各表
+
+        每个工作线程独占一个数据库连接；一张表在其所有父表提交后
+        立即开始导入，互不依赖的表同时加载。
+        """
+        dependencies = self.load_dependencies(tables)
+        worker_count = min(self.workers, len(tables))
+        print(f"Parallel import with {worker_count} workers")
+
+        idle_workers: 'queue.Queue[GTFSImporter]' = queue.Queue()
+        all_workers = self._open_workers(worker_count)
+        for worker in all_workers:
+            idle_workers.put(worker)
+
+        def run(table: str) -> int:
+            worker = idle_workers.get()
+            try:
+                return self._import_table(worker, open_table, table)
+            finally:
+                idle_workers.put(worker)
+
+        total_rows = 0
+        pending = dict(dependencies)
+        done: Set[str] = set()
+        running = {}
+
+        try:
+            with ThreadPoolExecutor(max_workers=worker_count) as executor:
+                while pending or running:
+                    ready = [table for table, parents in pending.items() if parents <= done]
+                    for table in ready:
+                        del pending[table]
+                        running[executor.submit(run, table)] = table
+
+                    if not running:
+                        raise ValueError(f"Circular table dependencies: {', '.join(pending)}")
+
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        done.add(running.pop(future))
+                        total_rows += future.result()
+        finally:
+            for worker in all_workers:
+                self.import_stats.update(worker.import_stats)
+                self.failures.update(worker.failures)
+                self.imported_tables.extend(worker.imported_tables)
+                worker.disconnect()
+
+        return total_rows
+
     def import_from_directory(self, directory: Path, tables: Optional[List[str]] = None):
         """从目录导入所有 GTFS 文件"""
         print(f"\nImporting GTFS data from: {directory}")
 
-        total_rows = 0
-        tables_to_import = tables if tables else self.TABLE_ORDER
+        def open_table(table: str) -> Optional[IO[str]]:
+            file_path = directory / self._file_name_for(table)
+            if not file_path.exists():
+                return None
+            return open(file_path, 'r', encoding='utf-8-sig')
 
-        for table in tables_to_import:
-            # 查找对应的文件
-            file_name = None
-            for fname, tname in self.FILE_TO_TABLE.items():
-                if tname == table:
-                    file_name = fname
-                    break
+        self._import_tables(open_table, tables)
 
-            if not file_name:
-                continue
+    @staticmethod
+    def zip_members(zip_ref: zipfile.ZipFile) -> Dict[str, zipfile.ZipInfo]:
+        """按文件名索引 ZIP 中的成员，兼容文件位于子目录中的压缩包"""
+        members = {}
+        for info in zip_ref.infolist():
+            if not info.is_dir():
+                members.setdefault(Path(info.filename).name, info)
+        return members
 
-            file_path = directory / file_name
-            rows = self.import_file(file_path, table)
-            total_rows += rows
+    @staticmethod
+    def open_zip_member(zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo) -> IO[str]:
+        """
+        以文本流方式打开 ZIP 成员，边解压边读取，不落盘
 
-        print(f"\nTotal rows imported: {total_rows:,}")
+        每次调用都返回独立的解压流，ZipFile 允许多个成员同时打开，
+        因此多个成员可以并发解码。返回的流带有 zip_info 属性，检查点用它识别成员是否变化。
+        """
+        stream = io.TextIOWrapper(zip_ref.open(info, 'r'), encoding='utf-8-sig')
+        stream.zip_info = info
+        return stream
 
     def import_from_zip(self, zip_path: Path, tables: Optional[List[str]] = None):
-        """从 ZIP 文件解压并导入 GTFS 数据"""
-        print(f"\nExtracting GTFS data from: {zip_path}")
+        """直接从 ZIP 文件流式导入 GTFS 数据，无需解压到磁盘"""
+        print(f"\nImporting GTFS data from: {zip_path}")
 
-        # 创建临时解压目录
-        extract_dir = zip_path.parent / f"{zip_path.stem}_temp"
-        extract_dir.mkdir(exist_ok=True)
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            members = self.zip_members(zip_ref)
 
-        try:
-            # 解压 ZIP 文件
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_dir)
-            print(f"Extracted to: {extract_dir}")
+            def open_table(table: str) -> Optional[IO[str]]:
+                info = members.get(self._file_name_for(table))
+                if info is None:
+                    return None
+                return self.open_zip_member(zip_ref, info)
 
-            # 从解压目录导入
-            self.import_from_directory(extract_dir, tables)
+            self._import_tables(open_table, tables)
 
+    def prepare_shadow_schema(self, schema_file: Path):
+        """
+        重建影子 schema 并在其中创建 GTFS 表结构，之后的导入都写入影子 schema
+
+        Args:
+            schema_file: 建表脚本（schema.sql）路径
+        """
+        print(f"Preparing shadow schema: {self.SHADOW_SCHEMA}")
+        shadow = sql.Identifier(self.SHADOW_SCHEMA)
+        self.cursor.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(shadow))
+        self.cursor.execute(sql.SQL("CREATE SCHEMA {}").format(shadow))
+        self.conn.commit()
+
+        # search_path 只包含影子 schema，schema.sql 中的 DROP TABLE 不会影响线上表
+        self.use_schema(self.SHADOW_SCHEMA)
+        with open(schema_file, 'r', encoding='utf-8') as f:
+            self.cursor.execute(f.read())
+        self.conn.commit()
+
+    def drop_shadow_schema(self):
+        """导入失败时删除影子 schema，线上表保持不变"""
+        # 出错时连接可能处于已中止的事务中
+        self.conn.rollback()
+        self.use_schema(None)
+        self.cursor.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(
+            sql.Identifier(self.SHADOW_SCHEMA)
+        ))
+        self.conn.commit()
+        print(f"Dropped {self.SHADOW_SCHEMA}, live tables were not changed")
+
+    def swap_shadow_schema(self, lock_timeout: str = '2s', max_attempts: int = 5):
+        """
+        在一个事务中将影子 schema 中的表原子切换为线上表
+
+        切换只修改系统目录，持有排他锁的时间很短；设置 lock_timeout，
+        拿不到锁时放弃并重试，避免排在长查询之后阻塞 API 请求。
+        """
+        live = sql.Identifier(self.LIVE_SCHEMA)
+        shadow = sql.Identifier(self.SHADOW_SCHEMA)
+        retired = sql.Identifier(self.RETIRED_SCHEMA)
+
+        self.cursor.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(retired))
+        self.conn.commit()
+
+        for attempt in range(1, max_attempts + 1):
+            try:
+                start = time.perf_counter()
+                self._swap_tables(live, shadow, retired, lock_timeout)
+                self.conn.commit()
+                print(f"Swapped {self.SHADOW_SCHEMA} into {self.LIVE_SCHEMA} "
+                      f"in {time.perf_counter() - start:.3f}s")
+                break
+            except errors.LockNotAvailable:
+                self.conn.rollback()
+                if attempt == max_attempts:
+                    raise
+                print(f"  Swap attempt {attempt} timed out waiting for locks, retrying...")
+                time.sleep(attempt)
+
+        self.use_schema(None)
+
+        # 删除旧数据，失败（例如仍有旧查询持有锁）时保留，下次切换前会再清理
+        try:
+            self.cursor.execute("SET lock_timeout = %s", (lock_timeout,))
+            self.cursor.execute(sql.SQL("DROP SCHEMA {} CASCADE").format(retired))
+            self.conn.commit()
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            print(f"  Warning: could not drop {self.RETIRED_SCHEMA}: {e}")
         finally:
-            # 清理临时目录
-            import shutil
-            if extract_dir.exists():
-                shutil.rmtree(extract_dir)
-                print(f"\nCleaned up temporary directory: {extract_dir}")
-
-    def verify_import(self):
-        """通过显示行数验证导入的数据"""
+            self.cursor.execute("RESET lock_timeout")
+            self.conn.commit()
+
+    def _swap_tables(self, live: sql.Identifier, shadow: sql.Identifier,
+                     retired: sql.Identifier, lock_timeout: str):
+        """执行切换事务中的各步骤，由调用方提交或回滚"""
+        tables = self.TABLE_ORDER + self.DERIVED_TABLES
+        self.cursor.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+        self.cursor.execute(sql.SQL("SET LOCAL search_path TO {}").format(live))
+
+        # 依赖线上表的视图按 OID 绑定，切换后需要按原定义重建
+        self.cursor.execute("""
+            SELECT DISTINCT vn.nspname, v.relname, pg_get_viewdef(v.oid)
+            FROM pg_depend d
+            JOIN pg_rewrite r ON d.objid = r.oid
+            JOIN pg_class v ON r.ev_class = v.oid
+            JOIN pg_namespace vn ON v.relnamespace = vn.oid
+            JOIN pg_class t ON d.refobjid = t.oid
+            JOIN pg_namespace tn ON t.relnamespace = tn.oid
+            WHERE v.relkind = 'v' AND v.oid <> t.oid
+              AND tn.nspname = %s AND t.relname = ANY(%s)
+        """, (self.LIVE_SCHEMA, tables))
+        views = self.cursor.fetchall()
+
+        # 其他表（如准点率表）指向线上 GTFS 表的外键
+        self.cursor.execute("""
+            SELECT cn.nspname, ct.relname, c.conname, pg_get_constraintdef(c.oid)
+            FROM pg_constraint c
+            JOIN pg_class ct ON c.conrelid = ct.oid
+            JOIN pg_namespace cn ON ct.relnamespace = cn.oid
+            JOIN pg_class pt ON c.confrelid = pt.oid
+            JOIN pg_namespace pn ON pt.relnamespace = pn.oid
+            WHERE c.contype = 'f'
+              AND pn.nspname = %s AND pt.relname = ANY(%s)
+              AND NOT (cn.nspname = %s AND ct.relname = ANY(%s))
+        """, (self.LIVE_SCHEMA, tables, self.LIVE_SCHEMA, tables))
+        external_fks = self.cursor.fetchall()
+
+        for schema, table, name, _ in external_fks:
+            self.cursor.execute(sql.SQL("ALTER TABLE {}.{} DROP CONSTRAINT {}").format(
+                sql.Identifier(schema), sql.Identifier(table), sql.Identifier(name)
+            ))
+
+        self.cursor.execute(sql.SQL("CREATE SCHEMA {}").format(retired))
+        for table in tables:
+            self.cursor.execute(sql.SQL("ALTER TABLE IF EXISTS {}.{} SET SCHEMA {}").format(
+                live, sql.Identifier(table), retired
+            ))
+        for table in tables:
+            self.cursor.execute(sql.SQL("ALTER TABLE {}.{} SET SCHEMA {}").format(
+                shadow, sql.Identifier(table), live
+            ))
+
+        for schema, name, definition in views:
+            self.cursor.execute(sql.SQL("CREATE OR REPLACE VIEW {}.{} AS {}").format(
+                sql.Identifier(schema), sql.Identifier(name), sql.SQL(definition)
+            ))
+
+        # NOT VALID 避免在切换事务中扫描整表，约束仍对后续写入生效
+        for schema, table, name, definition in external_fks:
+            self.cursor.execute(sql.SQL("ALTER TABLE {}.{} ADD CONSTRAINT {} {} NOT VALID").format(
+                sql.Identifier(schema), sql.Identifier(table), sql.Identifier(name),
+                sql.SQL(definition)
+            ))
+
+    def build_shape_levels(self, shape_ids: Optional[List[str]] = None):
+        """根据 shapes 表重新生成轨迹简化级别（shape_levels），shape_ids 为空时生成全部轨迹"""
+        print("\nBuilding shape simplification levels...")
+        try:
+            build_shape_levels(self.conn, shape_ids=shape_ids)
+            self.conn.commit()
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            print(f"  Warning: could not build shape levels: {e}")
+
+    def record_import(self, tables: Optional[List[str]] = None):
+        """在线上 schema 的导入记录表（由 schema.sql 创建）中记录本次导入，API 据此使缓存失效"""
+        table = sql.Identifier(self.LIVE_SCHEMA, self.IMPORT_LOG_TABLE)
+        try:
+            self.cursor.execute(sql.SQL("INSERT INTO {} (tables) VALUES (%s)").format(table),
+                                (tables or self.TABLE_ORDER,))
+            self.conn.commit()
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            print(f"  Warning: could not record import (run schema.sql to create "
+                  f"{self.LIVE_SCHEMA}.{self.IMPORT_LOG_TABLE}): {e}")
+
+    def report_failures(self, fatal: bool = True) -> bool:
+        """
+        输出导入失败的表和约束，有失败时返回 True
+
+        Args:
+            fatal: 是否因此放弃导入（--swap），否则只作为警告输出
+        """
+        if not self.failures:
+            return False
+        print("\nImport failed:" if fatal else "\nWarning: import completed with errors:")
+        for name, error in self.failures.items():
+            print(f"  {name}: {error}")
+        return True
+
+    def verify_import(self, tables: Optional[List[str]] = None, require: bool = False) -> bool:
+        """
+        通过显示行数验证导入的数据
+
+        Args:
+            tables: 要验证的表，默认为最近一次导入的表
+            require: 同时检查 REQUIRED_TABLES 都有数据（--swap 切换前，影子 schema 将整体替换线上表）
+
+        Returns:
+            require 为 False，或 REQUIRED_TABLES 中的表都有数据时返回 True
+        """
         print("\n" + "="*60)
         print("Import Verification - Row Counts")
         print("="*60)
 
-        for table in self.TABLE_ORDER:
+        selected = set(tables or self.imported_tables or self.TABLE_ORDER)
+        if require:
+            selected.update(self.REQUIRED_TABLES)
+        tables = [table for table in self.TABLE_ORDER if table in selected]
+
+        ok = True
+        for table in tables:
             try:
                 self.cursor.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(
                     sql.Identifier(table)
@@ -234,9 +1223,15 @@ class GTFSImporter:
                 count = self.cursor.fetchone()[0]
                 print(f"  {table:25} {count:>10,} rows")
             except psycopg2.Error:
+                self.conn.rollback()
+                count = None
                 print(f"  {table:25} {'N/A':>10}")
+            if require and table in self.REQUIRED_TABLES and not count:
+                self.failures[table] = 'required table is empty or missing'
+                ok = False
 
         print("="*60)
+        return ok
 
 
 def main():
@@ -250,6 +1245,13 @@ Examples:
   %(prog)s --dir gtfs_data/gtfs_SF
   %(prog)s --zip gtfs.zip --clean --database gtfs_db
   %(prog)s --zip gtfs.zip --tables routes stops trips
+  %(prog)s --dir gtfs_data/gtfs_SF --loader copy
+  %(prog)s --zip gtfs.zip --loader copy --workers 4
+  %(prog)s --zip gtfs.zip --clean --loader copy --fast-load
+  %(prog)s --zip gtfs.zip --loader copy --swap
+  %(prog)s --zip gtfs.zip --diff
+  %(prog)s --dir gtfs_data/gtfs_SF --clean --checkpoint
+  %(prog)s --dir gtfs_data/gtfs_SF --resume
         """
     )
 
@@ -277,24 +1279,69 @@ Examples:
                        help='Specific tables to import (default: all)')
     parser.add_argument('--no-verify', action='store_true',
                        help='Skip verification after import')
+    parser.add_argument('--loader', choices=GTFSImporter.LOADERS, default='insert',
+                       help='Loading strategy: batched INSERT, streaming COPY or typed '
+                            'column-batch INSERT (default: insert)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Number of parallel connections; independent tables load '
+                            'concurrently in foreign key order (default: 1)')
+    parser.add_argument('--fast-load', action='store_true',
+                       help='Drop secondary indexes and foreign keys while loading, then '
+                            'rebuild them in parallel and ANALYZE')
+    parser.add_argument('--swap', action='store_true',
+                       help='Load into a shadow schema, build indexes and ANALYZE there, '
+                            'then atomically swap it in (zero downtime, implies --fast-load)')
+    parser.add_argument('--diff', action='store_true',
+                       help='Incremental import: stage the feed, compare rows by primary key '
+                            'and hash, and apply only inserts, updates and deletes')
+    parser.add_argument('--checkpoint', action='store_true',
+                       help='Commit every --chunk-rows rows and record progress in the '
+                            'import_checkpoints table so an interrupted run can be resumed')
+    parser.add_argument('--resume', action='store_true',
+                       help='Resume an interrupted --checkpoint run from its checkpoints')
+    parser.add_argument('--chunk-rows', type=int, default=GTFSImporter.DEFAULT_CHUNK_ROWS,
+                       help=f'Rows per committed chunk in checkpoint mode '
+                            f'(default: {GTFSImporter.DEFAULT_CHUNK_ROWS})')
+    parser.add_argument('--schema-file', type=str,
+                       default=str(Path(__file__).parent / 'schema.sql'),
+                       help='Schema script used to create shadow tables (default: schema.sql)')
 
     args = parser.parse_args()
 
+    if args.swap and args.tables:
+        parser.error('--swap replaces the whole feed and cannot be combined with --tables')
+    if args.diff and (args.swap or args.clean or args.fast_load):
+        parser.error('--diff updates tables in place and cannot be combined with '
+                     '--swap, --clean or --fast-load')
+    if (args.checkpoint or args.resume) and (args.swap or args.diff or args.fast_load):
+        parser.error('--checkpoint/--resume cannot be combined with --swap, --diff or --fast-load')
+    if args.resume and args.clean:
+        parser.error('--resume continues a previous run and cannot be combined with --clean')
+
     # 创建导入器实例
     importer = GTFSImporter(
         host=args.host,
         port=args.port,
         database=args.database,
         user=args.user,
-        password=args.password
+        password=args.password,
+        loader=args.loader,
+        workers=args.workers,
+        fast_load=args.fast_load or args.swap,
+        diff=args.diff,
+        checkpoint=args.checkpoint,
+        resume=args.resume,
+        chunk_rows=args.chunk_rows
     )
 
     try:
         # 连接数据库
         importer.connect()
 
-        # 如果需要，清空表
-        if args.clean:
+        # 影子 schema 模式下线上表保持不变；否则如果需要，清空表
+        if args.swap:
+            importer.prepare_shadow_schema(Path(args.schema_file))
+        elif args.clean:
             importer.clean_tables(args.tables)
 
         # 导入数据
@@ -311,17 +1358,50 @@ Examples:
                 sys.exit(1)
             importer.import_from_directory(dir_path, args.tables)
 
-        # 验证导入
-        if not args.no_verify:
-            importer.verify_import()
+        def abort():
+            """影子 schema 中的数据不完整时不切换、不记录导入，以非零状态退出"""
+            importer.report_failures()
+            importer.drop_shadow_schema()
+            sys.exit(1)
 
-        print("\nImport completed successfully!")
+        # --swap 模式下有表导入失败或外键未通过校验时不切换；
+        # 其他模式下已导入的表已经提交，输出警告后继续（生成简化级别并记录导入）
+        if importer.failures:
+            if args.swap:
+                abort()
+            importer.report_failures(fatal=False)
+
+        # 轨迹更新后重新生成简化级别（切换前生成，与新数据一起上线；增量导入只处理变化的轨迹）
+        if args.diff:
+            changed_shapes = importer.diff_changed.get('shapes')
+            if changed_shapes:
+                importer.build_shape_levels(sorted(changed_shapes))
+        elif not args.tables or 'shapes' in args.tables:
+            importer.build_shape_levels()
+
+        # 验证导入（--swap 模式下在切换前验证影子 schema 中的数据，必需的表为空时不切换）
+        if not args.no_verify and not importer.verify_import(require=args.swap):
+            abort()
+
+        if args.swap:
+            importer.swap_shadow_schema()
+        importer.record_import(args.tables)
+
+        if importer.failures:
+            print("\nImport completed with warnings (see above)")
+        else:
+            print("\nImport completed successfully!")
 
     except KeyboardInterrupt:
         print("\n\nImport cancelled by user")
         sys.exit(1)
     except Exception as e:
         print(f"\nError during import: {e}")
+        if args.swap and importer.conn is not None:
+            try:
+                importer.drop_shadow_schema()
+            except psycopg2.Error as drop_error:
+                print(f"  Warning: could not drop {importer.SHADOW_SCHEMA}: {drop_error}")
         sys.exit(1)
     finally:
         importer.disconnect()
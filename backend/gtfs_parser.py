@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+GTFS 文件类型化解析模块
+
+按列批量读取 GTFS txt 文件，并在客户端完成类型转换:
+- 坐标、距离等浮点列转换为 array('d')，缺失值为 NaN
+- HH:MM:SS 时间（可超过 24:00:00）转换为距服务日零点的整数秒
+- YYYYMMDD 日期转换为 datetime.date
+- 整数列转换为 int，空字符串转换为 None
+
+使用方法:
+    from gtfs_parser import iter_column_batches
+
+    with open('shapes.txt', encoding='utf-8-sig') as f:
+        for batch in iter_column_batches(f):
+            lats = batch['shape_pt_lat']   # array('d')
+            lons = batch['shape_pt_lon']
+"""
+
+import csv
+import math
+from array import array
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Iterator, Iterable, Sequence, Tuple, Any, IO
+
+
+# 列类型
+FLOAT = 'float'
+INT = 'int'
+TIME = 'time'
+DATE = 'date'
+TEXT = 'text'
+
+# GTFS 规范中各列的类型，未列出的列按文本处理
+GTFS_COLUMN_TYPES: Dict[str, str] = {
+    # 浮点列
+    'stop_lat': FLOAT,
+    'stop_lon': FLOAT,
+    'shape_pt_lat': FLOAT,
+    'shape_pt_lon': FLOAT,
+    'shape_dist_traveled': FLOAT,
+    'price': FLOAT,
+    # 整数列
+    'route_type': INT,
+    'direction_id': INT,
+    'location_type': INT,
+    'wheelchair_boarding': INT,
+    'stop_sequence': INT,
+    'shape_pt_sequence': INT,
+    'pickup_type': INT,
+    'drop_off_type': INT,
+    'timepoint': INT,
+    'exception_type': INT,
+    'monday': INT,
+    'tuesday': INT,
+    'wednesday': INT,
+    'thursday': INT,
+    'friday': INT,
+    'saturday': INT,
+    'sunday': INT,
+    'bikes_allowed': INT,
+    'wheelchair_accessible': INT,
+    'payment_method': INT,
+    'transfers': INT,
+    'transfer_duration': INT,
+    'is_producer': INT,
+    # 时间列
+    'arrival_time': TIME,
+    'departure_time': TIME,
+    # 日期列
+    'date': DATE,
+    'start_date': DATE,
+    'end_date': DATE,
+    'feed_start_date': DATE,
+    'feed_end_date': DATE,
+    'expiration_date': DATE,
+    'commencement_date': DATE,
+}
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def parse_time(value: str) -> Optional[int]:
+    """
+    将 GTFS 时间转换为距服务日零点的秒数
+
+    GTFS 允许超过 24 小时的时间（如 25:10:00 表示次日凌晨 1:10），
+    因此不能使用 datetime.time 表示。
+
+    Args:
+        value: HH:MM:SS 或 H:MM:SS 格式的时间
+
+    Returns:
+        秒数，空值返回 None
+    """
+    value = value.strip()
+    if not value:
+        return None
+    hours, minutes, seconds = value.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def format_time(seconds: int) -> str:
+    """将秒数格式化为 GTFS 的 HH:MM:SS 时间（小时可以超过 24）"""
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def parse_date(value: str) -> Optional[date]:
+    """将 YYYYMMDD 格式的日期转换为 datetime.date，空值返回 None"""
+    value = value.strip()
+    if not value:
+        return None
+    return date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+
+
+def convert_column(values: Sequence[str], column_type: str) -> Sequence[Any]:
+    """
+    按列类型一次性转换一整列字符串值
+
+    Returns:
+        浮点列返回 array('d')（缺失值为 NaN），其他类型返回列表（缺失值为 None）
+    """
+    if column_type != TEXT:
+        # 只含空白的数值、时间和日期按缺失值处理（文本列保持原样）
+        values = [v.strip() for v in values]
+    if column_type == FLOAT:
+        return array('d', [float(v) if v else math.nan for v in values])
+    if column_type == INT:
+        return [int(v) if v else None for v in values]
+    if column_type == TIME:
+        return [parse_time(v) if v else None for v in values]
+    if column_type == DATE:
+        return [parse_date(v) if v else None for v in values]
+    return [v if v != '' else None for v in values]
+
+
+class ColumnBatch:
+    """按列存储的一批已转换数据"""
+
+    def __init__(self, columns: Dict[str, Sequence[Any]], types: Dict[str, str]):
+        self.columns = columns
+        self.types = types
+
+    @property
+    def names(self) -> List[str]:
+        """列名列表（与文件表头顺序一致）"""
+        return list(self.columns.keys())
+
+    def __len__(self) -> int:
+        for values in self.columns.values():
+            return len(values)
+        return 0
+
+    def __getitem__(self, name: str) -> Sequence[Any]:
+        return self.columns[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def rows(self) -> Iterator[Tuple[Any, ...]]:
+        """按行输出数据，浮点列中的 NaN 还原为 None，便于写入数据库"""
+        columns = []
+        for name, values in self.columns.items():
+            if self.types[name] == FLOAT:
+                values = [None if v != v else v for v in values]
+            columns.append(values)
+        return zip(*columns)
+
+
+def iter_column_batches(f: IO[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                        column_types: Optional[Dict[str, str]] = None) -> Iterator[ColumnBatch]:
+    """
+    按批读取 CSV 文件并逐列转换类型，内存占用只与批大小有关
+
+    Args:
+        f: 已打开的文本流（建议使用 utf-8-sig 编码打开）
+        batch_size: 每批行数
+        column_types: 列名到类型的映射，默认使用 GTFS_COLUMN_TYPES
+
+    Yields:
+        ColumnBatch
+    """
+    if column_types is None:
+        column_types = GTFS_COLUMN_TYPES
+
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if not header:
+        return
+    types = {name: column_types.get(name, TEXT) for name in header}
+
+    for rows in _chunks(reader, batch_size):
+        # 行转列，缺失的尾部字段补空字符串
+        width = len(header)
+        rows = [row if len(row) == width else (row + [''] * width)[:width] for row in rows]
+        columns = {
+            name: convert_column(values, types[name])
+            for name, values in zip(header, zip(*rows))
+        }
+        yield ColumnBatch(columns, types)
+
+
+def read_columns(file_path: Path, column_types: Optional[Dict[str, str]] = None) -> ColumnBatch:
+    """读取整个文件并返回按列存储的数据，适合 shapes.txt 等中等大小的文件"""
+    merged: Dict[str, Any] = {}
+    types: Dict[str, str] = {}
+
+    with open(file_path, 'r', encoding='utf-8-sig') as f:
+        for batch in iter_column_batches(f, column_types=column_types):
+            types = batch.types
+            for name, values in batch.columns.items():
+                if name in merged:
+                    merged[name].extend(values)
+                else:
+                    merged[name] = values
+
+    return ColumnBatch(merged, types)
+
+
+def _chunks(rows: Iterable[List[str]], size: int) -> Iterator[List[List[str]]]:
+    """将行迭代器切分为固定大小的批，跳过空行"""
+    chunk = []
+    for row in rows:
+        if not row:
+            continue
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,60 @@
+"""
+静态 GTFS 接口的 HTTP 缓存
+
+静态数据只在导入新数据集时变化，响应由数据版本（feed_version.py）和请求地址唯一确定，
+因此 ETag 直接由二者计算，不需要先查询数据库生成响应体。客户端带 If-None-Match 重新请求时，
+ETag 相同就返回 304，整个请求不访问数据库（数据版本本身每 FEED_VERSION_CHECK_INTERVAL 秒最多查询一次）。
+
+Cache-Control 的 max-age 由 HTTP_CACHE_MAX_AGE（默认 60 秒）指定，在此期间浏览器不会重复请求；
+导入新数据后，客户端最多在 max-age 加上版本检查间隔之后拿到新数据。
+
+使用方法（api.py 和 api_asgi.py 中的 feed_cached 装饰器）:
+    etag = make_etag(version, request.full_path)
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return Response(status=304, headers=cache_headers(etag))
+"""
+
+import hashlib
+import os
+from typing import Dict, Optional, Sequence
+
+CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 60))
+
+
+def make_etag(version: str, path: str, vary_values: Sequence[str] = ()) -> str:
+    """
+    计算强 ETag
+
+    Args:
+        version: 数据版本
+        path: 包含查询参数的请求路径
+        vary_values: 影响响应内容的请求头的值（如按 Accept 选择格式的接口）
+    """
+    digest = hashlib.blake2b('\n'.join([version, path, *vary_values]).encode('utf-8'), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否包含 etag（按 RFC 9110 使用弱比较，* 匹配任何版本）"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def cache_headers(etag: str, vary: Sequence[str] = ()) -> Dict[str, str]:
+    """200 和 304 响应共用的缓存响应头"""
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={CACHE_MAX_AGE}',
+    }
+    if vary:
+        headers['Vary'] = ', '.join(vary)
+    return headers
@@ -0,0 +1,174 @@
+"""
+列表接口的分页工具
+
+键集分页（keyset pagination）按排序列的值定位下一页，而不是跳过前面的 OFFSET 行，
+无论翻到第几页，查询都只需要沿索引读取 page_size + 1 行。
+分页位置编码在不透明的游标（next_cursor / prev_cursor）中返回给客户端。
+
+总数统计可以选择:
+- exact: COUNT(*) 精确计数（需要扫描所有匹配行）
+- estimate: 使用查询规划器的行数估计（基于表统计信息，常数时间）
+- none: 不统计
+
+使用方法:
+    page = KeysetPage(['t.trip_id'], page_size=20, cursor=request.args.get('cursor'))
+    sql, params = page.query("t.trip_id, t.route_id", "FROM trips t", "t.route_id = %s", ['1'])
+    trips, pagination = page.result(execute_query(sql, params))
+"""
+
+import base64
+import json
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+NEXT = 'next'
+PREV = 'prev'
+
+
+class CursorError(ValueError):
+    """分页游标无效"""
+
+
+def encode_cursor(values: Sequence[Any], direction: str) -> str:
+    """将排序键的值和翻页方向编码为不透明的游标"""
+    payload = json.dumps({'k': list(values), 'd': direction}, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str, key_count: int) -> Tuple[List[Any], str]:
+    """解码游标，返回 (排序键的值, 翻页方向)"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values, direction = payload['k'], payload['d']
+    except (ValueError, KeyError, TypeError) as e:
+        raise CursorError(f"invalid cursor: {e}")
+
+    if direction not in (NEXT, PREV) or not isinstance(values, list) or len(values) != key_count:
+        raise CursorError("invalid cursor")
+    return values, direction
+
+
+def nulls_last(expression: str, empty: str = "''") -> List[str]:
+    """
+    把可能为 NULL 的排序列展开为两个非 NULL 的排序键，顺序与 ORDER BY expression（NULLS LAST）相同
+
+    行比较 (a, b) > (x, y) 遇到 NULL 时结果为 NULL，因此键集分页的排序键不能为 NULL:
+    先按 expression IS NULL 排序（非 NULL 的行在前），再按 COALESCE 后的值排序。
+    """
+    return [f"({expression} IS NULL)", f"COALESCE({expression}, {empty})"]
+
+
+class KeysetPage:
+    """
+    一页键集分页查询
+
+    Args:
+        keys: 排序键的 SQL 表达式，必须能唯一确定一行（最后一个通常是主键），且不能为 NULL
+              （可能为 NULL 的列用 nulls_last 展开）
+        page_size: 每页行数
+        cursor: 上一页返回的 next_cursor / prev_cursor，为空时返回第一页
+    """
+
+    def __init__(self, keys: Sequence[str], page_size: int, cursor: Optional[str] = None):
+        self.keys = list(keys)
+        self.page_size = page_size
+        self.cursor = cursor or None
+        if self.cursor:
+            self.values, self.direction = decode_cursor(self.cursor, len(self.keys))
+        else:
+            self.values, self.direction = None, NEXT
+
+    @property
+    def _aliases(self) -> List[str]:
+        return [f"_page_key_{index}" for index in range(len(self.keys))]
+
+    def query(self, columns_sql: str, from_sql: str, where_sql: str,
+              params: Sequence[Any]) -> Tuple[str, List[Any]]:
+        """
+        生成查询语句
+
+        Args:
+            columns_sql: SELECT 列表
+            from_sql: FROM（及 JOIN）子句
+            where_sql: 过滤条件（不含 WHERE），没有条件时为 "1=1"
+            params: 过滤条件的参数
+
+        Returns:
+            (SQL, 参数)
+        """
+        params = list(params)
+        conditions = [where_sql]
+        if self.values is not None:
+            operator = '>' if self.direction == NEXT else '<'
+            placeholders = ', '.join(['%s'] * len(self.keys))
+            conditions.append(f"({', '.join(self.keys)}) {operator} ({placeholders})")
+            params.extend(self.values)
+
+        # 向前翻页时倒序读取，返回前再恢复正序
+        order = '' if self.direction == NEXT else ' DESC'
+        key_columns = ', '.join(f"{key} AS {alias}" for key, alias in zip(self.keys, self._aliases))
+        query = f"""
+            SELECT {columns_sql}, {key_columns}
+            {from_sql}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {', '.join(key + order for key in self.keys)}
+            LIMIT %s
+        """
+        # 多读一行，用于判断这个方向上是否还有数据
+        params.append(self.page_size + 1)
+        return query, params
+
+    def result(self, rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        处理查询结果
+
+        Returns:
+            (当前页的行, 分页信息 {page_size, next_cursor, prev_cursor})
+        """
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.direction == PREV:
+            rows.reverse()
+
+        aliases = self._aliases
+        page_keys = [[row.pop(alias) for alias in aliases] for row in rows]
+
+        if self.direction == NEXT:
+            has_next, has_prev = has_more, self.values is not None
+        else:
+            has_next, has_prev = True, has_more
+
+        return rows, {
+            'page_size': self.page_size,
+            'next_cursor': encode_cursor(page_keys[-1], NEXT) if rows and has_next else None,
+            'prev_cursor': encode_cursor(page_keys[0], PREV) if rows and has_prev else None,
+        }
+
+
+def count_query(mode: str, from_sql: str, where_sql: str) -> Optional[str]:
+    """
+    生成统计总数的语句
+
+    exact 模式返回 COUNT(*) 语句（使用 execute_count 执行）；
+    estimate 模式返回 EXPLAIN 语句（使用 execute_query_one 执行，再用 estimated_rows 取出估计值）；
+    none 模式返回 None
+    """
+    if mode == 'exact':
+        return f"SELECT COUNT(*) {from_sql} WHERE {where_sql}"
+    if mode == 'estimate':
+        return f"EXPLAIN (FORMAT JSON) SELECT 1 {from_sql} WHERE {where_sql}"
+    return None
+
+
+def estimated_rows(explain_row: Optional[Dict[str, Any]]) -> Optional[int]:
+    """从 EXPLAIN (FORMAT JSON) 的结果中取出规划器估计的行数"""
+    if not explain_row:
+        return None
+    plan = next(iter(explain_row.values()))
+    # psycopg2 会把 json 结果解析为列表，asyncpg 返回字符串
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
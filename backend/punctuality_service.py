@@ -14,7 +14,7 @@ import schedule
 
 from gtfs_data_fetcher import GTFSDataFetcher
 from punctuality_calculator import PunctualityCalculator, DelayRecord, PunctualityThresholds
-from db import Database, execute_query, execute_query_one, execute_count, get_connection
+from db import Database, connection_scope, execute_query, execute_query_one, execute_count
 
 # 配置日志
 logging.basicConfig(
@@ -116,18 +116,22 @@ class PunctualityDataService:
 
             logger.info(f"获取到 {len(vehicle_positions)} 个车辆位置，{len(trip_updates)} 个行程更新")
 
-            # 存储车辆位置数据
-            self._store_vehicle_positions(vehicle_positions)
-
             # 处理延误数据并计算准点率
             delay_records = self._process_trip_updates(trip_updates)
             logger.info(f"处理了 {len(delay_records)} 个延误记录")
 
-            # 存储延误记录到数据库
-            self._store_delay_records(delay_records)
+            # 一个收集周期的写入和统计更新在同一个事务中完成，任一步失败时整体回滚。
+            # 连接来自连接池（主库），周期结束后归还，下一个周期复用
+            with connection_scope(primary=True) as scope:
+                with scope.connection().cursor() as cursor:
+                    # 存储车辆位置数据
+                    self._store_vehicle_positions(cursor, vehicle_positions)
+
+                    # 存储延误记录到数据库
+                    self._store_delay_records(cursor, delay_records)
 
-            # 更新准点率统计
-            self._update_punctuality_statistics()
+                    # 更新准点率统计
+                    self._update_punctuality_statistics(cursor)
 
             self.last_collection_time = datetime.now()
             duration = (self.last_collection_time - start_time).total_seconds()
@@ -139,15 +143,12 @@ class PunctualityDataService:
             logger.error(f"收集实时数据时发生错误: {e}")
             return False
 
-    def _store_vehicle_positions(self, vehicle_positions: List[Dict[str, Any]]) -> None:
+    def _store_vehicle_positions(self, cursor, vehicle_positions: List[Dict[str, Any]]) -> None:
         """存储车辆位置数据到数据库"""
         if not vehicle_positions:
             return
 
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-
             # 准备插入数据
             insert_data = []
             current_time = datetime.now(timezone.utc)
@@ -177,19 +178,12 @@ class PunctualityDataService:
             """
 
             execute_batch(cursor, query, insert_data)
-            conn.commit()
 
             logger.info(f"成功存储 {len(insert_data)} 条车辆位置记录")
 
         except Exception as e:
             logger.error(f"存储车辆位置数据时发生错误: {e}")
-            if 'conn' in locals():
-                conn.rollback()
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'conn' in locals():
-                conn.close()
+            raise
 
     def _process_trip_updates(self, trip_updates: List[Dict[str, Any]]) -> List[DelayRecord]:
         """处理行程更新数据，生成延误记录"""
@@ -226,15 +220,12 @@ class PunctualityDataService:
 
         return delay_records
 
-    def _store_delay_records(self, delay_records: List[DelayRecord]) -> None:
+    def _store_delay_records(self, cursor, delay_records: List[DelayRecord]) -> None:
         """存储延误记录到数据库"""
         if not delay_records:
             return
 
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-
             # 准备插入数据
             insert_data = []
             for record in delay_records:
@@ -263,48 +254,39 @@ class PunctualityDataService:
             """
 
             execute_batch(cursor, query, insert_data)
-            conn.commit()
 
             logger.info(f"成功存储 {len(insert_data)} 条延误记录")
 
         except Exception as e:
             logger.error(f"存储延误记录时发生错误: {e}")
-            if 'conn' in locals():
-                conn.rollback()
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'conn' in locals():
-                conn.close()
+            raise
 
-    def _update_punctuality_statistics(self) -> None:
+    def _update_punctuality_statistics(self, cursor) -> None:
         """更新准点率统计表"""
         try:
             logger.info("开始更新准点率统计...")
 
             # 更新线路日统计
-            self._update_route_daily_stats()
+            self._update_route_daily_stats(cursor)
 
             # 更新站点日统计
-            self._update_stop_daily_stats()
+            self._update_stop_daily_stats(cursor)
 
             # 更新时段统计
-            self._update_hourly_stats()
+            self._update_hourly_stats(cursor)
 
             # 更新系统概览
-            self._update_system_overview()
+            self._update_system_overview(cursor)
 
             logger.info("准点率统计更新完成")
 
         except Exception as e:
             logger.error(f"更新准点率统计时发生错误: {e}")
+            raise
 
-    def _update_route_daily_stats(self) -> None:
+    def _update_route_daily_stats(self, cursor) -> None:
         """更新线路日统计"""
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-
             # 获取阈值配置
             on_time_threshold = self.config.get('on_time_threshold_seconds', 120)
             very_late_threshold = self.config.get('very_late_threshold_seconds', 300)
@@ -364,25 +346,15 @@ class PunctualityDataService:
                   AND processed = false
             """)
 
-            conn.commit()
             logger.info("线路日统计更新完成")
 
         except Exception as e:
             logger.error(f"更新线路日统计时发生错误: {e}")
-            if 'conn' in locals():
-                conn.rollback()
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'conn' in locals():
-                conn.close()
+            raise
 
-    def _update_stop_daily_stats(self) -> None:
+    def _update_stop_daily_stats(self, cursor) -> None:
         """更新站点日统计"""
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-
             on_time_threshold = self.config.get('on_time_threshold_seconds', 120)
 
             query = """
@@ -420,26 +392,16 @@ class PunctualityDataService:
             """
 
             cursor.execute(query, [on_time_threshold, on_time_threshold, on_time_threshold])
-            conn.commit()
 
             logger.info("站点日统计更新完成")
 
         except Exception as e:
             logger.error(f"更新站点日统计时发生错误: {e}")
-            if 'conn' in locals():
-                conn.rollback()
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'conn' in locals():
-                conn.close()
+            raise
 
-    def _update_hourly_stats(self) -> None:
+    def _update_hourly_stats(self, cursor) -> None:
         """更新时段统计"""
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-
             on_time_threshold = self.config.get('on_time_threshold_seconds', 120)
 
             query = """
@@ -470,26 +432,16 @@ class PunctualityDataService:
             """
 
             cursor.execute(query, [on_time_threshold, on_time_threshold])
-            conn.commit()
 
             logger.info("时段统计更新完成")
 
         except Exception as e:
             logger.error(f"更新时段统计时发生错误: {e}")
-            if 'conn' in locals():
-                conn.rollback()
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'conn' in locals():
-                conn.close()
+            raise
 
-    def _update_system_overview(self) -> None:
+    def _update_system_overview(self, cursor) -> None:
         """更新系统概览"""
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-
             # 计算早高峰和晚高峰准点率
             morning_peak_query = """
                 SELECT AVG(punctuality_rate) as morning_peak_rate
@@ -550,19 +502,12 @@ class PunctualityDataService:
             ]
 
             cursor.execute(query, params)
-            conn.commit()
 
             logger.info("系统概览更新完成")
 
         except Exception as e:
             logger.error(f"更新系统概览时发生错误: {e}")
-            if 'conn' in locals():
-                conn.rollback()
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'conn' in locals():
-                conn.close()
+            raise
 
     def cleanup_old_data(self) -> None:
         """清理过期数据"""
@@ -570,38 +515,28 @@ class PunctualityDataService:
             retention_days = self.config.get('data_retention_days', 90)
             cutoff_date = datetime.now() - timedelta(days=retention_days)
 
-            conn = get_connection()
-            cursor = conn.cursor()
+            with connection_scope(primary=True) as scope:
+                with scope.connection().cursor() as cursor:
+                    # 清理实时车辆位置数据
+                    cursor.execute("""
+                        DELETE FROM realtime_vehicle_positions
+                        WHERE record_timestamp < %s
+                    """, (cutoff_date,))
 
-            # 清理实时车辆位置数据
-            cursor.execute("""
-                DELETE FROM realtime_vehicle_positions
-                WHERE record_timestamp < %s
-            """, (cutoff_date,))
+                    vehicle_deleted = cursor.rowcount
 
-            vehicle_deleted = cursor.rowcount
+                    # 清理实时延误记录数据
+                    cursor.execute("""
+                        DELETE FROM realtime_delay_records
+                        WHERE record_timestamp < %s
+                    """, (cutoff_date,))
 
-            # 清理实时延误记录数据
-            cursor.execute("""
-                DELETE FROM realtime_delay_records
-                WHERE record_timestamp < %s
-            """, (cutoff_date,))
-
-            delays_deleted = cursor.rowcount
-
-            conn.commit()
+                    delays_deleted = cursor.rowcount
 
             logger.info(f"清理过期数据完成: 删除了 {vehicle_deleted} 条车辆位置记录，{delays_deleted} 条延误记录")
 
         except Exception as e:
             logger.error(f"清理过期数据时发生错误: {e}")
-            if 'conn' in locals():
-                conn.rollback()
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'conn' in locals():
-                conn.close()
 
     def start_service(self) -> None:
         """启动数据收集服务"""
@@ -675,6 +610,7 @@ def main():
         logger.error(f"服务运行时发生错误: {e}")
     finally:
         service.stop_service()
+        Database.close_all_connections()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,206 @@
+"""
+查询性能统计模块
+
+按语句汇总执行次数、耗时直方图、返回行数和连接池等待时间，
+耗时超过阈值的语句连同其 EXPLAIN 执行计划写入日志。
+
+语句按"指纹"汇总: 合并空白，并把数字和字符串字面量替换为 ?，
+因此只是参数不同的查询会归到同一条统计中。
+
+使用方法:
+    from query_metrics import metrics
+
+    metrics.snapshot()          # 当前统计
+    metrics.slow_query_ms = 200 # 调整慢查询阈值
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 直方图分桶上限（毫秒），最后一个桶收集所有更慢的请求
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# 最多单独统计的语句数，超出后归入 OTHER_STATEMENT
+MAX_STATEMENTS = 500
+OTHER_STATEMENT = '<other>'
+
+# 同一条语句两次 EXPLAIN 之间的最小间隔（秒），避免慢查询集中出现时反复查询执行计划
+EXPLAIN_INTERVAL = 60.0
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+def fingerprint(query: str) -> str:
+    """生成语句指纹: 合并空白并把字面量替换为 ?"""
+    query = _STRING_LITERAL.sub('?', query)
+    query = _NUMBER_LITERAL.sub('?', query)
+    return _WHITESPACE.sub(' ', query).strip()
+
+
+class Histogram:
+    """固定分桶的耗时直方图"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms: float):
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """按分桶估计百分位数（返回所在桶的上限，落入最后一个桶时返回最大值）"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{bound:g}ms" for bound in LATENCY_BUCKETS_MS] + ['inf']
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else None,
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': dict(zip(labels, self.buckets)),
+        }
+
+
+class StatementStats:
+    """单条语句的统计"""
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.rows = 0
+        self.errors = 0
+        self.slow = 0
+        self.last_explained = 0.0
+
+
+class QueryMetrics:
+    """线程安全的查询统计"""
+
+    def __init__(self, slow_query_ms: Optional[float] = None):
+        if slow_query_ms is None:
+            slow_query_ms = float(os.getenv('DB_SLOW_QUERY_MS', 500))
+        # 慢查询阈值（毫秒），0 或负数表示不记录慢查询
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._statements: Dict[str, StatementStats] = {}
+        self._pool_wait = Histogram()
+        self._started = time.time()
+
+    def _stats_for(self, statement: str) -> StatementStats:
+        stats = self._statements.get(statement)
+        if stats is None:
+            if len(self._statements) >= MAX_STATEMENTS:
+                statement = OTHER_STATEMENT
+            stats = self._statements.setdefault(statement, StatementStats())
+        return stats
+
+    def record(self, query: str, elapsed: float, rows: int = 0, error: bool = False) -> bool:
+        """
+        记录一次语句执行
+
+        Args:
+            query: SQL 语句
+            elapsed: 耗时（秒）
+            rows: 返回或影响的行数（未知时为负数）
+            error: 是否执行失败
+
+        Returns:
+            是否需要为这条慢查询获取执行计划（同一语句每 EXPLAIN_INTERVAL 秒最多一次）
+        """
+        elapsed_ms = elapsed * 1000
+        statement = fingerprint(query)
+        slow = 0 < self.slow_query_ms <= elapsed_ms and not error
+
+        with self._lock:
+            stats = self._stats_for(statement)
+            stats.latency.observe(elapsed_ms)
+            if rows > 0:
+                stats.rows += rows
+            if error:
+                stats.errors += 1
+            if not slow:
+                return False
+            stats.slow += 1
+            now = time.monotonic()
+            explain = now - stats.last_explained >= EXPLAIN_INTERVAL
+            if explain:
+                stats.last_explained = now
+
+        if not explain:
+            logger.warning("Slow query (%.1f ms, %d rows): %s", elapsed_ms, rows, statement)
+        return explain
+
+    def log_slow_query(self, query: str, elapsed: float, rows: int, plan: Optional[str]):
+        """把慢查询和执行计划写入日志"""
+        logger.warning("Slow query (%.1f ms, %d rows): %s\n%s",
+                       elapsed * 1000, rows, fingerprint(query), plan or '(execution plan unavailable)')
+
+    def record_pool_wait(self, elapsed: float):
+        """记录一次从连接池获取连接的等待时间（秒）"""
+        with self._lock:
+            self._pool_wait.observe(elapsed * 1000)
+
+    def snapshot(self, limit: Optional[int] = None, order_by: str = 'total_ms') -> Dict[str, Any]:
+        """
+        返回统计快照
+
+        Args:
+            limit: 最多返回的语句数
+            order_by: 排序字段（total_ms、avg_ms、max_ms、count、rows、slow）
+        """
+        with self._lock:
+            statements: List[Dict[str, Any]] = [
+                {
+                    'statement': statement,
+                    'rows': stats.rows,
+                    'errors': stats.errors,
+                    'slow': stats.slow,
+                    **stats.latency.to_dict(),
+                }
+                for statement, stats in self._statements.items()
+            ]
+            pool_wait = self._pool_wait.to_dict()
+
+        statements.sort(key=lambda item: item.get(order_by) or 0, reverse=True)
+        return {
+            'since': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self._started)),
+            'slow_query_ms': self.slow_query_ms,
+            'statement_count': len(statements),
+            'statements': statements[:limit] if limit else statements,
+            'pool_wait': pool_wait,
+        }
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._statements.clear()
+            self._pool_wait = Histogram()
+            self._started = time.time()
+
+
+metrics = QueryMetrics()
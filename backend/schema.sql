@@ -1,6 +1,10 @@
 -- PostgreSQL GTFS 数据库架构
 -- 此架构遵循 GTFS 规范，包含 SF Muni 扩展
 
+-- 三元组索引扩展，用于站点和线路名称的模糊搜索。
+-- 固定安装在 public 中，在影子 schema 中执行本脚本时也能找到
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public;
+
 -- 删除已存在的表
 DROP TABLE IF EXISTS stop_times CASCADE;
 DROP TABLE IF EXISTS trips CASCADE;
@@ -11,6 +15,7 @@ DROP TABLE IF EXISTS rider_categories CASCADE;
 DROP TABLE IF EXISTS calendar_dates CASCADE;
 DROP TABLE IF EXISTS calendar CASCADE;
 DROP TABLE IF EXISTS calendar_attributes CASCADE;
+DROP TABLE IF EXISTS shape_levels CASCADE;
 DROP TABLE IF EXISTS shapes CASCADE;
 DROP TABLE IF EXISTS stops CASCADE;
 DROP TABLE IF EXISTS routes CASCADE;
@@ -116,6 +121,23 @@ CREATE TABLE shapes (
     PRIMARY KEY (shape_id, shape_pt_sequence)
 );
 
+-- 轨迹简化级别表：导入后由 gtfs_importer.py 生成的 Douglas-Peucker 简化轨迹，
+-- 每个级别一行，点按顺序保存在数组中
+CREATE TABLE shape_levels (
+    shape_id TEXT NOT NULL,
+    tolerance DOUBLE PRECISION NOT NULL,
+    point_count INTEGER NOT NULL,
+    shape_pt_lat DOUBLE PRECISION[] NOT NULL,
+    shape_pt_lon DOUBLE PRECISION[] NOT NULL,
+    shape_pt_sequence INTEGER[] NOT NULL,
+    shape_dist_traveled DOUBLE PRECISION[] NOT NULL,
+    min_lat DOUBLE PRECISION NOT NULL,
+    min_lon DOUBLE PRECISION NOT NULL,
+    max_lat DOUBLE PRECISION NOT NULL,
+    max_lon DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (shape_id, tolerance)
+);
+
 -- 班次表：每条线路的班次信息
 CREATE TABLE trips (
     trip_id TEXT PRIMARY KEY,
@@ -199,12 +221,47 @@ CREATE TABLE attributions (
     attribution_email TEXT
 );
 
+-- 断点续传检查点表：gtfs_importer.py --checkpoint 与数据块在同一事务中写入
+-- （只建在 public 中，不随 GTFS 表删除重建；file_size 和 file_crc 用于确认续传时文件未变化）
+CREATE TABLE IF NOT EXISTS public.import_checkpoints (
+    table_name TEXT PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    file_size BIGINT,
+    file_crc BIGINT,
+    file_mtime BIGINT,
+    byte_offset BIGINT NOT NULL,
+    row_count BIGINT NOT NULL,
+    completed BOOLEAN NOT NULL DEFAULT false,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+-- 旧版本由导入器创建的检查点表没有 file_crc、file_mtime 列
+ALTER TABLE public.import_checkpoints ADD COLUMN IF NOT EXISTS file_crc BIGINT;
+ALTER TABLE public.import_checkpoints ADD COLUMN IF NOT EXISTS file_mtime BIGINT;
+
+-- 导入记录表：gtfs_importer.py 每次导入完成后写入一行，最近的导入时间是 API 数据版本的一部分
+-- （不随 GTFS 表删除重建，重新执行本脚本后导入历史仍然保留；始终建在 public 中，
+-- 在影子 schema 中执行本脚本时也不会产生副本）
+CREATE TABLE IF NOT EXISTS public.feed_imports (
+    id BIGSERIAL PRIMARY KEY,
+    imported_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    tables TEXT[] NOT NULL
+);
+
 -- 创建索引以提高查询性能
 CREATE INDEX idx_routes_agency_id ON routes(agency_id);
 CREATE INDEX idx_routes_type ON routes(route_type);
+-- 线路列表的排序键（键集分页和 OFFSET 分页相同，见 api_common.ROUTE_SORT_KEYS），名称为 NULL 的线路排在最后
+CREATE INDEX idx_routes_name ON routes ((route_short_name IS NULL), (COALESCE(route_short_name, '')),
+                                        (route_long_name IS NULL), (COALESCE(route_long_name, '')), route_id);
 
 CREATE INDEX idx_stops_location ON stops(stop_lat, stop_lon);
-CREATE INDEX idx_stops_name ON stops(stop_name);
+CREATE INDEX idx_stops_name ON stops(stop_name, stop_id);
+
+-- 名称搜索: 三元组 GIN 索引支持 ILIKE '%...%' 和 word_similarity 模糊匹配
+CREATE INDEX idx_stops_name_trgm ON stops USING gin (stop_name public.gin_trgm_ops);
+CREATE INDEX idx_stops_code_trgm ON stops USING gin (stop_code public.gin_trgm_ops);
+CREATE INDEX idx_routes_short_name_trgm ON routes USING gin (route_short_name public.gin_trgm_ops);
+CREATE INDEX idx_routes_long_name_trgm ON routes USING gin (route_long_name public.gin_trgm_ops);
 
 CREATE INDEX idx_trips_route_id ON trips(route_id);
 CREATE INDEX idx_trips_service_id ON trips(service_id);
@@ -218,6 +275,7 @@ CREATE INDEX idx_calendar_dates_service_id ON calendar_dates(service_id);
 CREATE INDEX idx_calendar_dates_date ON calendar_dates(date);
 
 CREATE INDEX idx_shapes_shape_id ON shapes(shape_id);
+CREATE INDEX idx_shape_levels_bbox ON shape_levels(tolerance, min_lat, max_lat);
 
 CREATE INDEX idx_fare_rules_route_id ON fare_rules(route_id);
 
@@ -230,6 +288,8 @@ COMMENT ON TABLE stop_times IS '车辆到达和离开站点的时间';
 COMMENT ON TABLE calendar IS '定期运营的服务模式';
 COMMENT ON TABLE calendar_dates IS '日历中定义服务的例外情况';
 COMMENT ON TABLE shapes IS '车辆行驶路径的地理轨迹';
+COMMENT ON TABLE shape_levels IS '预先计算的轨迹简化级别（tolerance 单位为米）';
 COMMENT ON TABLE fare_attributes IS '公交机构的票价信息';
 COMMENT ON TABLE fare_rules IS '票价应用规则';
 COMMENT ON TABLE feed_info IS '数据集元数据';
+COMMENT ON TABLE public.feed_imports IS 'GTFS 数据导入记录';
@@ -0,0 +1,261 @@
+"""
+站点和线路的搜索索引
+
+启动时把所有站点（stop_name、stop_code）和线路（route_short_name、route_long_name）
+加载到内存中的有序词表，前缀匹配通过二分查找完成，适合搜索框每次按键都发起的联想查询。
+内存索引没有足够结果时，再用 pg_trgm 三元组索引在数据库中做模糊匹配（容忍拼写错误）。
+
+排序规则（分数越小越靠前）:
+    0 - 编号或名称完全相同（如输入 "38" 匹配线路 38）
+    1 - 名称以输入开头
+    2 - 名称的第一个词以输入开头
+    3 - 名称中的其他词以输入开头，或编号以输入开头
+    4 - 数据库模糊匹配
+
+使用方法:
+    from search_index import search_index
+
+    search_index.refresh()                  # 从数据库加载（需要已初始化的 Database）
+    search_index.search('mark', limit=10)   # [{'type': 'stop', 'stop_name': 'Market St & 4th St', ...}, ...]
+"""
+
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+SEARCH_TYPES = ('stop', 'route')
+
+STOPS_QUERY = """
+    SELECT stop_id, stop_code, stop_name, stop_lat, stop_lon
+    FROM stops
+"""
+
+ROUTES_QUERY = """
+    SELECT route_id, route_short_name, route_long_name, route_type, route_color
+    FROM routes
+"""
+
+# 数据库模糊匹配，使用 schema.sql 中的 pg_trgm 索引（<% 为 word_similarity 运算符）
+FUZZY_STOPS_QUERY = """
+    SELECT stop_id, stop_code, stop_name, stop_lat, stop_lon,
+           word_similarity(%s, stop_name) AS similarity
+    FROM stops
+    WHERE %s <%% stop_name
+    ORDER BY similarity DESC, stop_name
+    LIMIT %s
+"""
+
+FUZZY_ROUTES_QUERY = """
+    SELECT route_id, route_short_name, route_long_name, route_type, route_color,
+           GREATEST(word_similarity(%s, COALESCE(route_short_name, '')),
+                    word_similarity(%s, COALESCE(route_long_name, ''))) AS similarity
+    FROM routes
+    WHERE %s <%% route_short_name OR %s <%% route_long_name
+    ORDER BY similarity DESC, route_short_name
+    LIMIT %s
+"""
+
+# 模糊匹配至少需要的字符数（更短的输入三元组太少，结果没有意义）
+FUZZY_MIN_LENGTH = 3
+
+EXACT, NAME_PREFIX, FIRST_WORD, OTHER_WORD, FUZZY = range(5)
+
+_WORD = re.compile(r'\w+')
+
+
+def normalize(text: Optional[str]) -> str:
+    """统一大小写并合并空白和标点"""
+    return ' '.join(_WORD.findall((text or '').casefold()))
+
+
+class _Entry:
+    """索引中的一个站点或线路"""
+
+    __slots__ = ('type', 'key', 'codes', 'names', 'words', 'data')
+
+    def __init__(self, kind: str, key: str, codes: Sequence[Optional[str]],
+                 names: Sequence[Optional[str]], data: Dict[str, Any]):
+        self.type = kind
+        self.key = key
+        self.codes = {normalize(code) for code in codes if code}
+        self.names = [normalize(name) for name in names if name]
+        self.words = [name.split() for name in self.names]
+        self.data = data
+
+    def score(self, query: str, query_words: List[str]) -> Optional[int]:
+        """计算匹配分数，不匹配时返回 None"""
+        if query in self.codes or query in self.names:
+            return EXACT
+        best = None
+        for name, words in zip(self.names, self.words):
+            if name.startswith(query):
+                return NAME_PREFIX
+            # 每个输入词都要是名称中某个词的前缀，"mark 4" 可以匹配 "Market St & 4th St"
+            if all(any(word.startswith(query_word) for word in words) for query_word in query_words):
+                score = FIRST_WORD if words and words[0].startswith(query_words[0]) else OTHER_WORD
+                best = score if best is None else min(best, score)
+        # 编号只有部分匹配时（如输入 "1" 匹配站点编号 "13001"）排在名称匹配之后
+        if best is None and any(code.startswith(query) for code in self.codes):
+            best = OTHER_WORD
+        return best
+
+    def sort_key(self) -> Tuple[int, str]:
+        name = self.names[0] if self.names else ''
+        return len(name), name
+
+
+class SearchIndex:
+    """线程安全的内存搜索索引，重建时先构造新索引再整体替换，查询不会被阻塞"""
+
+    def __init__(self, max_age: Optional[float] = None):
+        if max_age is None:
+            max_age = float(os.getenv('SEARCH_INDEX_MAX_AGE', 3600))
+        # 索引的最长使用时间（秒），超过后在后台重新加载，导入新数据后也可以直接调用 refresh()
+        self.max_age = max_age
+        # (有序词表 [(词, 条目序号)], 条目列表)，作为一个整体替换
+        self._index: Tuple[List[Tuple[str, int]], List[_Entry]] = ([], [])
+        self._built_at: Optional[float] = None
+        self._build_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._refreshing = False
+
+    @property
+    def ready(self) -> bool:
+        return self._built_at is not None
+
+    @property
+    def stale(self) -> bool:
+        return self._built_at is None or time.monotonic() - self._built_at > self.max_age
+
+    def build(self, stops: List[Dict[str, Any]], routes: List[Dict[str, Any]]):
+        """用 STOPS_QUERY 和 ROUTES_QUERY 的结果构建索引"""
+        entries = [
+            _Entry('stop', stop['stop_id'], [stop.get('stop_code')], [stop['stop_name']], dict(stop))
+            for stop in stops
+        ] + [
+            _Entry('route', route['route_id'], [route.get('route_short_name')],
+                   [route.get('route_long_name'), route.get('route_short_name')], dict(route))
+            for route in routes
+        ]
+
+        terms = set()
+        for index, entry in enumerate(entries):
+            for term in entry.codes:
+                terms.add((term, index))
+            for words in entry.words:
+                for word in words:
+                    terms.add((word, index))
+        # 词表和条目一起替换，查询线程看到的要么是旧索引要么是新索引
+        self._index = (sorted(terms), entries)
+        self._built_at = time.monotonic()
+
+    def refresh(self):
+        """从数据库重新加载索引"""
+        with self._build_lock:
+            try:
+                self._load()
+            finally:
+                self.release_refresh()
+
+    def ensure_ready(self):
+        """索引还没有构建时从数据库加载（并发调用时只加载一次）"""
+        with self._build_lock:
+            if not self.ready:
+                self._load()
+
+    def _load(self):
+        # 同步加载只用于 api.py；api_asgi.py 用 asyncpg 查询后直接调用 build()，不加载 psycopg2
+        from db import execute_query
+        self.build(execute_query(STOPS_QUERY), execute_query(ROUTES_QUERY))
+
+    def claim_refresh(self) -> bool:
+        """索引已过期且没有正在进行的重建时返回 True，调用方负责随后调用 refresh()"""
+        with self._state_lock:
+            if self._refreshing or not self.stale:
+                return False
+            self._refreshing = True
+            return True
+
+    def release_refresh(self):
+        """重建结束（无论成功与否），允许下一次 claim_refresh()"""
+        with self._state_lock:
+            self._refreshing = False
+
+    def search(self, text: str, types: Sequence[str] = SEARCH_TYPES, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        前缀搜索
+
+        Args:
+            text: 输入内容
+            types: 搜索的类型（stop、route）
+            limit: 最多返回的结果数
+
+        Returns:
+            按匹配程度排序的结果，每项包含 type、score 以及站点或线路的字段
+        """
+        query = normalize(text)
+        if not query:
+            return []
+        query_words = query.split()
+
+        terms, entries = self._index
+        # 用最长的输入词在词表中二分查找候选，再逐个检查是否所有输入词都匹配
+        probe = max(query_words, key=len)
+        candidates = set()
+        position = bisect_left(terms, (probe, -1))
+        while position < len(terms) and terms[position][0].startswith(probe):
+            candidates.add(terms[position][1])
+            position += 1
+
+        matches = []
+        for index in candidates:
+            entry = entries[index]
+            if entry.type not in types:
+                continue
+            score = entry.score(query, query_words)
+            if score is not None:
+                matches.append((score, entry.sort_key(), entry))
+
+        matches.sort(key=lambda match: (match[0], match[1]))
+        return [
+            {'type': entry.type, 'score': score, **entry.data}
+            for score, _, entry in matches[:limit]
+        ]
+
+
+def fuzzy_queries(text: str, types: Sequence[str], limit: int) -> List[Tuple[str, str, tuple]]:
+    """
+    生成数据库模糊匹配的查询，返回 [(类型, SQL, 参数)]，输入太短时返回空列表
+
+    内存索引的结果不足 limit 条时使用，结果用 merge_fuzzy 合并。
+    """
+    text = (text or '').strip()
+    if len(text) < FUZZY_MIN_LENGTH:
+        return []
+    queries = []
+    if 'stop' in types:
+        queries.append(('stop', FUZZY_STOPS_QUERY, (text, text, limit)))
+    if 'route' in types:
+        queries.append(('route', FUZZY_ROUTES_QUERY, (text, text, text, text, limit)))
+    return queries
+
+
+def merge_fuzzy(results: List[Dict[str, Any]], fuzzy: List[Tuple[str, List[Dict[str, Any]]]],
+                limit: int) -> List[Dict[str, Any]]:
+    """把数据库模糊匹配的结果追加到前缀搜索结果之后（去重，按相似度排序）"""
+    seen = {(item['type'], item[f"{item['type']}_id"]) for item in results}
+    extra = []
+    for kind, rows in fuzzy:
+        for row in rows:
+            if (kind, row[f"{kind}_id"]) in seen:
+                continue
+            similarity = row.pop('similarity', 0)
+            extra.append((-similarity, {'type': kind, 'score': FUZZY, **row}))
+    extra.sort(key=lambda item: item[0])
+    return (results + [item for _, item in extra])[:limit]
+
+
+search_index = SearchIndex()
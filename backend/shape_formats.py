@@ -0,0 +1,168 @@
+"""
+轨迹（shapes）接口的紧凑响应格式
+
+默认的 JSON 格式中每个点都是一个字典，重复 shape_id、shape_pt_sequence 等字段。
+可以通过 format 参数或 Accept 头选择更紧凑的格式:
+
+- json      application/json                  每个点一个字典（默认）
+- polyline  application/vnd.gtfs.polyline+json Google encoded polyline 字符串
+- columns   application/vnd.gtfs.columns+json  按列组织的 lat、lon、dist 数组
+- binary    application/octet-stream          长度前缀的 JSON 描述（每条轨迹的点数等），
+                                               之后是 float32 小端序的 lat, lon 交替排列，各轨迹依次拼接
+
+使用方法:
+    fmt = negotiate(request.args.get('format'), request.accept_mimetypes)
+    shape.update(encode_points(points, fmt))
+"""
+
+import json
+import struct
+import sys
+from array import array
+from typing import List, Dict, Any, Optional, Sequence
+
+SHAPE_FORMATS = {
+    'json': 'application/json',
+    'polyline': 'application/vnd.gtfs.polyline+json',
+    'columns': 'application/vnd.gtfs.columns+json',
+    'binary': 'application/octet-stream',
+}
+
+# encoded polyline 的坐标精度（小数位数），与 Google Maps 一致
+POLYLINE_PRECISION = 5
+
+# 二进制格式的描述长度前缀: uint32 小端序
+_PREAMBLE_LENGTH = struct.Struct('<I')
+
+
+def negotiate(format_param: Optional[str], accept=None) -> str:
+    """
+    确定响应格式: 优先使用 format 参数，否则根据 Accept 头选择，默认 json
+
+    Args:
+        format_param: format 查询参数
+        accept: request.accept_mimetypes（Flask 和 Quart 相同）
+
+    Raises:
+        ValueError: format 参数无效
+    """
+    if format_param:
+        if format_param not in SHAPE_FORMATS:
+            raise ValueError(f"format 参数必须是 {', '.join(SHAPE_FORMATS)} 之一")
+        return format_param
+    if accept is None:
+        return 'json'
+    # json 排在第一位，Accept 为 */* 或未指定时使用 json
+    media_type = accept.best_match(list(SHAPE_FORMATS.values()), default=SHAPE_FORMATS['json'])
+    return next(name for name, value in SHAPE_FORMATS.items() if value == media_type)
+
+
+def _encode_value(value: int, output: List[str]):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        output.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    output.append(chr(value + 63))
+
+
+def encode_polyline(points: Sequence[Dict[str, Any]], precision: int = POLYLINE_PRECISION,
+                    lat_key: str = 'shape_pt_lat', lon_key: str = 'shape_pt_lon') -> str:
+    """按 Google encoded polyline 算法编码点序列"""
+    factor = 10 ** precision
+    output: List[str] = []
+    last_lat = last_lon = 0
+    for point in points:
+        lat = int(round(point[lat_key] * factor))
+        lon = int(round(point[lon_key] * factor))
+        _encode_value(lat - last_lat, output)
+        _encode_value(lon - last_lon, output)
+        last_lat, last_lon = lat, lon
+    return ''.join(output)
+
+
+def encode_points(points: Sequence[Dict[str, Any]], fmt: str) -> Dict[str, Any]:
+    """
+    按 json、polyline 或 columns 格式编码一条轨迹的点
+
+    Returns:
+        json: {'points': [...]}
+        polyline: {'polyline': '...', 'point_count': n}
+        columns: {'lat': [...], 'lon': [...], 'dist': [...]}
+    """
+    if fmt == 'polyline':
+        return {'polyline': encode_polyline(points), 'point_count': len(points)}
+    if fmt == 'columns':
+        return {
+            'lat': [point['shape_pt_lat'] for point in points],
+            'lon': [point['shape_pt_lon'] for point in points],
+            'dist': [point.get('shape_dist_traveled') for point in points],
+        }
+    return {'points': list(points)}
+
+
+def encode_binary(shapes: Sequence[Dict[str, Any]]) -> bytes:
+    """
+    把多条轨迹编码为二进制格式
+
+    布局（小端序）:
+        uint32       描述的字节数 n（4 的倍数）
+        n 字节       UTF-8 JSON 数组，按顺序描述每条轨迹（shape_id、direction_id、part、point_count），
+                     末尾用空格补齐，使坐标从 4 字节对齐的位置开始
+        float32...   各轨迹的 lat, lon 交替排列，依次拼接
+
+    描述放在响应体内而不是响应头中，轨迹再多也不会超出服务器和代理的响应头长度限制；
+    前端读取描述后可以直接用 new Float32Array(body, 4 + n) 读取坐标。
+
+    Args:
+        shapes: [{'shape_id', 'points', ...}]，其余字段（direction_id、part）写入描述
+    """
+    values = array('f')
+    index = []
+    for shape in shapes:
+        points = shape['points']
+        for point in points:
+            values.append(point['shape_pt_lat'])
+            values.append(point['shape_pt_lon'])
+        entry = {key: value for key, value in shape.items() if key != 'points'}
+        entry['point_count'] = len(points)
+        index.append(entry)
+
+    preamble = json.dumps(index, separators=(',', ':'), default=str).encode('utf-8')
+    preamble += b' ' * (-len(preamble) % 4)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return _PREAMBLE_LENGTH.pack(len(preamble)) + preamble + values.tobytes()
+
+
+def decode_binary(body: bytes) -> List[Dict[str, Any]]:
+    """
+    解码 encode_binary 的结果（供 Python 客户端和测试使用）
+
+    Returns:
+        [{..., 'point_count', 'points': [(lat, lon), ...]}]，坐标为 float32 精度
+
+    Raises:
+        ValueError: 数据不完整
+    """
+    if len(body) < _PREAMBLE_LENGTH.size:
+        raise ValueError("binary shapes: missing preamble")
+    (length,) = _PREAMBLE_LENGTH.unpack_from(body)
+    start = _PREAMBLE_LENGTH.size + length
+    if len(body) < start or (len(body) - start) % 8:
+        raise ValueError("binary shapes: truncated body")
+    index = json.loads(body[_PREAMBLE_LENGTH.size:start].decode('utf-8'))
+
+    values = array('f')
+    values.frombytes(body[start:])
+    if sys.byteorder != 'little':
+        values.byteswap()
+    if sum(entry['point_count'] for entry in index) * 2 != len(values):
+        raise ValueError("binary shapes: point count does not match body")
+
+    shapes, offset = [], 0
+    for entry in index:
+        count = entry['point_count']
+        coords = values[offset:offset + count * 2]
+        shapes.append(dict(entry, points=list(zip(coords[0::2], coords[1::2]))))
+        offset += count * 2
+    return shapes
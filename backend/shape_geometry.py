@@ -0,0 +1,386 @@
+"""
+线路轨迹（shapes）的几何处理
+
+- 一次查询取出线路所有轨迹的点，并按 (shape_id, direction_id) 分组
+- 按矩形范围（bbox）裁剪，只保留范围内的点及其前后相邻点
+- Douglas-Peucker 简化，容差以米为单位
+- 导入后预先计算各简化级别（shape_levels 表），接口按 zoom 选择级别，tolerance 指定精确容差
+
+使用方法:
+    query, params = route_shapes_query('1', bbox=parse_bbox('-122.45,37.76,-122.40,37.80'))
+    shapes = group_route_shapes(execute_query(query, params), tolerance=5)
+
+    build_shape_levels(conn)            # 导入后生成 shape_levels（gtfs_importer.py 自动调用）
+    level = pick_level(zoom=13)         # 8.0，对应 shape_levels.tolerance
+    simplification(tolerance=20)        # (8.0, 20)：读取 8 米级别，再按 20 米简化
+"""
+
+import math
+import time
+from itertools import groupby
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+# 地球平均半径（米）
+EARTH_RADIUS = 6371008.8
+
+Bbox = Tuple[float, float, float, float]
+
+_SHAPE_COLUMNS = "s.shape_pt_lat, s.shape_pt_lon, s.shape_pt_sequence, s.shape_dist_traveled"
+
+# 返回给客户端的轨迹点字段
+POINT_FIELDS = ('shape_id', 'shape_pt_lat', 'shape_pt_lon', 'shape_pt_sequence', 'shape_dist_traveled')
+
+# 预先计算的简化级别（容差，米）。容差约等于对应缩放级别下一个像素的宽度时，简化前后在地图上看不出差别
+LEVEL_TOLERANCES: Tuple[float, ...] = (2.0, 8.0, 32.0, 128.0)
+
+# 256 像素瓦片在赤道上 0 级缩放时每像素的米数
+METERS_PER_PIXEL_Z0 = 156543.03392
+
+# shape_levels 中按点顺序保存的数组列，与 POINT_FIELDS 对应
+_LEVEL_ARRAYS = ('shape_pt_lat', 'shape_pt_lon', 'shape_pt_sequence', 'shape_dist_traveled')
+
+SHAPE_LEVEL_QUERY = f"""
+    SELECT shape_id, {', '.join(_LEVEL_ARRAYS)}
+    FROM shape_levels
+    WHERE shape_id = %s AND tolerance = %s
+"""
+
+
+def parse_bbox(value: Optional[str]) -> Optional[Bbox]:
+    """
+    解析 bbox 参数: "min_lon,min_lat,max_lon,max_lat"
+
+    Raises:
+        ValueError: 格式无效
+    """
+    if not value:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValueError("bbox 参数格式应为 min_lon,min_lat,max_lon,max_lat")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("bbox 参数的最小值不能大于最大值")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def _route_shapes_cte(route_id: str, direction_id: Optional[int]) -> Tuple[str, List[Any]]:
+    """线路使用的 (shape_id, direction_id)"""
+    params: List[Any] = [route_id]
+    direction_filter = ""
+    if direction_id is not None:
+        direction_filter = "AND t.direction_id = %s"
+        params.append(direction_id)
+
+    cte = f"""
+        WITH route_shapes AS (
+            SELECT DISTINCT t.shape_id, d.direction_id
+            FROM trips t
+            LEFT JOIN directions d ON t.route_id = d.route_id AND t.direction_id = d.direction_id
+            WHERE t.route_id = %s {direction_filter}
+        )
+    """
+    return cte, params
+
+
+def route_shapes_query(route_id: str, direction_id: Optional[int] = None,
+                       bbox: Optional[Bbox] = None) -> Tuple[str, tuple]:
+    """
+    生成一次取出线路所有轨迹点的查询，结果按 shape_id、direction_id、shape_pt_sequence 排序
+
+    指定 bbox 时只返回范围内的点及其前后相邻点（保证穿过边界的线段完整），
+    point_index 为点在整条轨迹中的序号，用于判断裁剪后的点是否连续。
+    """
+    route_shapes, params = _route_shapes_cte(route_id, direction_id)
+
+    if bbox is None:
+        query = f"""
+            {route_shapes}
+            SELECT rs.shape_id, rs.direction_id, {_SHAPE_COLUMNS}
+            FROM route_shapes rs
+            JOIN shapes s ON s.shape_id = rs.shape_id
+            ORDER BY rs.shape_id, rs.direction_id, s.shape_pt_sequence
+        """
+        return query, tuple(params)
+
+    min_lon, min_lat, max_lon, max_lat = bbox
+    query = f"""
+        {route_shapes}
+        SELECT shape_id, direction_id, shape_pt_lat, shape_pt_lon,
+               shape_pt_sequence, shape_dist_traveled, point_index
+        FROM (
+            SELECT rs.shape_id, rs.direction_id, {_SHAPE_COLUMNS},
+                   ROW_NUMBER() OVER w AS point_index,
+                   bool_or(s.shape_pt_lat BETWEEN %s AND %s AND s.shape_pt_lon BETWEEN %s AND %s)
+                       OVER (w ROWS BETWEEN 1 PRECEDING AND 1 FOLLOWING) AS visible
+            FROM route_shapes rs
+            JOIN shapes s ON s.shape_id = rs.shape_id
+            WINDOW w AS (PARTITION BY rs.shape_id, rs.direction_id ORDER BY s.shape_pt_sequence)
+        ) p
+        WHERE visible
+        ORDER BY shape_id, direction_id, shape_pt_sequence
+    """
+    params.extend([min_lat, max_lat, min_lon, max_lon])
+    return query, tuple(params)
+
+
+def route_shape_levels_query(route_id: str, level: float,
+                             direction_id: Optional[int] = None) -> Tuple[str, tuple]:
+    """生成读取线路所有轨迹某一简化级别的查询，每条轨迹一行，点保存在数组中"""
+    route_shapes, params = _route_shapes_cte(route_id, direction_id)
+    params.append(level)
+
+    query = f"""
+        {route_shapes}
+        SELECT rs.shape_id, rs.direction_id, {', '.join('sl.' + column for column in _LEVEL_ARRAYS)}
+        FROM route_shapes rs
+        JOIN shape_levels sl ON sl.shape_id = rs.shape_id AND sl.tolerance = %s
+        ORDER BY rs.shape_id, rs.direction_id
+    """
+    return query, tuple(params)
+
+
+def zoom_tolerance(zoom: float) -> float:
+    """缩放级别下一个像素对应的米数（按赤道计算，高纬度地区偏大，选出的级别更保守）"""
+    return METERS_PER_PIXEL_Z0 / 2 ** zoom
+
+
+def pick_level(tolerance: Optional[float] = None, zoom: Optional[float] = None) -> Optional[float]:
+    """
+    根据容差或缩放级别选择预先计算的简化级别
+
+    Returns:
+        不超过所需容差的最大级别；不需要简化或没有合适级别时返回 None（使用原始轨迹）
+    """
+    if tolerance is None and zoom is not None:
+        tolerance = zoom_tolerance(zoom)
+    if tolerance is None:
+        return None
+    levels = [level for level in LEVEL_TOLERANCES if level <= tolerance]
+    return max(levels) if levels else None
+
+
+def simplification(tolerance: Optional[float] = None,
+                   zoom: Optional[float] = None) -> Tuple[Optional[float], float]:
+    """
+    轨迹接口的简化参数，返回 (预计算级别, 读取级别后再做 Douglas-Peucker 简化的容差)
+
+    zoom 选择与该缩放级别像素大小相当的预计算级别；显式给出 tolerance（米）时忽略 zoom，
+    从不超过 tolerance 的最大级别（没有时为原始轨迹）出发，再按 tolerance 简化。
+    """
+    level = pick_level(tolerance, zoom)
+    if tolerance is None or tolerance <= (level or 0):
+        return level, 0.0
+    return level, tolerance
+
+
+def level_points(row: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """把 shape_levels 中的数组还原为与 shapes 表相同字段的点"""
+    return [
+        {'shape_id': row['shape_id'], 'shape_pt_lat': lat, 'shape_pt_lon': lon,
+         'shape_pt_sequence': sequence, 'shape_dist_traveled': dist}
+        for lat, lon, sequence, dist in zip(*(row[column] for column in _LEVEL_ARRAYS))
+    ]
+
+
+def clip_points(points: Sequence[Dict[str, Any]], bbox: Bbox) -> List[List[Dict[str, Any]]]:
+    """
+    在内存中按 bbox 裁剪，规则与 route_shapes_query 相同: 保留范围内的点及其前后相邻点，
+    不连续的部分拆成多段
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    inside = [min_lat <= point['shape_pt_lat'] <= max_lat and min_lon <= point['shape_pt_lon'] <= max_lon
+              for point in points]
+    parts: List[List[Dict[str, Any]]] = []
+    last = None
+    for index, point in enumerate(points):
+        if not any(inside[max(index - 1, 0):index + 2]):
+            continue
+        if last is None or index != last + 1:
+            parts.append([])
+        parts[-1].append(point)
+        last = index
+    return parts
+
+
+def group_level_shapes(rows: List[Dict[str, Any]], bbox: Optional[Bbox] = None,
+                       tolerance: float = 0) -> List[Dict[str, Any]]:
+    """把 route_shape_levels_query 的结果转换为与 group_route_shapes 相同的结构"""
+    shapes = []
+    for row in rows:
+        key = (row['shape_id'], row['direction_id'])
+        points = level_points(row)
+        if bbox is None:
+            shapes.append(dict(_new_shape(key, None), points=points))
+            continue
+        for part, part_points in enumerate(clip_points(points, bbox)):
+            shapes.append(dict(_new_shape(key, part), points=part_points))
+
+    if tolerance > 0:
+        for shape in shapes:
+            shape['points'] = simplify(shape['points'], tolerance)
+    return shapes
+
+
+def build_shape_levels(conn, tolerances: Sequence[float] = LEVEL_TOLERANCES, batch_size: int = 500,
+                       shape_ids: Optional[Sequence[str]] = None) -> int:
+    """
+    为每条轨迹预先计算各简化级别并写入 shape_levels 表（先删除旧的级别），由调用方提交事务
+
+    轨迹点通过服务端游标按 shape_id 顺序流式读取，内存中只保留一条轨迹。
+
+    Args:
+        conn: psycopg2 连接（使用当前 search_path 中的 shapes 和 shape_levels 表）
+        tolerances: 简化容差（米）
+        shape_ids: 只重新生成这些轨迹（增量导入），None 表示全部
+
+    Returns:
+        写入的行数
+    """
+    from psycopg2.extras import execute_values
+
+    start = time.perf_counter()
+    insert_query = """
+        INSERT INTO shape_levels (shape_id, tolerance, point_count, shape_pt_lat, shape_pt_lon,
+                                  shape_pt_sequence, shape_dist_traveled,
+                                  min_lat, min_lon, max_lat, max_lon)
+        VALUES %s
+    """
+    template = "(%s, %s, %s, %s::float8[], %s::float8[], %s::integer[], %s::float8[], %s, %s, %s, %s)"
+
+    if shape_ids is not None and not shape_ids:
+        return 0
+    where_sql, params = ("WHERE shape_id = ANY(%s)", (list(shape_ids),)) if shape_ids is not None else ("", ())
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM shape_levels {where_sql}", params)
+
+    written = 0
+    batch: List[tuple] = []
+    with conn.cursor(name='shape_levels_source') as source, conn.cursor() as cursor:
+        source.itersize = 20000
+        # 服务端游标在第一次读取之前 description 为 None，因此使用固定的列名
+        columns = ('shape_id',) + _LEVEL_ARRAYS
+        source.execute(f"""
+            SELECT {', '.join(columns)}
+            FROM shapes
+            {where_sql}
+            ORDER BY shape_id, shape_pt_sequence
+        """, params)
+        rows = (dict(zip(columns, row)) for row in source)
+
+        for shape_id, points in groupby(rows, key=lambda row: row['shape_id']):
+            points = list(points)
+            lats = [point['shape_pt_lat'] for point in points]
+            lons = [point['shape_pt_lon'] for point in points]
+            # 外包矩形用于按地图范围（矢量瓦片）查找轨迹
+            bounds = (min(lats), min(lons), max(lats), max(lons))
+            for tolerance in tolerances:
+                kept = simplify(points, tolerance)
+                batch.append((shape_id, tolerance, len(kept),
+                              *([point[column] for point in kept] for column in _LEVEL_ARRAYS), *bounds))
+            if len(batch) >= batch_size:
+                execute_values(cursor, insert_query, batch, template=template)
+                written += len(batch)
+                batch = []
+
+        if batch:
+            execute_values(cursor, insert_query, batch, template=template)
+            written += len(batch)
+
+    print(f"Built {written:,} shape simplification levels in {time.perf_counter() - start:.2f}s")
+    return written
+
+
+def simplify(points: Sequence[Dict[str, Any]], tolerance: float,
+             lat_key: str = 'shape_pt_lat', lon_key: str = 'shape_pt_lon') -> List[Dict[str, Any]]:
+    """
+    Douglas-Peucker 简化
+
+    Args:
+        points: 按顺序排列的点
+        tolerance: 容差（米），偏离简化后折线不超过该距离的点被去掉
+
+    Returns:
+        保留的点（始终包含首尾两点）
+    """
+    if tolerance <= 0 or len(points) < 3:
+        return list(points)
+
+    # 在轨迹中心纬度上做等距投影，城市范围内误差可以忽略
+    lat0 = math.radians(sum(point[lat_key] for point in points) / len(points))
+    scale_x = EARTH_RADIUS * math.cos(lat0) * math.pi / 180
+    scale_y = EARTH_RADIUS * math.pi / 180
+    xy = [(point[lon_key] * scale_x, point[lat_key] * scale_y) for point in points]
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    # 用栈代替递归，长轨迹不会超过递归深度
+    stack = [(0, len(points) - 1)]
+    tolerance_sq = tolerance * tolerance
+    while stack:
+        start, end = stack.pop()
+        (x1, y1), (x2, y2) = xy[start], xy[end]
+        dx, dy = x2 - x1, y2 - y1
+        length_sq = dx * dx + dy * dy
+
+        farthest, max_distance_sq = None, tolerance_sq
+        for index in range(start + 1, end):
+            px, py = xy[index]
+            if length_sq == 0:
+                distance_sq = (px - x1) ** 2 + (py - y1) ** 2
+            else:
+                # 到线段（而不是直线）的距离
+                t = max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / length_sq))
+                distance_sq = (px - x1 - t * dx) ** 2 + (py - y1 - t * dy) ** 2
+            if distance_sq > max_distance_sq:
+                farthest, max_distance_sq = index, distance_sq
+
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((start, farthest))
+            stack.append((farthest, end))
+
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def group_route_shapes(rows: List[Dict[str, Any]], tolerance: float = 0) -> List[Dict[str, Any]]:
+    """
+    把 route_shapes_query 的结果按轨迹分组
+
+    bbox 裁剪后不连续的部分拆成多段，每段单独一项（part 为段序号），避免地图上画出跨越范围外的直线。
+
+    Args:
+        rows: route_shapes_query 的查询结果
+        tolerance: Douglas-Peucker 简化容差（米），0 表示不简化
+
+    Returns:
+        [{'shape_id', 'direction_id', 'points'}]，裁剪时另有 'part'
+    """
+    shapes: List[Dict[str, Any]] = []
+    clipped = bool(rows) and 'point_index' in rows[0]
+    current_key, current_part, last_index = None, 0, None
+
+    for row in rows:
+        key = (row['shape_id'], row['direction_id'])
+        point_index = row.get('point_index')
+        if key != current_key:
+            current_key, current_part = key, 0
+            shapes.append(_new_shape(key, 0 if clipped else None))
+        elif clipped and point_index != last_index + 1:
+            current_part += 1
+            shapes.append(_new_shape(key, current_part))
+        last_index = point_index
+        shapes[-1]['points'].append({field: row[field] for field in POINT_FIELDS})
+
+    if tolerance > 0:
+        for shape in shapes:
+            shape['points'] = simplify(shape['points'], tolerance)
+    return shapes
+
+
+def _new_shape(key: Tuple[str, Optional[int]], part: Optional[int]) -> Dict[str, Any]:
+    shape = {'shape_id': key[0], 'direction_id': key[1], 'points': []}
+    if part is not None:
+        shape['part'] = part
+    return shape
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+db_common.py 的单元测试（不需要数据库和 psycopg2）
+
+运行方式:
+    python -m pytest test_db_common.py
+"""
+
+import pytest
+
+from db_common import _numbered_placeholders
+from search_index import FUZZY_ROUTES_QUERY
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('SELECT 1', 'SELECT 1'),
+    ('SELECT * FROM stops WHERE stop_id = %s', 'SELECT * FROM stops WHERE stop_id = $1'),
+    ('a = %s AND b = %s OR c IN (%s, %s)', 'a = $1 AND b = $2 OR c IN ($3, $4)'),
+    # %% 是转义的百分号，不占用编号
+    ("name LIKE 'x%%' AND id = %s", "name LIKE 'x%' AND id = $1"),
+    ('%s <%% name AND %%s', '$1 <% name AND %s'),
+])
+def test_numbered_placeholders(query, expected):
+    assert _numbered_placeholders(query) == expected
+
+
+def test_numbered_placeholders_restart_per_query():
+    assert _numbered_placeholders('%s') == _numbered_placeholders('%s') == '$1'
+
+
+def test_numbered_placeholders_on_real_query():
+    converted = _numbered_placeholders(FUZZY_ROUTES_QUERY)
+    assert '%s' not in converted and '%%' not in converted
+    assert [f'${n}' in converted for n in range(1, 6)] == [True] * 5
+    assert '$6' not in converted
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+gtfs_parser.py 的单元测试（不需要数据库）
+
+运行方式:
+    python -m pytest test_gtfs_parser.py
+"""
+
+import io
+import math
+from array import array
+from datetime import date
+
+import pytest
+
+from gtfs_parser import (FLOAT, INT, TIME, DATE, TEXT, parse_time, format_time, parse_date, convert_column,
+                         iter_column_batches, read_columns)
+
+
+@pytest.mark.parametrize('value, seconds', [('00:00:00', 0), ('8:05:09', 29109), (' 08:05:09 ', 29109),
+                                            ('25:10:00', 90600), ('', None), ('  ', None)])
+def test_parse_time(value, seconds):
+    assert parse_time(value) == seconds
+
+
+def test_format_time_round_trip():
+    for seconds in (0, 29109, 90600, 48 * 3600 + 1):
+        assert parse_time(format_time(seconds)) == seconds
+    assert format_time(90600) == '25:10:00'
+
+
+def test_parse_date():
+    assert parse_date('20251120') == date(2025, 11, 20)
+    assert parse_date(' 20251120\t') == date(2025, 11, 20)
+    assert parse_date(' ') is None
+    with pytest.raises(ValueError):
+        parse_date('20251320')
+
+
+def test_convert_float_column():
+    values = convert_column(['37.5', '', ' -122.25 ', '  '], FLOAT)
+    assert isinstance(values, array) and values.typecode == 'd'
+    assert values[0] == 37.5 and values[2] == -122.25
+    assert math.isnan(values[1]) and math.isnan(values[3])
+
+
+@pytest.mark.parametrize('column_type, values, expected', [
+    (INT, ['3', '', ' 1 ', ' '], [3, None, 1, None]),
+    (TIME, ['07:30:00', '', ' 24:00:01', '\t'], [27000, None, 86401, None]),
+    (DATE, ['20250101', ' ', '20251231 '], [date(2025, 1, 1), None, date(2025, 12, 31)]),
+    # 文本列不去掉空白，只把空字符串转换为 None
+    (TEXT, ['Market St ', '', ' '], ['Market St ', None, ' ']),
+])
+def test_convert_column_blank_values(column_type, values, expected):
+    assert convert_column(values, column_type) == expected
+
+
+def test_convert_column_rejects_invalid_numbers():
+    with pytest.raises(ValueError):
+        convert_column(['1.5'], INT)
+    with pytest.raises(ValueError):
+        convert_column(['abc'], FLOAT)
+
+
+CSV = (
+    'stop_id,stop_name,stop_lat,stop_lon,location_type\n'
+    'S1,Market St,37.79,-122.39,0\n'
+    '\n'
+    'S2,Mission St, ,-122.40\n'
+    'S3,Geary Blvd,37.78,-122.44, \n'
+)
+
+
+def test_iter_column_batches_types_and_padding():
+    batches = list(iter_column_batches(io.StringIO(CSV), batch_size=2))
+    # 空行被跳过，三行数据分为两批
+    assert [len(batch) for batch in batches] == [2, 1]
+    first = batches[0]
+    assert first.names == ['stop_id', 'stop_name', 'stop_lat', 'stop_lon', 'location_type']
+    assert first.types['stop_lat'] == FLOAT and first.types['stop_name'] == TEXT
+    assert first['location_type'] == [0, None]
+    # 浮点列的 NaN 在按行输出时还原为 None
+    assert list(first.rows()) == [('S1', 'Market St', 37.79, -122.39, 0),
+                                  ('S2', 'Mission St', None, -122.40, None)]
+    assert list(batches[1].rows()) == [('S3', 'Geary Blvd', 37.78, -122.44, None)]
+
+
+def test_iter_column_batches_custom_types_and_empty_file():
+    [batch] = iter_column_batches(io.StringIO('a,b\n1,2\n'), column_types={'a': INT})
+    assert batch['a'] == [1] and batch['b'] == ['2']
+    assert list(iter_column_batches(io.StringIO(''))) == []
+
+
+def test_read_columns_merges_batches(tmp_path):
+    path = tmp_path / 'stops.txt'
+    # 带 BOM 的文件（read_columns 使用 utf-8-sig 打开）
+    path.write_text('\ufeff' + CSV, encoding='utf-8')
+    batch = read_columns(path)
+    assert batch['stop_id'] == ['S1', 'S2', 'S3']
+    assert 'stop_lat' in batch and len(batch) == 3
+    assert list(batch['stop_lon']) == [-122.39, -122.40, -122.44]
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+http_cache.py 的单元测试（不需要数据库）
+
+运行方式:
+    python -m pytest test_http_cache.py
+"""
+
+import pytest
+
+from http_cache import CACHE_MAX_AGE, make_etag, etag_matches, cache_headers
+
+ETAG = make_etag('v1', '/api/routes?page=1')
+
+
+def test_make_etag_is_stable_quoted_and_varies():
+    assert ETAG == make_etag('v1', '/api/routes?page=1')
+    assert ETAG.startswith('"') and ETAG.endswith('"')
+    assert ETAG != make_etag('v2', '/api/routes?page=1')
+    assert ETAG != make_etag('v1', '/api/routes?page=2')
+    assert make_etag('v1', '/api/shapes/s1', ['application/json']) != \
+        make_etag('v1', '/api/shapes/s1', ['application/octet-stream'])
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, False),
+    ('', False),
+    (ETAG, True),
+    ('*', True),
+    (f'W/{ETAG}', True),                                  # 弱比较
+    (f'"other", {ETAG}', True),
+    (f'"other",W/{ETAG} ', True),
+    ('"other"', False),
+    (ETAG.strip('"'), False),                             # 没有引号的值不是合法的 ETag
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(header, ETAG) is expected
+
+
+def test_cache_headers():
+    assert cache_headers(ETAG) == {'ETag': ETAG, 'Cache-Control': f'public, max-age={CACHE_MAX_AGE}'}
+    assert cache_headers(ETAG, ['Accept', 'Accept-Encoding'])['Vary'] == 'Accept, Accept-Encoding'
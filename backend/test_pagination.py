@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+pagination.py 和 api_common.py 分页参数的单元测试（不需要数据库）
+
+运行方式:
+    python -m pytest test_pagination.py
+"""
+
+import pytest
+
+from pagination import (NEXT, PREV, CursorError, KeysetPage, encode_cursor, decode_cursor,
+                        count_query, estimated_rows, nulls_last)
+from api_common import MAX_PAGE_SIZE, pagination_args, offset_query, offset_pagination, routes_list
+
+
+class Args(dict):
+    """模拟 request.args（werkzeug MultiDict 的 get(key, default, type)）"""
+
+    def get(self, key, default=None, type=None):
+        if key not in self:
+            return default
+        try:
+            return type(self[key]) if type else self[key]
+        except ValueError:
+            return default
+
+
+@pytest.mark.parametrize('values', [
+    ['Market St', 'S1'],
+    ['', None],
+    [42, 'trip-ü/é', 3.5],
+])
+def test_cursor_round_trip(values):
+    for direction in (NEXT, PREV):
+        token = encode_cursor(values, direction)
+        assert '=' not in token and '+' not in token and '/' not in token
+        assert decode_cursor(token, len(values)) == (values, direction)
+
+
+@pytest.mark.parametrize('token', ['not base64!', 'e30', encode_cursor(['a'], 'sideways'), encode_cursor(['a'], NEXT)])
+def test_invalid_cursor(token):
+    # e30 是 "{}"；最后一个的排序键数量与两个键不符
+    with pytest.raises(CursorError):
+        decode_cursor(token, 2)
+
+
+def test_cursor_error_is_value_error():
+    # 接口把 ValueError 统一转换为 400
+    assert issubclass(CursorError, ValueError)
+
+
+def test_keyset_first_page():
+    page = KeysetPage(['stop_name', 'stop_id'], page_size=2)
+    query, params = page.query('stop_id, stop_name', 'FROM stops', '1=1', [])
+    assert 'ORDER BY stop_name, stop_id' in query
+    assert '>' not in query
+    assert params == [3]
+
+    rows = [{'stop_id': str(i), 'stop_name': name, '_page_key_0': name, '_page_key_1': str(i)}
+            for i, name in enumerate(['A', 'B', 'C'])]
+    result, info = page.result(rows)
+    assert result == [{'stop_id': '0', 'stop_name': 'A'}, {'stop_id': '1', 'stop_name': 'B'}]
+    assert info['prev_cursor'] is None
+    assert decode_cursor(info['next_cursor'], 2) == (['B', '1'], NEXT)
+
+
+def test_keyset_next_and_prev_pages():
+    page = KeysetPage(['stop_name', 'stop_id'], 2, encode_cursor(['B', '1'], NEXT))
+    query, params = page.query('stop_id', 'FROM stops', 'zone_id = %s', ['z1'])
+    assert '(stop_name, stop_id) > (%s, %s)' in query
+    assert params == ['z1', 'B', '1', 3]
+
+    # 最后一页: 没有多读到的行，只有 prev_cursor
+    rows, info = page.result([{'stop_id': '2', '_page_key_0': 'C', '_page_key_1': '2'}])
+    assert rows == [{'stop_id': '2'}]
+    assert info['next_cursor'] is None
+    assert decode_cursor(info['prev_cursor'], 2) == (['C', '2'], PREV)
+
+    back = KeysetPage(['stop_name', 'stop_id'], 2, info['prev_cursor'])
+    query, params = back.query('stop_id', 'FROM stops', '1=1', [])
+    assert '(stop_name, stop_id) < (%s, %s)' in query
+    assert 'ORDER BY stop_name DESC, stop_id DESC' in query
+    # 倒序读取的结果返回前恢复正序
+    rows, info = back.result([{'stop_id': '1', '_page_key_0': 'B', '_page_key_1': '1'},
+                              {'stop_id': '0', '_page_key_0': 'A', '_page_key_1': '0'}])
+    assert [row['stop_id'] for row in rows] == ['0', '1']
+    assert info['prev_cursor'] is None
+    assert decode_cursor(info['next_cursor'], 2) == (['B', '1'], NEXT)
+
+
+def test_count_query_and_estimate():
+    assert count_query('exact', 'FROM trips', 'route_id = %s') == 'SELECT COUNT(*) FROM trips WHERE route_id = %s'
+    assert count_query('estimate', 'FROM trips', '1=1').startswith('EXPLAIN (FORMAT JSON)')
+    assert count_query('none', 'FROM trips', '1=1') is None
+
+    plan = [{'Plan': {'Plan Rows': 1234}}]
+    assert estimated_rows({'QUERY PLAN': plan}) == 1234
+    # asyncpg 返回 JSON 字符串
+    assert estimated_rows({'QUERY PLAN': '[{"Plan": {"Plan Rows": 56}}]'}) == 56
+    assert estimated_rows(None) is None
+
+
+def test_pagination_args_defaults():
+    assert pagination_args(Args()) == {
+        'keyset': False, 'cursor': None, 'page': 1, 'page_size': 20, 'count': 'exact',
+    }
+    options = pagination_args(Args(cursor=''))
+    assert options['keyset'] and options['count'] == 'estimate'
+
+
+@pytest.mark.parametrize('page_size, expected', [('0', 1), ('-5', 1), ('50', 50), (str(MAX_PAGE_SIZE + 1), MAX_PAGE_SIZE)])
+def test_pagination_args_clamps_page_size(page_size, expected):
+    assert pagination_args(Args(page_size=page_size))['page_size'] == expected
+
+
+def test_pagination_args_clamps_page_and_rejects_count():
+    assert pagination_args(Args(page='-2'))['page'] == 1
+    with pytest.raises(ValueError):
+        pagination_args(Args(count='all'))
+
+
+def test_offset_query_and_pagination():
+    query, params = offset_query('trip_id', 'FROM trips', 'route_id = %s', ['1'], 'trip_id', page=3, page_size=20)
+    assert 'ORDER BY trip_id' in query and query.rstrip().endswith('LIMIT %s OFFSET %s')
+    assert params == ('1', 20, 40)
+    assert offset_pagination(3, 20, 41) == {'page': 3, 'page_size': 20, 'total_pages': 3}
+    assert offset_pagination(1, 20, None)['total_pages'] is None
+
+
+def test_routes_sort_order_matches_keyset_keys():
+    # OFFSET 分页和键集分页按相同的键排序（对应 schema.sql 中的 idx_routes_name）
+    plan = routes_list(Args(search='38'))
+    assert plan['order_by'] == ', '.join(plan['keys'])
+    assert plan['keys'][-1] == 'r.route_id'
+    assert plan['params'] == ['%38%', '%38%']
+
+
+def test_nulls_last_keys_sort_like_order_by_nulls_last():
+    assert nulls_last('r.route_short_name') == ['(r.route_short_name IS NULL)', "COALESCE(r.route_short_name, '')"]
+    # 在 Python 中模拟两个键的排序: NULL 排在最后，空字符串仍在非空名称之前
+    names = ['38', None, '', '1', None]
+    ordered = sorted(names, key=lambda name: (name is None, name or ''))
+    assert ordered == ['', '1', '38', None, None]
+
+
+def test_routes_keys_keep_null_names_last():
+    keys = routes_list(Args())['keys']
+    assert keys == ['(r.route_short_name IS NULL)', "COALESCE(r.route_short_name, '')",
+                    '(r.route_long_name IS NULL)', "COALESCE(r.route_long_name, '')", 'r.route_id']
+    query, params = KeysetPage(keys, 20, encode_cursor([False, '38', True, '', 'R38'], NEXT)).query(
+        'r.route_id', 'FROM routes r', '1=1', [])
+    assert f"({', '.join(keys)}) > (%s, %s, %s, %s, %s)" in query
+    assert params == [False, '38', True, '', 'R38', 21]
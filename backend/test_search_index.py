@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+search_index.py 的单元测试（不需要数据库）
+
+运行方式:
+    python -m pytest test_search_index.py
+"""
+
+import pytest
+
+from search_index import (EXACT, NAME_PREFIX, FIRST_WORD, OTHER_WORD, FUZZY, FUZZY_MIN_LENGTH,
+                          SearchIndex, normalize, fuzzy_queries, merge_fuzzy)
+
+STOPS = [
+    {'stop_id': 'S1', 'stop_code': '13001', 'stop_name': 'Market St & 4th St', 'stop_lat': 37.78, 'stop_lon': -122.40},
+    {'stop_id': 'S2', 'stop_code': '13002', 'stop_name': 'Mission St & 4th St', 'stop_lat': 37.78, 'stop_lon': -122.40},
+    {'stop_id': 'S3', 'stop_code': None, 'stop_name': 'Geary Blvd & Masonic Ave', 'stop_lat': 37.78, 'stop_lon': -122.44},
+    {'stop_id': 'S4', 'stop_code': '38', 'stop_name': 'Van Ness Ave', 'stop_lat': 37.78, 'stop_lon': -122.42},
+]
+
+ROUTES = [
+    {'route_id': 'R38', 'route_short_name': '38', 'route_long_name': 'Geary', 'route_type': 3, 'route_color': 'FF0000'},
+    {'route_id': 'R38R', 'route_short_name': '38R', 'route_long_name': 'Geary Rapid', 'route_type': 3, 'route_color': None},
+    {'route_id': 'RM', 'route_short_name': None, 'route_long_name': 'Market Street Railway', 'route_type': 0,
+     'route_color': None},
+]
+
+
+@pytest.fixture
+def index():
+    search_index = SearchIndex(max_age=60)
+    search_index.build(STOPS, ROUTES)
+    return search_index
+
+
+def _ids(results):
+    return [(item['type'], item.get('stop_id') or item.get('route_id'), item['score']) for item in results]
+
+
+def test_normalize():
+    assert normalize('  Market   St & 4th-St ') == 'market st 4th st'
+    assert normalize('STRASSE Straße') == 'strasse strasse'
+    assert normalize(None) == ''
+
+
+def test_exact_code_ranks_first(index):
+    # 线路 38 和站点编号 38 完全相同，其次是以 38 开头的线路 38R
+    assert _ids(index.search('38')) == [('route', 'R38', EXACT), ('stop', 'S4', EXACT), ('route', 'R38R', NAME_PREFIX)]
+
+
+def test_prefix_then_first_word_then_other_word(index):
+    assert _ids(index.search('mar')) == [('stop', 'S1', NAME_PREFIX), ('route', 'RM', NAME_PREFIX)]
+    assert _ids(index.search('geary')) == [('route', 'R38', EXACT), ('route', 'R38R', NAME_PREFIX),
+                                           ('stop', 'S3', NAME_PREFIX)]
+    assert _ids(index.search('masonic')) == [('stop', 'S3', OTHER_WORD)]
+
+
+def test_all_query_words_must_match(index):
+    # 每个输入词都要是某个词的前缀，不要求顺序
+    assert _ids(index.search('4th mark')) == [('stop', 'S1', OTHER_WORD)]
+    assert _ids(index.search('mission 4')) == [('stop', 'S2', FIRST_WORD)]
+    assert index.search('market 5th') == []
+
+
+def test_partial_code_after_names(index):
+    assert _ids(index.search('1300')) == [('stop', 'S1', OTHER_WORD), ('stop', 'S2', OTHER_WORD)]
+
+
+def test_types_and_limit(index):
+    assert [item['type'] for item in index.search('38', types=('stop',))] == ['stop']
+    assert len(index.search('st', limit=1)) == 1
+    assert index.search('  & ') == []
+
+
+def test_results_include_row_fields(index):
+    [result] = index.search('van ness')
+    assert result == {'type': 'stop', 'score': NAME_PREFIX, **STOPS[3]}
+
+
+def test_build_replaces_index_and_marks_ready():
+    search_index = SearchIndex(max_age=60)
+    assert not search_index.ready and search_index.stale
+    search_index.build(STOPS, [])
+    assert search_index.ready and not search_index.stale
+    assert search_index.search('geary', types=('route',)) == []
+    search_index.build([], ROUTES)
+    assert _ids(search_index.search('market')) == [('route', 'RM', NAME_PREFIX)]
+
+
+def test_claim_refresh_once():
+    search_index = SearchIndex(max_age=60)
+    assert search_index.claim_refresh()
+    assert not search_index.claim_refresh()
+    search_index.release_refresh()
+    assert search_index.claim_refresh()
+
+
+def test_fuzzy_queries():
+    assert fuzzy_queries('x' * (FUZZY_MIN_LENGTH - 1), ('stop', 'route'), 10) == []
+    queries = fuzzy_queries(' mrket ', ('route',), 5)
+    assert [(kind, params) for kind, _, params in queries] == [('route', ('mrket',) * 4 + (5,))]
+    for _, query, params in fuzzy_queries('mrket', ('stop', 'route'), 5):
+        assert query.count('%s') == len(params)
+
+
+def test_merge_fuzzy_deduplicates_and_orders_by_similarity():
+    results = [{'type': 'stop', 'stop_id': 'S1', 'score': NAME_PREFIX}]
+    fuzzy = [
+        ('stop', [{'stop_id': 'S1', 'similarity': 0.9}, {'stop_id': 'S2', 'similarity': 0.4}]),
+        ('route', [{'route_id': 'RM', 'similarity': 0.7}]),
+    ]
+    merged = merge_fuzzy(results, fuzzy, limit=3)
+    assert merged == [
+        {'type': 'stop', 'stop_id': 'S1', 'score': NAME_PREFIX},
+        {'type': 'route', 'score': FUZZY, 'route_id': 'RM'},
+        {'type': 'stop', 'score': FUZZY, 'stop_id': 'S2'},
+    ]
+    assert len(merge_fuzzy(results, fuzzy, limit=2)) == 2
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+shape_formats.py 的单元测试（不需要数据库）
+
+运行方式:
+    python -m pytest test_shape_formats.py
+"""
+
+import json
+import struct
+
+import pytest
+
+from shape_formats import (SHAPE_FORMATS, negotiate, encode_polyline, encode_points,
+                           encode_binary, decode_binary)
+
+
+def _points(coords):
+    return [{'shape_id': 's1', 'shape_pt_lat': lat, 'shape_pt_lon': lon,
+             'shape_pt_sequence': index + 1, 'shape_dist_traveled': float(index)}
+            for index, (lat, lon) in enumerate(coords)]
+
+
+def _decode_polyline(text, precision=5):
+    """参照 Google 算法的解码，用于往返测试"""
+    coords, index, lat, lon = [], 0, 0, 0
+    while index < len(text):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(text[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coords.append((lat / 10 ** precision, lon / 10 ** precision))
+    return coords
+
+
+SAMPLE = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+
+def test_polyline_matches_reference_example():
+    # Google encoded polyline 文档中的示例
+    assert encode_polyline(_points(SAMPLE)) == '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+
+
+def test_polyline_round_trip():
+    coords = [(37.79539, -122.39699), (37.79545, -122.39705), (37.7, -122.5), (37.7, -122.5), (-33.86, 151.21)]
+    decoded = _decode_polyline(encode_polyline(_points(coords)))
+    assert len(decoded) == len(coords)
+    for (lat, lon), expected in zip(decoded, coords):
+        assert (lat, lon) == pytest.approx(expected, abs=1e-5)
+
+
+def test_polyline_empty():
+    assert encode_polyline([]) == ''
+
+
+def test_encode_points_formats():
+    points = _points(SAMPLE)
+    assert encode_points(points, 'polyline') == {'polyline': '_p~iF~ps|U_ulLnnqC_mqNvxq`@', 'point_count': 3}
+    columns = encode_points(points, 'columns')
+    assert columns['lat'] == [38.5, 40.7, 43.252]
+    assert columns['lon'] == [-120.2, -120.95, -126.453]
+    assert columns['dist'] == [0.0, 1.0, 2.0]
+    assert encode_points(points, 'json') == {'points': points}
+
+
+def test_binary_round_trip():
+    shapes = [
+        {'shape_id': 'a', 'direction_id': 0, 'points': _points(SAMPLE)},
+        {'shape_id': 'b', 'direction_id': 1, 'part': 2, 'points': _points([(37.5, -122.25)])},
+        {'shape_id': 'empty', 'direction_id': None, 'points': []},
+    ]
+    decoded = decode_binary(encode_binary(shapes))
+
+    assert [shape['shape_id'] for shape in decoded] == ['a', 'b', 'empty']
+    assert [shape['point_count'] for shape in decoded] == [3, 1, 0]
+    assert decoded[1]['part'] == 2 and decoded[2]['direction_id'] is None
+    # float32 约有 7 位有效数字，坐标误差在 1e-5 度（约 1 米）以内
+    flat = [value for point in decoded[0]['points'] for value in point]
+    assert flat == pytest.approx([value for point in SAMPLE for value in point], abs=1e-5)
+    assert decoded[1]['points'] == [(37.5, -122.25)]
+
+
+def test_binary_layout_is_aligned_little_endian():
+    body = encode_binary([{'shape_id': 'ü', 'points': _points([(1.5, -2.25)])}])
+    (length,) = struct.unpack_from('<I', body)
+    assert length % 4 == 0
+    assert json.loads(body[4:4 + length].decode('utf-8')) == [{'shape_id': 'ü', 'point_count': 1}]
+    assert struct.unpack_from('<2f', body, 4 + length) == (1.5, -2.25)
+    assert len(body) == 4 + length + 8
+
+
+def test_binary_rejects_truncated_body():
+    body = encode_binary([{'shape_id': 'a', 'points': _points(SAMPLE)}])
+    with pytest.raises(ValueError):
+        decode_binary(body[:-4])
+    with pytest.raises(ValueError):
+        decode_binary(body[:2])
+
+
+class _Accept:
+    """模拟 request.accept_mimetypes"""
+
+    def __init__(self, media_type):
+        self.media_type = media_type
+
+    def best_match(self, matches, default=None):
+        return self.media_type if self.media_type in matches else default
+
+
+def test_negotiate():
+    assert negotiate('polyline') == 'polyline'
+    assert negotiate(None) == 'json'
+    assert negotiate(None, _Accept(SHAPE_FORMATS['binary'])) == 'binary'
+    assert negotiate(None, _Accept('text/html')) == 'json'
+    # format 参数优先于 Accept 头
+    assert negotiate('columns', _Accept(SHAPE_FORMATS['binary'])) == 'columns'
+    with pytest.raises(ValueError):
+        negotiate('xml')
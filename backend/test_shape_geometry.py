@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+shape_geometry.py 的单元测试（不需要数据库）
+
+运行方式:
+    python -m pytest test_shape_geometry.py
+"""
+
+import math
+
+import pytest
+
+from shape_geometry import (EARTH_RADIUS, LEVEL_TOLERANCES, parse_bbox, pick_level, simplification,
+                            zoom_tolerance, simplify, clip_points, level_points, group_route_shapes,
+                            group_level_shapes, build_shape_levels)
+
+# 纬度 37.7 度附近，经度每 1e-5 度约 0.88 米，纬度每 1e-5 度约 1.11 米
+LAT0, LON0 = 37.7, -122.4
+METERS_PER_DEGREE = EARTH_RADIUS * math.pi / 180
+
+
+def _point(sequence, east_m, north_m, shape_id='s1'):
+    """距 (LAT0, LON0) 向东 east_m 米、向北 north_m 米的点"""
+    return {
+        'shape_id': shape_id,
+        'shape_pt_lat': LAT0 + north_m / METERS_PER_DEGREE,
+        'shape_pt_lon': LON0 + east_m / (METERS_PER_DEGREE * math.cos(math.radians(LAT0))),
+        'shape_pt_sequence': sequence,
+        'shape_dist_traveled': float(east_m),
+    }
+
+
+def test_simplify_drops_collinear_points():
+    points = [_point(index, index * 10, 0) for index in range(11)]
+    assert simplify(points, 1.0) == [points[0], points[-1]]
+
+
+def test_simplify_respects_tolerance():
+    # 中间的点偏离直线 5 米: 容差 4 米时保留，容差 6 米时去掉
+    points = [_point(0, 0, 0), _point(1, 50, 5), _point(2, 100, 0)]
+    assert simplify(points, 4.0) == points
+    assert simplify(points, 6.0) == [points[0], points[2]]
+
+
+def test_simplify_keeps_endpoints_and_order():
+    points = [_point(index, index * 10, (index % 3) * 20) for index in range(30)]
+    result = simplify(points, 5.0)
+    assert result[0] is points[0] and result[-1] is points[-1]
+    sequences = [point['shape_pt_sequence'] for point in result]
+    assert sequences == sorted(sequences)
+    # 容差越大保留的点越少
+    assert len(simplify(points, 50.0)) <= len(result) <= len(points)
+
+
+def test_simplify_measures_distance_to_segment():
+    # 折返的轨迹: 最后一点回到起点附近，到首尾连线（直线）的距离很小但到线段的距离很大
+    points = [_point(0, 0, 0), _point(1, 100, 0), _point(2, 200, 0), _point(3, 1, 0)]
+    assert points[2] in simplify(points, 10.0)
+
+
+def test_simplify_short_and_disabled():
+    two = [_point(0, 0, 0), _point(1, 10, 0)]
+    assert simplify(two, 100.0) == two
+    three = [_point(0, 0, 0), _point(1, 5, 0.1), _point(2, 10, 0)]
+    assert simplify(three, 0) == three
+
+
+def test_zoom_tolerance_halves_per_level():
+    assert zoom_tolerance(13) == pytest.approx(19.11, abs=0.01)
+    assert zoom_tolerance(14) == pytest.approx(zoom_tolerance(13) / 2)
+
+
+@pytest.mark.parametrize('zoom, level', [(0, 128.0), (10, 128.0), (12, 32.0), (13, 8.0), (14, 8.0),
+                                         (16, 2.0), (17, None), (20, None)])
+def test_pick_level_by_zoom(zoom, level):
+    assert pick_level(zoom=zoom) == level
+
+
+@pytest.mark.parametrize('tolerance, level', [(1.0, None), (2.0, 2.0), (7.9, 2.0), (8.0, 8.0), (1000, 128.0)])
+def test_pick_level_by_tolerance(tolerance, level):
+    assert pick_level(tolerance=tolerance) == level
+
+
+def test_pick_level_tolerance_overrides_zoom():
+    assert pick_level(tolerance=2.0, zoom=5) == 2.0
+    assert pick_level() is None
+
+
+@pytest.mark.parametrize('tolerance, zoom, expected', [
+    (None, None, (None, 0.0)),
+    (None, 13, (8.0, 0.0)),       # 只有 zoom: 直接使用预计算级别
+    (8.0, None, (8.0, 0.0)),      # 容差恰好是一个级别: 不再简化
+    (20.0, 13, (8.0, 20.0)),      # 显式 tolerance 优先: 从 8 米级别出发再按 20 米简化
+    (1.0, 10, (None, 1.0)),       # 小于最小级别: 从原始轨迹简化
+    (0.0, 10, (None, 0.0)),
+])
+def test_simplification_precedence(tolerance, zoom, expected):
+    assert simplification(tolerance, zoom) == expected
+
+
+def test_level_tolerances_sorted():
+    assert list(LEVEL_TOLERANCES) == sorted(LEVEL_TOLERANCES)
+
+
+def test_parse_bbox():
+    assert parse_bbox(None) is None
+    assert parse_bbox('-122.45,37.76,-122.40,37.80') == (-122.45, 37.76, -122.40, 37.80)
+    for value in ('1,2,3', 'a,b,c,d', '-122.40,37.76,-122.45,37.80'):
+        with pytest.raises(ValueError):
+            parse_bbox(value)
+
+
+def test_clip_points_keeps_neighbours_and_splits_parts():
+    # 向东走 0..400 米，向北折 200 米后再向西走回 0 米: 东经 200 米附近的范围被经过两次
+    points = [_point(index, index * 100, 0) for index in range(5)]
+    points += [_point(5 + index, (4 - index) * 100, 200) for index in range(5)]
+    center = _point(0, 200, 0)['shape_pt_lon']
+    north = _point(0, 0, 200)['shape_pt_lat']
+
+    parts = clip_points(points, (center - 1e-5, LAT0 - 1e-4, center + 1e-5, LAT0 + 1e-4))
+    assert [[point['shape_pt_sequence'] for point in part] for part in parts] == [[1, 2, 3]]
+
+    parts = clip_points(points, (center - 1e-5, LAT0 - 1e-4, center + 1e-5, north + 1e-4))
+    assert [[point['shape_pt_sequence'] for point in part] for part in parts] == [[1, 2, 3], [6, 7, 8]]
+    assert clip_points(points, (0, 0, 1, 1)) == []
+
+
+def test_level_points_restores_point_dicts():
+    row = {'shape_id': 's1', 'shape_pt_lat': [1.0, 2.0], 'shape_pt_lon': [3.0, 4.0],
+           'shape_pt_sequence': [1, 5], 'shape_dist_traveled': [0.0, None]}
+    assert level_points(row) == [
+        {'shape_id': 's1', 'shape_pt_lat': 1.0, 'shape_pt_lon': 3.0, 'shape_pt_sequence': 1, 'shape_dist_traveled': 0.0},
+        {'shape_id': 's1', 'shape_pt_lat': 2.0, 'shape_pt_lon': 4.0, 'shape_pt_sequence': 5, 'shape_dist_traveled': None},
+    ]
+
+
+def test_group_route_shapes_splits_by_shape_and_clip_gaps():
+    rows = [dict(_point(index, index * 10, 0, 'a'), direction_id=0) for index in range(3)]
+    rows += [dict(_point(index, index * 10, 0, 'b'), direction_id=1) for index in range(2)]
+    shapes = group_route_shapes(rows)
+    assert [(shape['shape_id'], shape['direction_id'], len(shape['points'])) for shape in shapes] == \
+        [('a', 0, 3), ('b', 1, 2)]
+    assert 'part' not in shapes[0]
+
+    # bbox 裁剪的结果: point_index 不连续时拆成新的一段
+    clipped = [dict(row, point_index=index) for row, index in zip(rows[:3], (1, 2, 5))]
+    parts = group_route_shapes(clipped)
+    assert [(shape['part'], len(shape['points'])) for shape in parts] == [(0, 2), (1, 1)]
+
+
+def test_group_level_shapes_applies_tolerance():
+    points = [_point(index, index * 10, 0) for index in range(5)]
+    row = {'shape_id': 's1', 'direction_id': 0,
+           **{key: [point[key] for point in points]
+              for key in ('shape_pt_lat', 'shape_pt_lon', 'shape_pt_sequence', 'shape_dist_traveled')}}
+    assert len(group_level_shapes([row])[0]['points']) == 5
+    assert len(group_level_shapes([row], tolerance=1.0)[0]['points']) == 2
+
+
+class _FakeCursor:
+    """模拟 psycopg2 游标: 命名（服务端）游标在第一次读取之前 description 为 None"""
+
+    def __init__(self, rows=(), name=None):
+        self.name = name
+        self.rows = list(rows)
+        self.description = None
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class _FakeConnection:
+    def __init__(self, rows):
+        self.source = _FakeCursor(rows, name='shape_levels_source')
+        self.cursors = []
+
+    def cursor(self, name=None):
+        if name:
+            return self.source
+        self.cursors.append(_FakeCursor())
+        return self.cursors[-1]
+
+
+def test_build_shape_levels_streams_from_named_cursor(monkeypatch):
+    extras = pytest.importorskip('psycopg2.extras')
+    inserted = []
+    monkeypatch.setattr(extras, 'execute_values', lambda cursor, query, batch, template=None: inserted.extend(batch))
+
+    points = [_point(index, index * 10, 0, 'a') for index in range(5)] + [_point(1, 0, 0, 'b'), _point(2, 0, 50, 'b')]
+    rows = [tuple(point[key] for key in ('shape_id', 'shape_pt_lat', 'shape_pt_lon', 'shape_pt_sequence',
+                                         'shape_dist_traveled')) for point in points]
+    conn = _FakeConnection(rows)
+
+    assert build_shape_levels(conn, tolerances=(1.0, 100.0)) == 4
+    assert [(row[0], row[1], row[2]) for row in inserted] == [('a', 1.0, 2), ('a', 100.0, 2), ('b', 1.0, 2), ('b', 100.0, 2)]
+    # 点数组按 shape_pt_sequence 排列，最后四项是外包矩形
+    assert inserted[0][5] == [0, 4]
+    assert inserted[2][-4:] == (LAT0, points[5]['shape_pt_lon'], points[6]['shape_pt_lat'], points[6]['shape_pt_lon'])
+    assert conn.cursors[0].executed == [('DELETE FROM shape_levels ', ())]
+
+
+def test_build_shape_levels_for_changed_shapes(monkeypatch):
+    extras = pytest.importorskip('psycopg2.extras')
+    monkeypatch.setattr(extras, 'execute_values', lambda *args, **kwargs: None)
+
+    assert build_shape_levels(_FakeConnection([]), shape_ids=[]) == 0
+    conn = _FakeConnection([])
+    assert build_shape_levels(conn, shape_ids=['b', 'a']) == 0
+    query, params = conn.source.executed[0]
+    assert 'WHERE shape_id = ANY(%s)' in query and params == (['b', 'a'],)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+vector_tiles.py 的单元测试（不需要数据库）
+
+运行方式:
+    python -m pytest test_vector_tiles.py
+"""
+
+import struct
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from vector_tiles import (EXTENT, BUFFER, TileBounds, LayerBuilder, _varint, _zigzag, _field, _encode_value,
+                          parse_layers, shape_level_for_zoom, tile_query, cache_control, build_layer,
+                          VEHICLE_TTL, STATIC_TILE_MAX_AGE)
+
+
+def _read_varint(data, index):
+    result = shift = 0
+    while True:
+        byte = data[index]
+        index += 1
+        result |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            return result, index
+
+
+def _messages(data):
+    """解码一层 protobuf 消息，返回 [(字段号, 值)]；长度前缀字段的值是 bytes"""
+    fields, index = [], 0
+    while index < len(data):
+        key, index = _read_varint(data, index)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, index = _read_varint(data, index)
+        elif wire_type == 1:
+            value, index = struct.unpack_from('<d', data, index)[0], index + 8
+        elif wire_type == 2:
+            length, index = _read_varint(data, index)
+            value, index = data[index:index + length], index + length
+        else:
+            raise AssertionError(f"unexpected wire type {wire_type}")
+        fields.append((number, value))
+    return fields
+
+
+def _packed(data):
+    values, index = [], 0
+    while index < len(data):
+        value, index = _read_varint(data, index)
+        values.append(value)
+    return values
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def _decode_layer(tile_bytes):
+    """把只包含一个图层的瓦片解码为 (name, version, extent, features)，要素的属性已按 keys/values 还原"""
+    [(number, layer)] = _messages(tile_bytes)
+    assert number == 3
+    fields = _messages(layer)
+    keys = [value.decode('utf-8') for number, value in fields if number == 3]
+    values = []
+    for number, value in fields:
+        if number == 4:
+            [(kind, raw)] = _messages(value)
+            values.append({1: lambda v: v.decode('utf-8'), 3: float, 5: int, 6: _unzigzag, 7: bool}[kind](raw))
+    features = []
+    for number, value in fields:
+        if number == 2:
+            feature = dict(_messages(value))
+            tags = _packed(feature[2])
+            properties = {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)}
+            features.append((feature[3], _packed(feature[4]), properties))
+    first = dict(fields)
+    return first[1].decode('utf-8'), first[15], first[5], features
+
+
+@pytest.mark.parametrize('value, encoded', [(0, 0), (-1, 1), (1, 2), (-2, 3), (2 ** 31 - 1, 2 ** 32 - 2),
+                                            (-2 ** 31, 2 ** 32 - 1)])
+def test_zigzag(value, encoded):
+    assert _zigzag(value) == encoded
+    assert _unzigzag(encoded) == value
+
+
+@pytest.mark.parametrize('value, encoded', [(0, b'\x00'), (1, b'\x01'), (127, b'\x7f'), (128, b'\x80\x01'),
+                                            (300, b'\xac\x02'), (2 ** 32, b'\x80\x80\x80\x80\x10')])
+def test_varint(value, encoded):
+    assert _varint(value) == encoded
+    assert _read_varint(encoded, 0) == (value, len(encoded))
+
+
+def test_length_delimited_field():
+    assert _field(1, b'abc') == b'\x0a\x03abc'
+    assert _messages(_field(3, b'x' * 200)) == [(3, b'x' * 200)]
+
+
+@pytest.mark.parametrize('value, expected', [('站点', [(1, '站点'.encode('utf-8'))]), (True, [(7, 1)]),
+                                             (7, [(5, 7)]), (-3, [(6, 5)]), (1.5, [(3, 1.5)])])
+def test_encode_value(value, expected):
+    assert _messages(_encode_value(value)) == expected
+
+
+def test_tile_bounds_project_and_bbox():
+    tile = TileBounds(1, 0, 0)
+    # 西北象限: 左上角是 (0, 0)，经纬度原点在右下角
+    assert tile.project(-180.0, 85.0511) == (0, 0)
+    assert tile.project(0.0, 0.0) == (EXTENT, EXTENT)
+
+    min_lon, min_lat, max_lon, max_lat = TileBounds(0, 0, 0).bbox(buffer=0)
+    assert (min_lon, max_lon) == pytest.approx((-180.0, 180.0))
+    assert (min_lat, max_lat) == pytest.approx((-85.0511, 85.0511), abs=1e-4)
+
+    tile = TileBounds(14, 2620, 6333)
+    min_lon, min_lat, max_lon, max_lat = tile.bbox()
+    assert tile.project(min_lon, max_lat) == (-BUFFER, -BUFFER)
+    assert tile.project(max_lon, min_lat) == (EXTENT + BUFFER, EXTENT + BUFFER)
+
+
+@pytest.mark.parametrize('z, x, y', [(-1, 0, 0), (23, 0, 0), (2, 4, 0), (2, 0, -1)])
+def test_tile_bounds_rejects_invalid(z, x, y):
+    with pytest.raises(ValueError):
+        TileBounds(z, x, y)
+
+
+def test_layer_builder_points_share_keys_and_values():
+    builder = LayerBuilder('stops')
+    builder.add_point((10, 20), {'stop_id': 'S1', 'wheelchair_boarding': 1, 'stop_code': None})
+    builder.add_point((-5, 4096), {'stop_id': 'S2', 'wheelchair_boarding': 1, 'price': Decimal('2.5')})
+    name, version, extent, features = _decode_layer(builder.encode())
+
+    assert (name, version, extent) == ('stops', 2, EXTENT)
+    assert features == [
+        (1, [9, _zigzag(10), _zigzag(20)], {'stop_id': 'S1', 'wheelchair_boarding': 1}),
+        (1, [9, _zigzag(-5), _zigzag(4096)], {'stop_id': 'S2', 'wheelchair_boarding': 1, 'price': 2.5}),
+    ]
+
+
+def test_layer_builder_lines_use_relative_coordinates():
+    builder = LayerBuilder('shapes')
+    # 第二段的重复点被去掉，第三段只有一个不同的点被忽略
+    builder.add_lines([[(0, 0), (10, 0), (10, 10)], [(20, 20), (20, 20), (25, 20)], [(1, 1), (1, 1)]],
+                      {'shape_id': 'a'})
+    [(geom_type, geometry, properties)] = _decode_layer(builder.encode())[3]
+    assert geom_type == 2 and properties == {'shape_id': 'a'}
+    assert geometry == [
+        9, 0, 0, 2 << 3 | 2, _zigzag(10), 0, 0, _zigzag(10),
+        9, _zigzag(10), _zigzag(10), 1 << 3 | 2, _zigzag(5), 0,
+    ]
+
+
+def test_empty_layer_encodes_to_nothing():
+    builder = LayerBuilder('shapes')
+    builder.add_lines([[(1, 1)]], {})
+    assert builder.encode() == b''
+
+
+def test_parse_layers():
+    assert parse_layers(None) == ['stops', 'shapes', 'vehicles']
+    assert parse_layers(' stops, vehicles ,') == ['stops', 'vehicles']
+    with pytest.raises(ValueError):
+        parse_layers('stops,roads')
+
+
+def test_tile_query_parameters():
+    tile = TileBounds(14, 2620, 6333)
+    min_lon, min_lat, max_lon, max_lat = tile.bbox()
+    query, params = tile_query('stops', tile)
+    assert query.count('%s') == len(params) == 4
+    query, params = tile_query('shapes', tile)
+    assert query.count('%s') == len(params) == 9
+    assert params == (8.0,) + (min_lat, max_lat, min_lon, max_lon) * 2
+    with pytest.raises(ValueError):
+        tile_query('vehicles', tile)
+
+
+def test_shape_level_for_zoom_uses_finest_level_at_high_zoom():
+    assert shape_level_for_zoom(5) == 128.0
+    assert shape_level_for_zoom(18) == 2.0
+
+
+def test_cache_control():
+    assert cache_control(['stops']) == f"public, max-age={STATIC_TILE_MAX_AGE}"
+    assert cache_control(['stops', 'vehicles']) == f"public, max-age={int(VEHICLE_TTL)}"
+
+
+def _shape_row(coords, raw):
+    return {'shape_id': 's1', 'route_id': 'r1', 'route_short_name': '38', 'route_type': 3, 'route_color': None,
+            'shape_pt_lat': [lat for lat, _ in coords], 'shape_pt_lon': [lon for _, lon in coords],
+            'shape_pt_sequence': list(range(1, len(coords) + 1)), 'shape_dist_traveled': [None] * len(coords),
+            'raw': raw}
+
+
+def test_build_shapes_layer_simplifies_raw_rows():
+    tile = TileBounds(14, 2620, 6333)
+    min_lon, min_lat, max_lon, max_lat = tile.bbox(buffer=0)
+    lat = (min_lat + max_lat) / 2
+    # 瓦片内的一条东西向直线，共 50 个点
+    step = (max_lon - min_lon) / 60
+    coords = [(lat, min_lon + step * (index + 5)) for index in range(50)]
+
+    [(_, levels_geometry, properties)] = _decode_layer(build_layer('shapes', [_shape_row(coords, False)], tile))[3]
+    assert properties == {'shape_id': 's1', 'route_id': 'r1', 'route_short_name': '38', 'route_type': 3}
+    # shape_levels 的行已经简化过，原样输出（LineTo 命令包含 49 个点）
+    assert levels_geometry[3] == 49 << 3 | 2
+
+    [(_, raw_geometry, _)] = _decode_layer(build_layer('shapes', [_shape_row(coords, True)], tile))[3]
+    assert raw_geometry[3] == 1 << 3 | 2
+    assert len(raw_geometry) == 6
+
+
+def test_build_vehicles_layer_filters_by_tile():
+    tile = TileBounds(14, 2620, 6333)
+    min_lon, min_lat, max_lon, max_lat = tile.bbox()
+    timestamp = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    row = {'vehicle_id': 'v1', 'trip_id': None, 'route_id': 'r1', 'bearing': 90.0, 'speed': None,
+           'current_status': 'IN_TRANSIT_TO', 'stop_id': None, 'position_timestamp': timestamp,
+           'latitude': (min_lat + max_lat) / 2, 'longitude': (min_lon + max_lon) / 2}
+    outside = dict(row, vehicle_id='v2', longitude=max_lon + 1)
+    [(geom_type, _, properties)] = _decode_layer(build_layer('vehicles', [row, outside], tile))[3]
+    assert geom_type == 1
+    assert properties == {'vehicle_id': 'v1', 'route_id': 'r1', 'bearing': 90.0,
+                          'current_status': 'IN_TRANSIT_TO', 'timestamp': int(timestamp.timestamp())}
+    with pytest.raises(ValueError):
+        build_layer('roads', [], tile)
@@ -0,0 +1,383 @@
+"""
+Mapbox Vector Tile（MVT）生成
+
+/api/tiles/{z}/{x}/{y} 返回包含以下图层的矢量瓦片:
+- stops: 站点（点），LAYER_MIN_ZOOM 中指定的 13 级及以上
+- shapes: 线路轨迹（线），使用 shape_levels 中与缩放级别对应的简化级别（尚未生成时从原始轨迹简化）
+- vehicles: 最近 10 分钟内各车辆的最新位置（点）
+
+瓦片按 vector_tile.proto（2.1 版）直接编码为 protobuf，不依赖 PostGIS 或第三方库。
+一个瓦片就是若干 Layer 消息的拼接，因此每个图层单独编码和缓存:
+静态图层按数据版本缓存在 TileCache 中，车辆位置整体缓存 VEHICLE_TTL 秒后重新查询。
+
+使用方法:
+    tile = TileBounds(14, 2620, 6333)
+    query, params = tile_query('stops', tile)
+    data = build_layer('stops', execute_query(query, params), tile)
+"""
+
+import math
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+from shape_geometry import LEVEL_TOLERANCES, clip_points, level_points, pick_level, simplify
+
+MVT_MEDIA_TYPE = 'application/vnd.mapbox-vector-tile'
+
+TILE_LAYERS = ('stops', 'shapes', 'vehicles')
+STATIC_LAYERS = ('stops', 'shapes')
+
+# 瓦片坐标范围（4096 是 MVT 的惯用值）和四周的缓冲区（避免图标和线条在瓦片边缘被截断）
+EXTENT = 4096
+BUFFER = 64
+
+MAX_ZOOM = 22
+# 各图层的最小缩放级别，低于该级别时不输出（全市的站点在小比例尺下没有意义且体积很大）
+LAYER_MIN_ZOOM = {'stops': 13, 'shapes': 0, 'vehicles': 0}
+
+# 车辆位置缓存秒数，同时用作包含车辆图层的瓦片的 Cache-Control
+VEHICLE_TTL = float(os.getenv('TILE_VEHICLE_TTL', 5))
+# 只包含静态图层的瓦片的 Cache-Control 秒数（导入新数据后，浏览器缓存最多在这段时间后失效）
+STATIC_TILE_MAX_AGE = int(os.getenv('TILE_MAX_AGE', 300))
+
+STOPS_TILE_QUERY = """
+    SELECT stop_id, stop_code, stop_name, stop_lat, stop_lon, location_type, wheelchair_boarding
+    FROM stops
+    WHERE stop_lat BETWEEN %s AND %s AND stop_lon BETWEEN %s AND %s
+"""
+
+# 每条轨迹任选一条使用它的线路，用于在地图上按线路着色。
+# shape_levels 尚未生成（表为空）时回落到原始轨迹，raw 为 TRUE 的行由 build_layer 按级别简化；
+# NOT EXISTS 只计算一次，已生成简化级别时不会扫描 shapes 表
+SHAPES_TILE_QUERY = """
+    WITH tile_shapes AS (
+        SELECT sl.shape_id, sl.shape_pt_lat, sl.shape_pt_lon, sl.shape_pt_sequence, sl.shape_dist_traveled,
+               FALSE AS raw
+        FROM shape_levels sl
+        WHERE sl.tolerance = %s
+          AND sl.max_lat >= %s AND sl.min_lat <= %s AND sl.max_lon >= %s AND sl.min_lon <= %s
+        UNION ALL
+        SELECT s.shape_id,
+               array_agg(s.shape_pt_lat ORDER BY s.shape_pt_sequence),
+               array_agg(s.shape_pt_lon ORDER BY s.shape_pt_sequence),
+               array_agg(s.shape_pt_sequence ORDER BY s.shape_pt_sequence),
+               array_agg(s.shape_dist_traveled ORDER BY s.shape_pt_sequence),
+               TRUE AS raw
+        FROM shapes s
+        WHERE NOT EXISTS (SELECT 1 FROM shape_levels)
+        GROUP BY s.shape_id
+        HAVING MAX(s.shape_pt_lat) >= %s AND MIN(s.shape_pt_lat) <= %s
+           AND MAX(s.shape_pt_lon) >= %s AND MIN(s.shape_pt_lon) <= %s
+    )
+    SELECT ts.shape_id, ts.shape_pt_lat, ts.shape_pt_lon, ts.shape_pt_sequence, ts.shape_dist_traveled, ts.raw,
+           r.route_id, r.route_short_name, r.route_type, r.route_color
+    FROM tile_shapes ts
+    LEFT JOIN LATERAL (
+        SELECT t.route_id FROM trips t WHERE t.shape_id = ts.shape_id LIMIT 1
+    ) t ON TRUE
+    LEFT JOIN routes r ON r.route_id = t.route_id
+"""
+
+VEHICLES_QUERY = """
+    SELECT DISTINCT ON (vehicle_id)
+           vehicle_id, trip_id, route_id, latitude, longitude, bearing, speed,
+           current_status, stop_id, position_timestamp
+    FROM realtime_vehicle_positions
+    WHERE position_timestamp >= NOW() - INTERVAL '10 minutes'
+    ORDER BY vehicle_id, position_timestamp DESC
+"""
+
+_STOP_PROPERTIES = ('stop_id', 'stop_code', 'stop_name', 'location_type', 'wheelchair_boarding')
+_SHAPE_PROPERTIES = ('shape_id', 'route_id', 'route_short_name', 'route_type', 'route_color')
+_VEHICLE_PROPERTIES = ('vehicle_id', 'trip_id', 'route_id', 'bearing', 'speed', 'current_status', 'stop_id')
+
+# GeomType 与几何命令
+_POINT, _LINESTRING = 1, 2
+_MOVE_TO, _LINE_TO = 1, 2
+
+
+class TileBounds:
+    """一个 XYZ 瓦片（Web 墨卡托投影）"""
+
+    def __init__(self, z: int, x: int, y: int):
+        if not 0 <= z <= MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            raise ValueError(f"瓦片坐标无效: {z}/{x}/{y}")
+        self.z, self.x, self.y = z, x, y
+        self.size = 2 ** z
+
+    def project(self, lon: float, lat: float) -> Tuple[int, int]:
+        """经纬度转换为瓦片内坐标（0 到 EXTENT，缓冲区内的点可能略超出）"""
+        lat = max(min(lat, 85.0511), -85.0511)
+        world_x = (lon + 180.0) / 360.0 * self.size
+        world_y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * self.size
+        return round((world_x - self.x) * EXTENT), round((world_y - self.y) * EXTENT)
+
+    def _unproject(self, world_x: float, world_y: float) -> Tuple[float, float]:
+        lon = world_x / self.size * 360.0 - 180.0
+        lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * world_y / self.size))))
+        return lon, lat
+
+    def bbox(self, buffer: int = BUFFER) -> Tuple[float, float, float, float]:
+        """瓦片（含缓冲区）的经纬度范围 (min_lon, min_lat, max_lon, max_lat)"""
+        margin = buffer / EXTENT
+        min_lon, max_lat = self._unproject(self.x - margin, self.y - margin)
+        max_lon, min_lat = self._unproject(self.x + 1 + margin, self.y + 1 + margin)
+        return min_lon, min_lat, max_lon, max_lat
+
+
+# ---- protobuf 编码 ----
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    """长度前缀字段（wire type 2）"""
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _uint_field(number: int, value: int) -> bytes:
+    return _varint(number << 3) + _varint(value)
+
+
+def _encode_value(value: Any) -> bytes:
+    """编码 Value 消息: 字符串、布尔、整数或浮点数"""
+    if isinstance(value, str):
+        return _field(1, value.encode('utf-8'))
+    if isinstance(value, bool):
+        return _uint_field(7, int(value))
+    if isinstance(value, int):
+        return _uint_field(5, value) if value >= 0 else _uint_field(6, _zigzag(value))
+    return _varint(3 << 3 | 1) + struct.pack('<d', float(value))
+
+
+class LayerBuilder:
+    """构建一个 MVT 图层"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._features: List[bytes] = []
+        self._keys: Dict[str, int] = {}
+        self._values: Dict[Tuple[type, Any], int] = {}
+
+    def _tags(self, properties: Dict[str, Any]) -> List[int]:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            if isinstance(value, Decimal):
+                value = float(value)
+            elif not isinstance(value, (str, bool, int, float)):
+                value = str(value)
+            tags.append(self._keys.setdefault(key, len(self._keys)))
+            tags.append(self._values.setdefault((type(value), value), len(self._values)))
+        return tags
+
+    def _add(self, geom_type: int, geometry: List[int], properties: Dict[str, Any]):
+        feature = (_field(2, b''.join(_varint(tag) for tag in self._tags(properties)))
+                   + _uint_field(3, geom_type)
+                   + _field(4, b''.join(_varint(command) for command in geometry)))
+        self._features.append(_field(2, feature))
+
+    def add_point(self, point: Tuple[int, int], properties: Dict[str, Any]):
+        x, y = point
+        self._add(_POINT, [_MOVE_TO | 1 << 3, _zigzag(x), _zigzag(y)], properties)
+
+    def add_lines(self, lines: Sequence[Sequence[Tuple[int, int]]], properties: Dict[str, Any]):
+        """添加一条（多段）折线，少于两个不同点的段被忽略"""
+        geometry: List[int] = []
+        cursor_x = cursor_y = 0
+        for line in lines:
+            # 投影到瓦片坐标后相邻的重复点没有意义
+            points = [point for index, point in enumerate(line) if index == 0 or point != line[index - 1]]
+            if len(points) < 2:
+                continue
+            geometry.append(_MOVE_TO | 1 << 3)
+            for index, (x, y) in enumerate(points):
+                if index == 1:
+                    geometry.append(_LINE_TO | (len(points) - 1) << 3)
+                geometry.extend((_zigzag(x - cursor_x), _zigzag(y - cursor_y)))
+                cursor_x, cursor_y = x, y
+        if geometry:
+            self._add(_LINESTRING, geometry, properties)
+
+    def encode(self) -> bytes:
+        """编码为 Tile.layers 字段；没有要素时返回空字节串"""
+        if not self._features:
+            return b''
+        values = sorted(self._values.items(), key=lambda item: item[1])
+        layer = (_uint_field(15, 2)
+                 + _field(1, self.name.encode('utf-8'))
+                 + b''.join(self._features)
+                 + b''.join(_field(3, key.encode('utf-8')) for key in self._keys)
+                 + b''.join(_field(4, _encode_value(value)) for (_, value), _ in values)
+                 + _uint_field(5, EXTENT))
+        return _field(3, layer)
+
+
+# ---- 图层 ----
+
+def parse_layers(value: Optional[str]) -> List[str]:
+    """
+    解析 layers 参数（逗号分隔），默认所有图层
+
+    Raises:
+        ValueError: 包含未知图层
+    """
+    if not value:
+        return list(TILE_LAYERS)
+    layers = [layer.strip() for layer in value.split(',') if layer.strip()]
+    unknown = set(layers) - set(TILE_LAYERS)
+    if unknown:
+        raise ValueError(f"layers 参数只能包含 {', '.join(TILE_LAYERS)}")
+    return layers
+
+
+def shape_level_for_zoom(z: int) -> float:
+    """瓦片使用的轨迹简化级别，高缩放级别使用最精细的预计算级别"""
+    return pick_level(zoom=z) or min(LEVEL_TOLERANCES)
+
+
+def tile_query(layer: str, tile: TileBounds) -> Tuple[str, tuple]:
+    """生成静态图层（stops、shapes）在瓦片范围内的查询"""
+    min_lon, min_lat, max_lon, max_lat = tile.bbox()
+    if layer == 'stops':
+        return STOPS_TILE_QUERY, (min_lat, max_lat, min_lon, max_lon)
+    if layer == 'shapes':
+        bounds = (min_lat, max_lat, min_lon, max_lon)
+        return SHAPES_TILE_QUERY, (shape_level_for_zoom(tile.z),) + bounds + bounds
+    raise ValueError(f"unknown static layer: {layer}")
+
+
+def cache_control(layers: Sequence[str]) -> str:
+    """瓦片响应的 Cache-Control，包含车辆图层时只缓存 VEHICLE_TTL 秒"""
+    max_age = int(VEHICLE_TTL) if 'vehicles' in layers else STATIC_TILE_MAX_AGE
+    return f"public, max-age={max_age}"
+
+
+def _in_bbox(lon: float, lat: float, bbox: Tuple[float, float, float, float]) -> bool:
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return min_lon <= lon <= max_lon and min_lat <= lat <= max_lat
+
+
+_raw_shapes_warned = False
+
+
+def _warn_raw_shapes():
+    global _raw_shapes_warned
+    if not _raw_shapes_warned:
+        _raw_shapes_warned = True
+        print("shape_levels 尚未生成，瓦片的 shapes 图层从原始轨迹简化（较慢），"
+              "请运行 gtfs_importer.py 或 GTFSImporter.build_shape_levels() 生成简化级别")
+
+
+def build_layer(layer: str, rows: List[Dict[str, Any]], tile: TileBounds) -> bytes:
+    """
+    根据查询结果生成图层
+
+    Args:
+        layer: stops、shapes 或 vehicles
+        rows: tile_query 的结果；vehicles 为 VEHICLES_QUERY 的全部结果（在这里按瓦片范围筛选）
+    """
+    builder = LayerBuilder(layer)
+    bbox = tile.bbox()
+
+    if layer == 'stops':
+        for row in rows:
+            point = tile.project(float(row['stop_lon']), float(row['stop_lat']))
+            builder.add_point(point, {key: row[key] for key in _STOP_PROPERTIES})
+
+    elif layer == 'shapes':
+        for row in rows:
+            points = level_points(row)
+            if row.get('raw'):
+                _warn_raw_shapes()
+                points = simplify(points, shape_level_for_zoom(tile.z))
+            parts = clip_points(points, bbox)
+            lines = [[tile.project(point['shape_pt_lon'], point['shape_pt_lat']) for point in part]
+                     for part in parts]
+            builder.add_lines(lines, {key: row.get(key) for key in _SHAPE_PROPERTIES})
+
+    elif layer == 'vehicles':
+        for row in rows:
+            lon, lat = float(row['longitude']), float(row['latitude'])
+            if not _in_bbox(lon, lat, bbox):
+                continue
+            properties = {key: row[key] for key in _VEHICLE_PROPERTIES}
+            timestamp = row.get('position_timestamp')
+            if timestamp is not None:
+                properties['timestamp'] = int(timestamp.timestamp())
+            builder.add_point(tile.project(lon, lat), properties)
+
+    else:
+        raise ValueError(f"unknown layer: {layer}")
+
+    return builder.encode()
+
+
+# ---- 缓存 ----
+
+class TileCache:
+    """线程安全的 LRU 缓存，保存编码后的静态图层，键中包含数据版本"""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        if max_entries is None:
+            max_entries = int(os.getenv('TILE_CACHE_SIZE', 4096))
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[tuple, bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key: tuple, data: bytes) -> bytes:
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class VehicleSnapshot:
+    """最近一次查询到的车辆位置，过期（VEHICLE_TTL 秒）后返回 None，由调用方重新查询"""
+
+    def __init__(self, ttl: float = VEHICLE_TTL):
+        self.ttl = ttl
+        self._rows: Optional[List[Dict[str, Any]]] = None
+        self._loaded_at = 0.0
+
+    def get(self) -> Optional[List[Dict[str, Any]]]:
+        if self._rows is None or time.monotonic() - self._loaded_at > self.ttl:
+            return None
+        return self._rows
+
+    def set(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        self._rows, self._loaded_at = rows, time.monotonic()
+        return rows
+
+
+tile_cache = TileCache()
+vehicle_positions = VehicleSnapshot()
@@ -49,3 +49,15 @@ export const getCalendar = () => {
 export const getStats = () => {
   return apiClient.get('/stats')
 }
+
+/**
+ * 站点和线路联想搜索（服务端内存索引，适合每次按键调用）
+ * @param {string} q - 输入内容
+ * @param {Object} params - 查询参数
+ * @param {string} params.types - 搜索类型，逗号分隔（stop,route）
+ * @param {number} params.limit - 最多返回的结果数
+ * @returns {Promise}
+ */
+export const search = (q, params = {}) => {
+  return apiClient.get('/search', { params: { q, ...params } })
+}